@@ -1,21 +1,40 @@
 #!/usr/bin/python3
 import sys
+from minivpn import profiling
 import subprocess
 import os
-import re
-import json
-import shutil
-import requests
+import math
 import time
+import shutil
+import asyncio
+import threading
+from minivpn import helper, netlink, rpc
+from minivpn.common import (CONFIG_DIR, APP_DIR, FIRST_RUN_FLAG, CONFIG_CACHE,
+                            DISTROS, load_settings, save_settings, flush_settings,
+                            detect_distro, build_install_cmd, check_dependencies,
+                            stub_dns_in_config, read_split, split_tunnel_in_config)
+from minivpn.catalog import Catalog
+from minivpn.connections import Connections, JobQueue
+from minivpn.importer import import_configs
+from minivpn import history, metrics
+from minivpn.inotify import Inotify, CONFIG_EVENTS, IN_Q_OVERFLOW
+from minivpn.tunnel import SUDO, execute, has_hooks, run_killswitch, summarize_phases
+from minivpn.wgconf import ConfigIndex
+from minivpn.monitor import MonitorEngine, IP_INTERVAL, PING_INTERVAL, PING_HOST
+from minivpn.probe import scan_endpoints, rank_key
+from minivpn.supervisor import Supervisor, DEAD_WINDOW
+from minivpn.telemetry import Telemetry, fmt_rate, sparkline
+from minivpn.dns import STUB_ADDR, StatsProbe, query_stats
 from PyQt6.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout,
                              QLabel, QComboBox, QHBoxLayout, QInputDialog,
-                             QMessageBox, QDialog, QCheckBox, QSizePolicy)
-from PyQt6.QtCore import QTimer, Qt, QThread, pyqtSignal, QSize
+                             QMessageBox, QDialog, QCheckBox, QSizePolicy,
+                             QPlainTextEdit, QLineEdit, QMenu, QSystemTrayIcon)
+from PyQt6.QtCore import (QTimer, Qt, QThread, QObject, QSocketNotifier,
+                          pyqtSignal, QSize, QEvent, QAbstractListModel, QModelIndex)
+from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QColor
+
+profiling.mark("imports")
 
-CONFIG_DIR     = os.path.expanduser("~/vpn-configs")
-APP_DIR        = os.path.expanduser("~/.config/mini-vpn")
-FIRST_RUN_FLAG = os.path.join(APP_DIR, ".first_run_done")
-SETTINGS_FILE  = os.path.join(APP_DIR, "settings.json")
 AUTOSTART_DIR  = os.path.expanduser("~/.config/autostart")
 AUTOSTART_FILE = os.path.join(AUTOSTART_DIR, "mini-vpn.desktop")
 SCRIPT_PATH    = os.path.abspath(__file__)
@@ -23,6 +42,22 @@ SCRIPT_PATH    = os.path.abspath(__file__)
 WIN_MIN_W, WIN_MIN_H = 340, 348
 WIN_DEF_W, WIN_DEF_H = 400, 330
 
+PICKER_BATCH  = 200  # строк модели выбора за один fetchMore
+PICKER_SEARCH = 15   # профилей, начиная с которых показывается поиск
+HISTORY_SEED  = 7 * 86400   # за сколько 🏁-замеров подхватывать задержки при старте
+IMPORT_REPORT = 20   # строк ошибок импорта в окне, остальное — счётчиком
+TUNNEL_JOBS   = 4    # операций с разными туннелями одновременно
+
+# Окно скрыто или свёрнуто: таймеры реже, IP не запрашивается, пинг без
+# туннеля — раз в минуту. Пока туннель под надзором, пинг идёт как обычно.
+STATUS_POLL    = 1500
+STATUS_IDLE    = 10000
+TELEMETRY_POLL = 1000
+TELEMETRY_IDLE = 5000
+PING_IDLE      = 60.0
+TRAY_COLORS    = {True: "#9ece6a", False: "#565f89"}
+TRAY_ICONS     = {}
+
 GITHUB_URL = "https://github.com/Sokolovskyyy/arch-mini-vpn"
 
 THEME_KEYS = ["tokyo", "white", "blue", "amoled", "violet", "pink", "system"]
@@ -151,11 +186,24 @@ THEME_STYLES = {
     "system": None,
 }
 
-def get_theme_qss(key: str) -> str:
-    if key == "system" or key not in THEME_STYLES:
-        return ""
+STYLE_CACHE = {}
+
+# Виджеты окна и ключи их стилей в скомпилированной теме.
+WIDGET_STYLES = (("ip_display", "ip"), ("ping_label", "ping"),
+                 ("tunnel_panel", "telemetry"), ("btn_settings", "settings"),
+                 ("btn_dns", "dns"), ("btn_up", "up"), ("btn_down", "down"))
+
+def _compile_theme(key: str) -> dict:
+    if key == "system":
+        card = (" border-radius: 10px; padding: 12px; border: 2px solid palette(mid);"
+                " background-color: palette(button); color: palette(buttonText); }")
+        styles = dict.fromkeys(["window"] + [k for _, k in WIDGET_STYLES], "")
+        styles["active"] = "#statusCard { font-weight: bold;" + card
+        styles["idle"]   = "#statusCard {" + card
+        return styles
     c = THEME_STYLES[key]
-    return f"""
+    return {
+        "window": f"""
         QWidget {{
             background-color: {c['bg']};
             color: {c['fg']};
@@ -184,140 +232,42 @@ def get_theme_qss(key: str) -> str:
         QCheckBox::indicator:checked {{
             background: {c['ip_col']}; border-color: {c['ip_col']};
         }}
-    """
+    """,
+        "ip": (f"color: {c['ip_col']}; font-size: 14px; font-weight: bold;"
+               " border: none; background: transparent; padding: 5px;"),
+        "ping":      f"color: {c['ping_col']};",
+        "telemetry": f"color: {c['ping_col']};",
+        "settings": (f"QPushButton {{ background-color: {c['gear_bg']}; color: {c['fg']};"
+                     " border-radius: 10px; font-size: 20px; padding: 0px; font-weight: normal; }"
+                     f"QPushButton:hover {{ background-color: {c['gear_hover']}; }}"),
+        "dns":  f"background-color: {c['dns_bg']}; color: {c['dns_fg']};",
+        "up":  (f"background-color: {c['conn_bg']}; color: {c['conn_fg']};"
+                " font-size: 14px;"),
+        "down": f"background-color: {c['disc_bg']}; color: {c['disc_fg']};",
+        "active": (f"#statusCard {{ background-color: {c['conn_bg']}; color: {c['conn_fg']};"
+                   f" border: 2px solid {c['fg']};"
+                   " border-radius: 10px; font-weight: bold; padding: 12px; }}"),
+        "idle": (f"#statusCard {{ background-color: {c['card_idle']}; color: {c['card_idle_fg']};"
+                 f" border: 2px solid {c['fg']};"
+                 " border-radius: 10px; padding: 12px; }}"),
+    }
+
+def theme_styles(key: str) -> dict:
+    if key not in THEME_STYLES:
+        key = "tokyo"
+    styles = STYLE_CACHE.get(key)
+    if styles is None:
+        styles = STYLE_CACHE[key] = _compile_theme(key)
+    return styles
 
-def apply_theme_to_window(window, key: str):
-    window.setStyleSheet(get_theme_qss(key))
-    if key == "system":
-        window.ip_display.setStyleSheet("")
-        window.ping_label.setStyleSheet("")
-        window.btn_settings.setStyleSheet("")
-        window.btn_dns.setStyleSheet("")
-        window.btn_up.setStyleSheet("")
-        window.btn_down.setStyleSheet("")
-        window.status_card.setStyleSheet(
-            "#statusCard { border-radius: 10px; font-weight: bold; padding: 12px;"
-            " border: 2px solid palette(mid);"
-            " background-color: palette(button); color: palette(buttonText); }")
-        return
-
-    c = THEME_STYLES[key]
-    window.ip_display.setStyleSheet(
-        f"color: {c['ip_col']}; font-size: 14px; font-weight: bold;"
-        " border: none; background: transparent; padding: 5px;")
-    window.ping_label.setStyleSheet(f"color: {c['ping_col']};")
-    window.btn_settings.setStyleSheet(
-        f"QPushButton {{ background-color: {c['gear_bg']}; color: {c['fg']};"
-        " border-radius: 10px; font-size: 20px; padding: 0px; font-weight: normal; }"
-        f"QPushButton:hover {{ background-color: {c['gear_hover']}; }}")
-    window.btn_dns.setStyleSheet(
-        f"background-color: {c['dns_bg']}; color: {c['dns_fg']};")
-    window.btn_up.setStyleSheet(
-        f"background-color: {c['conn_bg']}; color: {c['conn_fg']};"
-        " font-size: 14px;")
-    window.btn_down.setStyleSheet(
-        f"background-color: {c['disc_bg']}; color: {c['disc_fg']};")
-
-def status_style_active(key: str) -> str:
-    if key == "system":
-        return ("#statusCard { border-radius: 10px; font-weight: bold; padding: 12px;"
-                " border: 2px solid palette(mid);"
-                " background-color: palette(button); color: palette(buttonText); }")
-    c = THEME_STYLES.get(key, THEME_STYLES["tokyo"])
-    return (f"#statusCard {{ background-color: {c['conn_bg']}; color: {c['conn_fg']};"
-            f" border: 2px solid {c['fg']};"
-            " border-radius: 10px; font-weight: bold; padding: 12px; }}")
-
-def status_style_idle(key: str) -> str:
-    if key == "system":
-        return ("#statusCard { border-radius: 10px; padding: 12px;"
-                " border: 2px solid palette(mid);"
-                " background-color: palette(button); color: palette(buttonText); }")
-    c = THEME_STYLES.get(key, THEME_STYLES["tokyo"])
-    return (f"#statusCard {{ background-color: {c['card_idle']}; color: {c['card_idle_fg']};"
-            f" border: 2px solid {c['fg']};"
-            " border-radius: 10px; padding: 12px; }}")
-
-DISTROS = {
-    "arch": {
-        "label":   "Arch / Manjaro / EndeavourOS",
-        "pm":      "pacman",
-        "install": "sudo pacman -S --needed --noconfirm {pkgs}",
-        "term":    ["konsole", "kitty", "alacritty", "gnome-terminal", "xterm"],
-        "pkgs": {
-            "wireguard-tools": "wireguard-tools",
-            "openresolv":      "openresolv",
-            "python-requests": "python-requests",
-        },
-        "binaries": ["wg", "wg-quick"],
-    },
-    "debian": {
-        "label":   "Debian / Ubuntu / Mint / Pop!_OS",
-        "pm":      "apt",
-        "install": "sudo apt-get install -y {pkgs}",
-        "term":    ["gnome-terminal", "konsole", "kitty", "alacritty", "xterm"],
-        "pkgs": {
-            "wireguard-tools": "wireguard",
-            "openresolv":      "openresolv",
-            "python-requests": "python3-requests",
-        },
-        "binaries": ["wg", "wg-quick"],
-    },
-    "fedora": {
-        "label":   "Fedora / RHEL / CentOS",
-        "pm":      "dnf",
-        "install": "sudo dnf install -y {pkgs}",
-        "term":    ["gnome-terminal", "konsole", "kitty", "xterm"],
-        "pkgs": {
-            "wireguard-tools": "wireguard-tools",
-            "openresolv":      "openresolv",
-            "python-requests": "python3-requests",
-        },
-        "binaries": ["wg", "wg-quick"],
-    },
-    "opensuse": {
-        "label":   "openSUSE Tumbleweed / Leap",
-        "pm":      "zypper",
-        "install": "sudo zypper install -y {pkgs}",
-        "term":    ["konsole", "gnome-terminal", "xterm"],
-        "pkgs": {
-            "wireguard-tools": "wireguard-tools",
-            "openresolv":      "openresolv",
-            "python-requests": "python3-requests",
-        },
-        "binaries": ["wg", "wg-quick"],
-    },
-    "void": {
-        "label":   "Void Linux",
-        "pm":      "xbps",
-        "install": "sudo xbps-install -Sy {pkgs}",
-        "term":    ["xterm", "kitty", "alacritty"],
-        "pkgs": {
-            "wireguard-tools": "wireguard-tools",
-            "openresolv":      "openresolv",
-            "python-requests": "python3-requests",
-        },
-        "binaries": ["wg", "wg-quick"],
-    },
-}
+def get_theme_qss(key: str) -> str:
+    return theme_styles(key)["window"]
 
-def detect_distro() -> str:
-    try:
-        with open("/etc/os-release") as f:
-            c = f.read().lower()
-    except:
-        return "unknown"
-    if any(x in c for x in ["arch", "manjaro", "endeavouros", "garuda", "artix"]):
-        return "arch"
-    if any(x in c for x in ["debian", "ubuntu", "mint", "pop", "elementary", "kali", "zorin"]):
-        return "debian"
-    if any(x in c for x in ["fedora", "rhel", "centos", "rocky", "alma"]):
-        return "fedora"
-    if any(x in c for x in ["opensuse", "suse"]):
-        return "opensuse"
-    if "void" in c:
-        return "void"
-    return "unknown"
+def apply_theme_to_window(window, key: str):
+    styles = theme_styles(key)
+    window.setStyleSheet(styles["window"])
+    for attr, part in WIDGET_STYLES:
+        getattr(window, attr).setStyleSheet(styles[part])
 
 def find_terminal(distro_key: str) -> list:
     candidates = (DISTROS.get(distro_key, {}).get("term", []) +
@@ -328,13 +278,6 @@ def find_terminal(distro_key: str) -> list:
             return [term, "--"] if term == "gnome-terminal" else [term, "-e"]
     return ["xterm", "-e"]
 
-def build_install_cmd(distro_key: str, pkg_keys: list) -> str:
-    distro = DISTROS.get(distro_key)
-    if not distro:
-        return ""
-    names = [n for k in pkg_keys if (n := distro["pkgs"].get(k, k))]
-    return distro["install"].format(pkgs=" ".join(names)) if names else ""
-
 def run_in_terminal(distro_key: str, cmd: str, title: str = "Mini VPN"):
     term, flag = find_terminal(distro_key)[:1][0], find_terminal(distro_key)[1]
     shell = f"echo '>>> {title}'; echo; {cmd}; echo; echo '✓ Done! Closing in 3s...'; sleep 3"
@@ -343,36 +286,72 @@ def run_in_terminal(distro_key: str, cmd: str, title: str = "Mini VPN"):
     else:
         subprocess.run([term, flag, "sh", "-c", shell])
 
-def check_dependencies(distro_key: str) -> list:
-    if distro_key == "unknown":
-        return []
-    return [b for b in DISTROS[distro_key]["binaries"] if not shutil.which(b)]
-
 TRANSLATIONS = {
     "ru": {
         "window_title":        "Mini VPN",
         "status_ready":        "СИСТЕМА ГОТОВА",
+        "status_skipped":      "Пропущено перерисовок: {}",
         "status_active":       "АКТИВЕН: {}",
+        "status_multi":        "АКТИВНЫ ({}): {}",
+        "tunnel_down_tip":     "Отключить {}",
         "status_off":          "VPN ВЫКЛЮЧЕН",
         "ip_hidden":           "ВАШ IP: ••••••••••••••",
         "ip_shown":            "ВАШ IP: {}",
         "ping":                "Ping: {} ms",
         "select_server":       "Выберите сервер:",
         "empty":               "Пусто",
-        "btn_dns":             "🔇 ЗАКОММЕНТИРОВАТЬ DNS В КОНФИГЕ",
+        "picker_search":       "🔍 Поиск по имени, стране, endpoint…",
+        "picker_favourites":   "★ Избранное",
+        "picker_fav_add":      "★ В избранное",
+        "picker_fav_remove":   "☆ Убрать из избранного",
+        "btn_dns":             "🗄 DNS ЧЕРЕЗ ЛОКАЛЬНЫЙ КЭШ",
         "btn_connect":         "⚡ ВКЛЮЧИТЬ VPN",
         "btn_disconnect":      "🛑 ВЫКЛЮЧИТЬ VPN",
         "rename_title":        "Переименование",
         "rename_prompt":       "Новое имя для «{}»:",
         "dns_no_config":       "Сначала выберите конфиг.",
         "dns_not_found":       "Файл не найден:\n{}",
-        "dns_patched":         "Строки DNS= закомментированы в:\n{}\n\nПереподключитесь для применения.",
-        "dns_already":         "Строк DNS= не найдено (уже закомментированы или их нет).",
-        "dns_title":           "DNS патч",
+        "dns_patched":         "DNS переключён на локальный кэш в:\n{}\n\nПрежние серверы сохранены как upstream.\nПереподключитесь для применения.",
+        "dns_already":         "Строк DNS= нет или конфиг уже использует локальный кэш.",
+        "dns_no_stub":         "Локальный DNS-кэш не отвечает на {}.\n\nЗапустите его:\nsudo python3 -m minivpn.dns --config-dir ~/vpn-configs\nили демон с ключом --dns.",
+        "dns_stats":           "DNS: {:.0%} из кэша · {:.0f} мкс / upstream {:.0f} мс",
+        "dns_title":           "DNS-кэш",
+        "import_running":      "Импортирую конфиги…",
+        "import_done":         "Импортировано {} из {}",
+        "import_more":         "…и ещё {}",
+        "import_title":        "Импорт конфигов",
+        "split_tip":           "Раздельное туннелирование",
+        "split_title":         "Раздельное туннелирование",
+        "split_include":       "Только через VPN (пусто — всё из AllowedIPs):",
+        "split_exclude":       "В обход VPN:",
+        "split_hint":          "CIDR, адрес, домен или @файл — по одному в строке",
+        "split_apply":         "Применить",
+        "split_done":          "AllowedIPs: {} → {} префиксов.\nПереподключитесь для применения.",
         "error_title":         "Ошибка",
         "conn_error":          "Ошибка подключения",
+        "killswitch_error":    "Ошибка kill switch",
+        "killswitch_on":       "🔒 Kill switch включён",
+        "killswitch_off":      "🔓 Kill switch снят",
+        "op_up_done":          "{} подключён за {} мс",
+        "op_down_done":        "{} отключён за {} мс",
+        "op_switch_done":      "Переключено на {} за {} мс, разрыв {} мс",
+        "failover_try":        "Туннель не отвечает — поднимаю {}…",
+        "failover_done":       "Восстановлено через {} ✓",
+        "failover_failed":     "{} не поднялся, повтор через {} с",
+        "telemetry":           "↓ {}  ↑ {}  · рукопожатие: {}\n{}",
+        "handshake_age":       "{} с назад",
+        "fastest_tip":         "Найти самый быстрый сервер",
+        "fastest_running":     "Проверяю {} серверов…",
+        "fastest_done":        "Самый быстрый: {} ({} мс)",
+        "fastest_none":        "Ни один сервер не ответил",
         "settings_title":      "Настройки",
+        "tray_toggle":         "Показать / скрыть окно",
+        "tray_quit":           "Выход",
         "settings_autostart":  "Запускать при входе в систему",
+        "settings_native":     "Быстрый режим (netlink без wg-quick)",
+        "settings_failover":   "Переподключать и менять сервер при обрыве",
+        "settings_tray":       "Работать в трее после закрытия окна",
+        "settings_killswitch": "Kill switch: без туннеля трафик не выходит",
         "settings_lang":       "Язык / Language",
         "settings_theme":      "Тема оформления",
         "settings_close":      "Закрыть",
@@ -394,27 +373,68 @@ TRANSLATIONS = {
     "en": {
         "window_title":        "Mini VPN",
         "status_ready":        "SYSTEM READY",
+        "status_skipped":      "Repaints skipped: {}",
         "status_active":       "ACTIVE: {}",
+        "status_multi":        "ACTIVE ({}): {}",
+        "tunnel_down_tip":     "Disconnect {}",
         "status_off":          "VPN OFF",
         "ip_hidden":           "YOUR IP: ••••••••••••••",
         "ip_shown":            "YOUR IP: {}",
         "ping":                "Ping: {} ms",
         "select_server":       "Select server:",
         "empty":               "Empty",
-        "btn_dns":             "🔇 COMMENT OUT DNS IN CONFIG",
+        "picker_search":       "🔍 Search name, country, endpoint…",
+        "picker_favourites":   "★ Favourites",
+        "picker_fav_add":      "★ Add to favourites",
+        "picker_fav_remove":   "☆ Remove from favourites",
+        "btn_dns":             "🗄 USE LOCAL DNS CACHE",
         "btn_connect":         "⚡ CONNECT VPN",
         "btn_disconnect":      "🛑 DISCONNECT VPN",
         "rename_title":        "Rename",
         "rename_prompt":       "New name for «{}»:",
         "dns_no_config":       "Please select a config first.",
         "dns_not_found":       "File not found:\n{}",
-        "dns_patched":         "DNS= lines commented out in:\n{}\n\nReconnect to apply.",
-        "dns_already":         "No DNS= lines found (already commented or absent).",
-        "dns_title":           "DNS Patch",
+        "dns_patched":         "DNS switched to the local cache in:\n{}\n\nThe previous servers are kept as upstream.\nReconnect to apply.",
+        "dns_already":         "No DNS= lines, or the config already uses the local cache.",
+        "dns_no_stub":         "The local DNS cache is not answering on {}.\n\nStart it with:\nsudo python3 -m minivpn.dns --config-dir ~/vpn-configs\nor run the daemon with --dns.",
+        "dns_stats":           "DNS: {:.0%} cached · {:.0f} µs / upstream {:.0f} ms",
+        "dns_title":           "DNS Cache",
+        "import_running":      "Importing configs…",
+        "import_done":         "Imported {} of {}",
+        "import_more":         "…and {} more",
+        "import_title":        "Config Import",
+        "split_tip":           "Split tunnelling",
+        "split_title":         "Split Tunnelling",
+        "split_include":       "Only through the VPN (empty — all of AllowedIPs):",
+        "split_exclude":       "Bypass the VPN:",
+        "split_hint":          "CIDR, address, domain or @file — one per line",
+        "split_apply":         "Apply",
+        "split_done":          "AllowedIPs: {} → {} prefixes.\nReconnect to apply.",
         "error_title":         "Error",
         "conn_error":          "Connection error",
+        "killswitch_error":    "Kill switch error",
+        "killswitch_on":       "🔒 Kill switch on",
+        "killswitch_off":      "🔓 Kill switch off",
+        "op_up_done":          "{} connected in {} ms",
+        "op_down_done":        "{} disconnected in {} ms",
+        "op_switch_done":      "Switched to {} in {} ms, gap {} ms",
+        "failover_try":        "Tunnel is not responding — bringing up {}…",
+        "failover_done":       "Restored via {} ✓",
+        "failover_failed":     "{} failed to come up, retrying in {} s",
+        "telemetry":           "↓ {}  ↑ {}  · handshake: {}\n{}",
+        "handshake_age":       "{} s ago",
+        "fastest_tip":         "Find the fastest server",
+        "fastest_running":     "Probing {} servers…",
+        "fastest_done":        "Fastest: {} ({} ms)",
+        "fastest_none":        "No server responded",
         "settings_title":      "Settings",
+        "tray_toggle":         "Show / hide window",
+        "tray_quit":           "Quit",
         "settings_autostart":  "Launch at login",
+        "settings_native":     "Fast mode (netlink, no wg-quick)",
+        "settings_failover":   "Reconnect or switch server on failure",
+        "settings_tray":       "Keep running in the tray when closed",
+        "settings_killswitch": "Kill switch: block traffic outside the tunnel",
         "settings_lang":       "Language / Язык",
         "settings_theme":      "Color theme",
         "settings_close":      "Close",
@@ -435,20 +455,6 @@ TRANSLATIONS = {
     },
 }
 
-def load_settings() -> dict:
-    os.makedirs(APP_DIR, exist_ok=True)
-    try:
-        with open(SETTINGS_FILE) as f:
-            return json.load(f)
-    except:
-        return {"lang": "ru", "theme": "tokyo",
-                "win_w": WIN_DEF_W, "win_h": WIN_DEF_H}
-
-def save_settings(data: dict):
-    os.makedirs(APP_DIR, exist_ok=True)
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(data, f)
-
 def handle_first_run(t: dict, distro_key: str):
     if os.path.exists(FIRST_RUN_FLAG):
         return
@@ -456,7 +462,7 @@ def handle_first_run(t: dict, distro_key: str):
     if distro_key == "unknown":
         QMessageBox.warning(None, t["first_title"], t["first_unknown"])
     else:
-        cmd = build_install_cmd(distro_key, ["wireguard-tools", "openresolv", "python-requests"])
+        cmd = build_install_cmd(distro_key, ["wireguard-tools", "openresolv"])
         msg = QMessageBox()
         msg.setWindowTitle(t["first_title"])
         msg.setIcon(QMessageBox.Icon.Question)
@@ -490,54 +496,382 @@ def handle_deps_check(t: dict, distro_key: str):
         if cmd:
             run_in_terminal(distro_key, cmd, t["deps_missing_title"])
 
-def comment_dns_in_config(conf_path: str) -> bool:
-    try:
-        with open(conf_path) as f:
-            lines = f.readlines()
-        new_lines, changed = [], False
-        for line in lines:
-            if re.match(r"^\s*DNS\s*=", line, re.IGNORECASE):
-                new_lines.append("# " + line)
-                changed = True
-            else:
-                new_lines.append(line)
-        if changed:
-            with open(conf_path, "w") as f:
-                f.writelines(new_lines)
-        return changed
-    except Exception as e:
-        print(f"[DNS] {e}")
-        return False
-
 class MonitorThread(QThread):
-    info_updated = pyqtSignal(str, str)
+    ip_updated   = pyqtSignal(str)
+    ping_updated = pyqtSignal(str)
+
+    def __init__(self, settings: dict, registry: metrics.Registry = None):
+        super().__init__()
+        self.engine = MonitorEngine(
+            self.ip_updated.emit, self.ping_updated.emit,
+            ip_interval=settings.get("ip_interval", IP_INTERVAL),
+            ping_interval=settings.get("ping_interval", PING_INTERVAL),
+            ping_host=settings.get("ping_host", PING_HOST), metrics=registry)
 
     def run(self):
-        while True:
-            ip, ping = "—", "—"
-            try:
-                r = requests.get("https://api.ipify.org", timeout=3)
-                if r.status_code == 200:
-                    ip = r.text.strip()
-                p = subprocess.run(["ping", "-c", "1", "-W", "1", "1.1.1.1"],
-                                   capture_output=True, text=True)
-                if p.returncode == 0:
-                    ping = p.stdout.split("time=")[1].split(" ms")[0]
-            except:
-                pass
-            self.info_updated.emit(ip, ping)
-            time.sleep(7)
+        asyncio.run(self.engine.run())
+
+    def refresh_ip(self):
+        self.engine.refresh_ip()
+
+    def set_idle(self, idle: bool, ping_interval: float):
+        self.engine.set_idle(idle, ping_interval)
+
+    def stop(self):
+        self.engine.stop()
+        self.wait(3000)
+
+def read_proc_links() -> set:
+    with open("/proc/net/dev") as f:
+        return {line.split(":", 1)[0].strip() for line in f.readlines()[2:]}
+
+class ScanThread(QThread):
+    results = pyqtSignal(list)
+
+    def __init__(self, endpoints: dict):
+        super().__init__()
+        self.endpoints = endpoints
+
+    def run(self):
+        self.results.emit(asyncio.run(scan_endpoints(self.endpoints)))
+
+# Модель выбора сервера: заголовки групп и профили. Строки отдаются порциями
+# через fetchMore, так что комбобокс с тысячами профилей открывается сразу.
+class ProfileModel(QAbstractListModel):
+    def __init__(self, catalog: Catalog, parent=None):
+        super().__init__(parent)
+        self.catalog   = catalog
+        self.rows      = []
+        self.row_index = {}
+        self.fetched   = 0
+        self.latency   = {}
+        self.fav_label = ""
+        self.bold      = QFont()
+        self.bold.setBold(True)
+
+    def reload(self, query: str):
+        self.beginResetModel()
+        self.rows      = self.catalog.rows(query, self.fav_label)
+        self.row_index = {v: i for i, (kind, v) in enumerate(self.rows) if kind == "profile"}
+        self.fetched   = min(PICKER_BATCH, len(self.rows))
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.fetched
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.fetched < len(self.rows)
+
+    def fetchMore(self, parent):
+        self._fetch_to(min(self.fetched + PICKER_BATCH, len(self.rows)))
+
+    def _fetch_to(self, count: int):
+        if count <= self.fetched:
+            return
+        self.beginInsertRows(QModelIndex(), self.fetched, count - 1)
+        self.fetched = count
+        self.endInsertRows()
+
+    def row_of(self, name: str) -> int:
+        row = self.row_index.get(name, -1)
+        self._fetch_to(row + 1)
+        return row
+
+    def first_profile(self) -> int:
+        return next((i for i, (kind, _) in enumerate(self.rows) if kind == "profile"), -1)
+
+    def set_latency(self, latency: dict):
+        self.latency = latency
+        if self.fetched:
+            self.dataChanged.emit(self.index(0), self.index(self.fetched - 1))
+
+    def flags(self, index):
+        if self.rows[index.row()][0] == "group":
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        kind, value = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if kind == "group":
+                return value
+            median, loss, _ = self.latency.get(value, (None, None, False))
+            if loss is None:
+                return value
+            return f"{value}  ·  {median:.0f} ms" if median is not None else f"{value}  ·  —"
+        if role == Qt.ItemDataRole.UserRole:
+            return value if kind == "profile" else None
+        if role == Qt.ItemDataRole.FontRole and kind == "group":
+            return self.bold
+        if role == Qt.ItemDataRole.ToolTipRole and kind == "profile":
+            return self.catalog.endpoint(value) or None
+        return None
+
+class ImportThread(QThread):
+    done = pyqtSignal(list)
+
+    def __init__(self, paths: list, existing: dict):
+        super().__init__()
+        self.paths    = paths
+        self.existing = existing
+
+    def run(self):
+        try:
+            results = import_configs(self.paths, CONFIG_DIR, self.existing)
+        except OSError as e:
+            results = [{"source": ", ".join(self.paths), "name": None,
+                        "error": str(e), "warnings": []}]
+        self.done.emit(results)
+
+class LinkWatcher(QObject):
+    link_changed = pyqtSignal(str, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table    = netlink.LinkTable()
+        self.sock     = None
+        self.notifier = None
+        try:
+            self.sock = netlink.open_link_socket()
+            self.table.load(self.sock)
+            self.sock.setblocking(False)
+        except OSError as e:
+            print(f"[NETLINK] {e}")
+            if self.sock:
+                self.sock.close()
+            self.sock = None
+            return
+        self.notifier = QSocketNotifier(self.sock.fileno(), QSocketNotifier.Type.Read, self)
+        self.notifier.activated.connect(self._on_readable)
+
+    @property
+    def available(self) -> bool:
+        return self.sock is not None
+
+    def up_links(self) -> set:
+        return self.table.up_links() if self.available else read_proc_links()
+
+    def _on_readable(self):
+        try:
+            changes = self.table.drain(self.sock)
+        except OSError as e:
+            print(f"[NETLINK] {e}")
+            return
+        for name, up in changes:
+            self.link_changed.emit(name, up)
+
+class ConfigWatcher(QObject):
+    changed = pyqtSignal()
+
+    def __init__(self, index: ConfigIndex, parent=None):
+        super().__init__(parent)
+        self.index    = index
+        self.ino      = None
+        self.notifier = None
+        try:
+            self.ino = Inotify()
+            self.ino.add_watch(index.config_dir, CONFIG_EVENTS)
+        except OSError as e:
+            print(f"[INOTIFY] {e}")
+            if self.ino:
+                self.ino.close()
+            self.ino = None
+            return
+        self.notifier = QSocketNotifier(self.ino.fileno(), QSocketNotifier.Type.Read, self)
+        self.notifier.activated.connect(self._on_readable)
+
+    @property
+    def available(self) -> bool:
+        return self.ino is not None
+
+    def _on_readable(self):
+        events = self.ino.read()
+        if any(mask & IN_Q_OVERFLOW for _, mask, _, _ in events):
+            changed = self.index.rescan()
+        else:
+            changed = self.index.refresh(
+                {name[:-5] for _, _, _, name in events if name.endswith(".conf")})
+        if changed:
+            self.changed.emit()
+
+# Пул потоков для up/down/switch: операции над разными профилями идут
+# параллельно, над одним — по очереди (JobQueue).
+class TunnelWorker(QObject):
+    output    = pyqtSignal(str)
+    phase     = pyqtSignal(str, str, float)
+    job_done  = pyqtSignal(str, str, int, str, dict)
+    busy      = pyqtSignal(bool)
+
+    def __init__(self, workers: int = TUNNEL_JOBS):
+        super().__init__()
+        self.jobs    = JobQueue()
+        self.threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(workers)]
+        self.lock    = threading.Lock()
+        self.local   = threading.local()   # у каждого потока своё соединение с сессией
+        self.clients = []
+        self.helper  = None   # False — поднять привилегированную сессию не удалось
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, action: str, name: str, path: str, backend: str = "wg-quick",
+               old: tuple = None, lock: bool = None) -> bool:
+        profiles = {name, old[0]} if old else {name}
+        if action == "killswitch":
+            profiles = {""}   # name — on/off; вкл. и выкл. строго по очереди подачи
+        if not self.jobs.put((action, name), profiles, (path, backend, old, lock)):
+            return False
+        self.busy.emit(True)
+        return True
+
+    def pending(self, name: str) -> bool:
+        return self.jobs.pending(name)
+
+    def stop(self):
+        self.jobs.close()
+        deadline = time.monotonic() + 3
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+
+    def _loop(self):
+        while (job := self.jobs.take()) is not None:
+            (action, name), profiles, (path, backend, old, lock) = job
+            rc, err, phases = self._execute(action, name, path, backend, old, lock)
+            idle = self.jobs.done((action, name), profiles)
+            self.job_done.emit(action, name, rc, err, phases)
+            self.busy.emit(not idle)
+
+    # Сессия поднимается под блокировкой: одна авторизация на все потоки,
+    # остальные подключаются к уже запущенной.
+    def _helper(self):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            with self.lock:
+                if self.helper is False:
+                    return None
+                client = helper.start()
+                if client is None:
+                    self.helper = False
+                    return None
+                self.clients.append(client)
+            self.local.client = client
+        return client
+
+    def _drop_helper(self):
+        client, self.local.client = self.local.client, None
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+        client.close()
+
+    # Демон, если запущен; иначе привилегированная сессия — одна авторизация
+    # на весь сеанс вместо sudo на каждое действие; и лишь без неё (или для
+    # профилей с хуками, которые сессия не выполняет) — sudo.
+    # action "killswitch" ставит (lock=True) или снимает набор без операции с туннелем.
+    def _execute(self, action: str, name: str, path: str, backend: str, old: tuple,
+                 lock: bool) -> tuple:
+        on_phase = lambda p, ms: self.phase.emit(f"{action} {name}", p, ms)
+        if action == "killswitch":
+            params = {"enable": lock}
+        else:
+            params = {"name": name, **({"old": old[0]} if old else {}),
+                      **({"lock": lock} if lock is not None else {})}
+        if client := rpc.connect():
+            with client:
+                try:
+                    return self._call(client, action, on_phase, params)
+                except OSError as e:
+                    return 1, str(e), {}
+        if action != "killswitch":
+            params["backend"] = backend
+        hooks = action != "killswitch" and any(has_hooks(p) for p in (path, old and old[1]) if p)
+        if SUDO and self.helper is not False and not hooks:
+            for _ in range(2):   # сессия могла завершиться — поднять заново
+                if not (client := self._helper()):
+                    break
+                try:
+                    return self._call(client, action, on_phase, params)
+                except OSError:
+                    self._drop_helper()
+        if action == "killswitch":
+            rc, err, phases = run_killswitch(lock, CONFIG_DIR, on_phase)
+        else:
+            rc, err, phases = execute(action, name, path, backend, on_line=self.output.emit,
+                                      on_phase=on_phase, old=old, lock=lock)
+        return rc, err, summarize_phases(phases)
+
+    def _call(self, client, action: str, on_phase, params: dict) -> tuple:
+        def on_notify(method: str, params: dict):
+            if method == "output":
+                self.output.emit(params["line"])
+            elif method == "phase":
+                on_phase(params["phase"], params["ms"])
+
+        try:
+            result = client.call(action, on_notify=on_notify, **params)
+        except (rpc.RpcError, ValueError) as e:
+            return 1, str(e), {}
+        return result["rc"], result["error"], result["phases"]
+
+class StatusCard(QLabel):
+    # Текст и QSS меняются только при смене состояния: каждый setStyleSheet
+    # заставляет Qt заново полировать виджет. Одинаковые тики идут в skipped.
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.state   = (text, None)
+        self.skipped = 0
+        self.tip     = "{}"
+
+    def set_state(self, text: str, qss: str):
+        if self.state == (text, qss):
+            self.skipped += 1
+            return
+        if text != self.state[0]:
+            self.setText(text)
+        if qss is not self.state[1]:
+            self.setStyleSheet(qss)
+        self.state = (text, qss)
+
+    def event(self, e):
+        if e.type() == QEvent.Type.ToolTip:
+            self.setToolTip(self.tip.format(self.skipped))
+        return super().event(e)
+
+# Строка поднятого туннеля: имя, скорости, рукопожатие и своя кнопка отключения.
+class TunnelRow(QWidget):
+    disconnect = pyqtSignal(str)
+
+    def __init__(self, name: str, tip: str):
+        super().__init__()
+        self.name  = name
+        row = QHBoxLayout(self)
+        row.setContentsMargins(0, 0, 0, 0)
+        self.label = QLabel(name.upper())
+        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        row.addWidget(self.label, 1)
+        self.button = QPushButton("⏏")
+        self.button.setFixedWidth(40)
+        self.button.setToolTip(tip.format(name))
+        self.button.clicked.connect(lambda: self.disconnect.emit(self.name))
+        row.addWidget(self.button)
 
 class SettingsDialog(QDialog):
     lang_changed  = pyqtSignal(str)
     theme_changed = pyqtSignal(str)
+    tray_changed  = pyqtSignal(bool)
+    lock_changed  = pyqtSignal(bool)
 
     def __init__(self, parent, t: dict, settings: dict):
         super().__init__(parent)
         self.t        = t
         self.settings = settings
         self.setWindowTitle(t["settings_title"])
-        self.setFixedSize(340, 260)
+        self.setFixedSize(340, 350)
 
         layout = QVBoxLayout()
         layout.setSpacing(10)
@@ -548,6 +882,27 @@ class SettingsDialog(QDialog):
         self.chk_autostart.toggled.connect(self._toggle_autostart)
         layout.addWidget(self.chk_autostart)
 
+        self.chk_native = QCheckBox(t["settings_native"])
+        self.chk_native.setChecked(settings.get("backend", "wg-quick") == "native")
+        self.chk_native.toggled.connect(self._toggle_native)
+        layout.addWidget(self.chk_native)
+
+        self.chk_failover = QCheckBox(t["settings_failover"])
+        self.chk_failover.setChecked(settings.get("failover", True))
+        self.chk_failover.toggled.connect(self._toggle_failover)
+        layout.addWidget(self.chk_failover)
+
+        self.chk_tray = QCheckBox(t["settings_tray"])
+        self.chk_tray.setChecked(settings.get("tray", False))
+        self.chk_tray.setEnabled(QSystemTrayIcon.isSystemTrayAvailable())
+        self.chk_tray.toggled.connect(self._toggle_tray)
+        layout.addWidget(self.chk_tray)
+
+        self.chk_killswitch = QCheckBox(t["settings_killswitch"])
+        self.chk_killswitch.setChecked(settings.get("killswitch", False))
+        self.chk_killswitch.toggled.connect(self._toggle_killswitch)
+        layout.addWidget(self.chk_killswitch)
+
         lang_row = QHBoxLayout()
         self.lbl_lang = QLabel(t["settings_lang"])
         lang_row.addWidget(self.lbl_lang)
@@ -611,6 +966,10 @@ class SettingsDialog(QDialog):
         self.t = TRANSLATIONS[new]
         self.setWindowTitle(self.t["settings_title"])
         self.chk_autostart.setText(self.t["settings_autostart"])
+        self.chk_native.setText(self.t["settings_native"])
+        self.chk_failover.setText(self.t["settings_failover"])
+        self.chk_tray.setText(self.t["settings_tray"])
+        self.chk_killswitch.setText(self.t["settings_killswitch"])
         self.lbl_lang.setText(self.t["settings_lang"])
         self.lbl_theme.setText(self.t["settings_theme"])
         self.btn_github.setText(f"🔗  {self.t['settings_github']}")
@@ -627,6 +986,24 @@ class SettingsDialog(QDialog):
         self._sync_theme()
         self.theme_changed.emit(key)
 
+    def _toggle_native(self, checked: bool):
+        self.settings["backend"] = "native" if checked else "wg-quick"
+        save_settings(self.settings)
+
+    def _toggle_failover(self, checked: bool):
+        self.settings["failover"] = checked
+        save_settings(self.settings)
+
+    def _toggle_tray(self, checked: bool):
+        self.settings["tray"] = checked
+        save_settings(self.settings)
+        self.tray_changed.emit(checked)
+
+    def _toggle_killswitch(self, checked: bool):
+        self.settings["killswitch"] = checked
+        save_settings(self.settings)
+        self.lock_changed.emit(checked)
+
     def _toggle_autostart(self, checked: bool):
         if checked:
             os.makedirs(AUTOSTART_DIR, exist_ok=True)
@@ -651,29 +1028,132 @@ class SettingsDialog(QDialog):
             except Exception as e:
                 QMessageBox.warning(self, self.t["error_title"], str(e))
 
+class SplitDialog(QDialog):
+    def __init__(self, parent, t: dict, settings: dict, lists: dict):
+        super().__init__(parent)
+        self.setWindowTitle(t["split_title"])
+        self.resize(360, 380)
+
+        layout = QVBoxLayout()
+        layout.setSpacing(8)
+        layout.setContentsMargins(16, 16, 16, 16)
+
+        self.edits = {}
+        for key in ("include", "exclude"):
+            layout.addWidget(QLabel(t[f"split_{key}"]))
+            edit = QPlainTextEdit("\n".join(lists[key]))
+            edit.setPlaceholderText(t["split_hint"])
+            layout.addWidget(edit)
+            self.edits[key] = edit
+
+        row = QHBoxLayout()
+        btn_apply = QPushButton(t["split_apply"])
+        btn_apply.clicked.connect(self.accept)
+        row.addWidget(btn_apply)
+        btn_close = QPushButton(t["settings_close"])
+        btn_close.clicked.connect(self.reject)
+        row.addWidget(btn_close)
+        layout.addLayout(row)
+
+        self.setLayout(layout)
+        self.setStyleSheet(get_theme_qss(settings.get("theme", "tokyo")))
+
+    def lists(self) -> dict:
+        return {key: edit.toPlainText().replace(",", " ").split()
+                for key, edit in self.edits.items()}
+
+# Значок трея: иконки темы, если есть обе, иначе цветная точка.
+def tray_icon(active: bool) -> QIcon:
+    if active not in TRAY_ICONS:
+        names = ("network-vpn", "network-vpn-disconnected")
+        if all(QIcon.hasThemeIcon(n) for n in names):
+            TRAY_ICONS[active] = QIcon.fromTheme(names[0] if active else names[1])
+        else:
+            pix = QPixmap(64, 64)
+            pix.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(pix)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(TRAY_COLORS[active]))
+            painter.drawEllipse(8, 8, 48, 48)
+            painter.end()
+            TRAY_ICONS[active] = QIcon(pix)
+    return TRAY_ICONS[active]
+
 class UltimateVPN(QWidget):
     def __init__(self, distro_key: str):
         super().__init__()
         self.distro_key = distro_key
         self.current_ip = "..."
         self.ip_hidden  = True
+        self.latency    = {}
+        self.scan       = None
+        self.importer   = None
+        self.tunnel_rows = {}
+        self.monitor    = None
+        self.tray       = None
+        self.idle       = False
+        self._idle_mode = None
+        self._tray_state = None
+        self._quitting  = False
         self.settings   = load_settings()
         self._resize_timer = QTimer(self)
         self._resize_timer.setSingleShot(True)
         self._resize_timer.timeout.connect(self._save_window_size)
+        self.telemetry_timer = QTimer(self)
+        self.telemetry_timer.timeout.connect(self._sample_telemetry)
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.supervisor = Supervisor(self.settings.get("dead_window", DEAD_WINDOW))
+        self.worker     = TunnelWorker()
+        try:
+            self.history = history.History()
+        except OSError as e:   # второй экземпляр держит flock — пишет он
+            print(f"[HISTORY] {e}")
+            self.history = None
+        self.metrics  = metrics.Registry()
+        self.exporter = None
+        port, textfile = self.settings.get("metrics_port"), self.settings.get("metrics_textfile")
+        if port or textfile:
+            try:
+                self.exporter = metrics.Exporter(self.metrics, port or None, textfile=textfile)
+            except OSError as e:
+                print(f"[METRICS] {e}")
 
         os.makedirs(CONFIG_DIR, exist_ok=True)
+        self.configs = ConfigIndex(CONFIG_DIR, CONFIG_CACHE)
+        self.configs.load()
+        self.connections = Connections(self.configs)
+        self._seed_latency()
+        profiling.mark("configs")
+        self.config_watcher = ConfigWatcher(self.configs, self)
+        self.config_watcher.changed.connect(self._on_configs_changed)
+        self.link_watcher = LinkWatcher(self)
+        self.link_watcher.link_changed.connect(self._on_link)
+        profiling.mark("watchers")
         self._build_ui()
+        self.setAcceptDrops(True)
         self._restore_size()
+        profiling.mark("build_ui")
         self._apply_theme(self.settings.get("theme", "tokyo"))
+        profiling.mark("theme")
 
-        self.status_timer = QTimer(self)
-        self.status_timer.timeout.connect(self.update_status)
-        self.status_timer.start(1500)
+        if not self.link_watcher.available:
+            self.status_timer.start(STATUS_POLL)
 
-        self.monitor = MonitorThread()
-        self.monitor.info_updated.connect(self._on_monitor)
+        self.monitor = MonitorThread(self.settings, self.metrics)
+        self.monitor.ip_updated.connect(self._on_ip)
+        self.monitor.ping_updated.connect(self._on_ping)
         self.monitor.start()
+        self._setup_tray(self.settings.get("tray", False))
+
+        self.worker.output.connect(self.op_label.setText)
+        if profiling.ENABLED:
+            self.worker.phase.connect(self._on_phase)
+        self.worker.job_done.connect(self._on_job_done)
+        self.worker.busy.connect(self._on_busy)
+        self.worker.start()
+        profiling.mark("threads")
 
     @property
     def t(self) -> dict:
@@ -707,7 +1187,8 @@ class UltimateVPN(QWidget):
         status_row = QHBoxLayout()
         status_row.setSpacing(6)
 
-        self.status_card = QLabel(self.t["status_ready"])
+        self.status_card = StatusCard(self.t["status_ready"])
+        self.status_card.tip = self.t["status_skipped"]
         self.status_card.setObjectName("statusCard")
         self.status_card.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.status_card.setSizePolicy(
@@ -730,12 +1211,38 @@ class UltimateVPN(QWidget):
         self.ping_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.ping_label)
 
+        self.tunnel_panel = QWidget()
+        self.tunnel_box   = QVBoxLayout(self.tunnel_panel)
+        self.tunnel_box.setContentsMargins(0, 0, 0, 0)
+        self.tunnel_panel.hide()
+        layout.addWidget(self.tunnel_panel)
+
         self.lbl_server = QLabel(self.t["select_server"])
         layout.addWidget(self.lbl_server)
 
+        self.search = QLineEdit()
+        self.search.setPlaceholderText(self.t["picker_search"])
+        self.search.setClearButtonEnabled(True)
+        self.search.textChanged.connect(self._filter_configs)
+        layout.addWidget(self.search)
+
         cfg_row = QHBoxLayout()
+        self.catalog = Catalog()
+        self.catalog.favourites = set(self.settings.get("favourites", []))
+        self.profiles = ProfileModel(self.catalog, self)
+        self.profiles.fav_label = self.t["picker_favourites"]
+        self.profiles.latency   = self.latency
         self.combo = QComboBox()
         self.combo.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        # Ширина — по минимальной длине, а не по содержимому: иначе Qt меряет все строки.
+        self.combo.setSizeAdjustPolicy(
+            QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+        self.combo.setMinimumContentsLength(10)
+        self.combo.setMaxVisibleItems(20)
+        self.combo.setModel(self.profiles)
+        self.combo.setPlaceholderText(self.t["empty"])
+        self.combo.view().setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.combo.view().customContextMenuRequested.connect(self._favourite_menu)
         self._refresh_configs()
         cfg_row.addWidget(self.combo, 1)
 
@@ -745,6 +1252,18 @@ class UltimateVPN(QWidget):
         btn_rename.clicked.connect(self._rename_config)
         cfg_row.addWidget(btn_rename)
 
+        self.btn_fastest = QPushButton("🏁")
+        self.btn_fastest.setFixedWidth(40)
+        self.btn_fastest.setToolTip(self.t["fastest_tip"])
+        self.btn_fastest.clicked.connect(self._find_fastest)
+        cfg_row.addWidget(self.btn_fastest)
+
+        self.btn_split = QPushButton("✂")
+        self.btn_split.setFixedWidth(40)
+        self.btn_split.setToolTip(self.t["split_tip"])
+        self.btn_split.clicked.connect(self._split_tunnel)
+        cfg_row.addWidget(self.btn_split)
+
         btn_open = QPushButton("📂")
         btn_open.setFixedWidth(40)
         btn_open.setToolTip("Open folder")
@@ -771,12 +1290,20 @@ class UltimateVPN(QWidget):
         self.btn_down.clicked.connect(self._disconnect)
         layout.addWidget(self.btn_down)
 
+        self.op_label = QLabel("")
+        self.op_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.op_label.setWordWrap(True)
+        layout.addWidget(self.op_label)
+        self.combo.currentIndexChanged.connect(self._update_controls)
+
         self.setLayout(layout)
 
     def _open_settings(self):
         dlg = SettingsDialog(self, self.t, self.settings)
         dlg.lang_changed.connect(self._apply_lang)
         dlg.theme_changed.connect(self._apply_theme)
+        dlg.tray_changed.connect(self._setup_tray)
+        dlg.lock_changed.connect(self._set_killswitch)
         dlg.exec()
 
     def _apply_lang(self, lang: str):
@@ -787,17 +1314,177 @@ class UltimateVPN(QWidget):
         self.btn_dns.setText(t["btn_dns"])
         self.btn_up.setText(t["btn_connect"])
         self.btn_down.setText(t["btn_disconnect"])
+        self.btn_fastest.setToolTip(t["fastest_tip"])
+        self.btn_split.setToolTip(t["split_tip"])
+        self.status_card.tip = t["status_skipped"]
+        for row in self.tunnel_rows.values():
+            row.button.setToolTip(t["tunnel_down_tip"].format(row.name))
         self.ping_label.setText(t["ping"].format("---"))
         self._update_ip_label()
         self.update_status()
-        if self.combo.count() == 1 and self.combo.itemText(0) in ("Пусто", "Empty"):
-            self.combo.setItemText(0, t["empty"])
+        self.search.setPlaceholderText(t["picker_search"])
+        self.combo.setPlaceholderText(t["empty"])
+        self.profiles.fav_label = t["picker_favourites"]
+        self._filter_configs(self.search.text())
+        self._retranslate_tray()
+
+    def shutdown(self):
+        self.monitor.stop()
+        self.worker.stop()
+        if self.scan:
+            self.scan.wait()
+        if self.importer:
+            self.importer.wait()
+        if self.history:
+            self.history.close()
+            self.history = None
+        if self.exporter:
+            self.exporter.close()
+            self.exporter = None
+        flush_settings()   # atexit не сработает, если сессию завершат сигналом
+
+    # Задержки из последних 🏁-замеров: ранжирование failover и подписи в списке
+    # работают сразу после запуска, без нового сканирования. «Порт закрыт» в
+    # истории хранится без RTT, так что и после перезапуска не обгоняет ответы.
+    def _seed_latency(self):
+        if not self.history:
+            return
+        since = time.time() - HISTORY_SEED
+        for name, st in self.history.summary(self.configs.names(), history.SCAN, since).items():
+            median = st["rtt_p50"]
+            self.latency[name] = (None if math.isnan(median) else median, st["loss"], False)
+
+    def _record(self, name, kind: int, **values):
+        if self.history and name:
+            self.history.add(name, kind, **values)
+
+    def closeEvent(self, event):
+        if self.tray and not self._quitting:
+            event.ignore()
+            self.hide()
+            return
+        self.shutdown()
+        super().closeEvent(event)
+
+    # Резидентный режим: закрытие окна лишь прячет его, а монитор, надзор за
+    # туннелем и история продолжают работать.
+    def _setup_tray(self, enabled: bool):
+        enabled = enabled and QSystemTrayIcon.isSystemTrayAvailable()
+        QApplication.setQuitOnLastWindowClosed(not enabled)
+        if not enabled:
+            if self.tray:
+                self.tray.hide()
+                self.tray.contextMenu().deleteLater()
+                self.tray.deleteLater()
+                self.tray = None
+            return
+        if self.tray:
+            return
+        self.tray = QSystemTrayIcon(self)
+        menu = QMenu(self)
+        self.tray_toggle = menu.addAction("")
+        self.tray_toggle.triggered.connect(self._toggle_window)
+        self.tray_up = menu.addAction("")
+        self.tray_up.triggered.connect(self._connect)
+        self.tray_down = menu.addAction("")
+        self.tray_down.triggered.connect(self._disconnect)
+        menu.addSeparator()
+        self.tray_quit = menu.addAction("")
+        self.tray_quit.triggered.connect(self._quit)
+        self.tray.setContextMenu(menu)
+        self.tray.activated.connect(self._on_tray)
+        self._tray_state = None
+        self._retranslate_tray()
+        self.tray.show()
+
+    def _retranslate_tray(self):
+        if not self.tray:
+            return
+        self.tray_toggle.setText(self.t["tray_toggle"])
+        self.tray_up.setText(self.t["btn_connect"])
+        self.tray_down.setText(self.t["btn_disconnect"])
+        self.tray_quit.setText(self.t["tray_quit"])
+        self._tray_state = None
+        self.update_status()
+
+    # Иконка и подсказка меняются только при смене состояния — как у StatusCard.
+    def _update_tray(self, text: str, active: bool):
+        if not self.tray or self._tray_state == (text, active):
+            return
+        self._tray_state = (text, active)
+        self.tray.setIcon(tray_icon(active))
+        self.tray.setToolTip(f"{self.t['window_title']}\n{text}")
 
-    def _on_monitor(self, ip, ping):
+    def _on_tray(self, reason):
+        if reason == QSystemTrayIcon.ActivationReason.Trigger:
+            self._toggle_window()
+
+    def _toggle_window(self):
+        if self.isVisible() and not self.isMinimized():
+            self.hide()
+            return
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def _quit(self):
+        self._quitting = True
+        self.shutdown()
+        if self.tray:
+            self.tray.hide()
+        QApplication.quit()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._apply_idle()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._apply_idle()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange:
+            self._apply_idle()
+
+    # Невидимое окно не перерисовывает подписи, реже опрашивает телеметрию и
+    # ссылки и не ходит за IP; дешёвые проверки здоровья туннеля остаются.
+    def _apply_idle(self):
+        idle = not self.isVisible() or self.isMinimized()
+        if self.monitor:
+            ping = self.settings.get("ping_interval", PING_INTERVAL)
+            mode = (idle, ping if not idle or self.connections else max(ping, PING_IDLE))
+            if mode != self._idle_mode:
+                self._idle_mode = mode
+                self.monitor.set_idle(*mode)
+        if idle == self.idle:
+            return
+        self.idle = idle
+        if self.status_timer.isActive():
+            self.status_timer.start(STATUS_IDLE if idle else STATUS_POLL)
+        if self.telemetry_timer.isActive():
+            self.telemetry_timer.start(TELEMETRY_IDLE if idle else TELEMETRY_POLL)
+            if not idle:
+                self._sample_telemetry()
+
+    def _on_ip(self, ip: str):
         self.current_ip = ip
-        self.ping_label.setText(self.t["ping"].format(ping))
         self._update_ip_label()
 
+    def _on_ping(self, ping: str):
+        self.ping_label.setText(self.t["ping"].format(ping))
+        if primary := self._primary():
+            lost = ping == "—"
+            self._record(primary, history.PROBE,
+                         rtt=math.nan if lost else float(ping), loss=float(lost))
+        self.supervisor.probe(ping != "—")
+        self._supervise()
+
+    def _on_link(self, name: str, up: bool):
+        self._apply_links(*self.connections.link(name, up))
+        self._show_status()
+        self.monitor.refresh_ip()
+
     def _toggle_ip(self):
         self.ip_hidden = not self.ip_hidden
         self._update_ip_label()
@@ -807,87 +1494,449 @@ class UltimateVPN(QWidget):
             self.t["ip_hidden"] if self.ip_hidden
             else self.t["ip_shown"].format(self.current_ip))
 
+    def _on_configs_changed(self):
+        self._refresh_configs()
+        self.update_status()
+
     def _refresh_configs(self):
-        try:
-            files = [f[:-5] for f in os.listdir(CONFIG_DIR) if f.endswith(".conf")]
-            self.combo.clear()
-            self.combo.addItems(sorted(files) if files else [self.t["empty"]])
-        except:
-            pass
+        if not self.config_watcher.available:
+            self.configs.rescan()
+        if self.catalog.update(self.configs.entries):
+            self._filter_configs(self.search.text())
+        self.search.setVisible(len(self.catalog.order) >= PICKER_SEARCH or
+                               bool(self.search.text()))
+
+    def _filter_configs(self, query: str):
+        current = self._selected()
+        self.profiles.reload(query)
+        row = self.profiles.row_of(current) if current else -1
+        self.combo.setCurrentIndex(row if row >= 0 else self.profiles.first_profile())
+
+    def _selected(self):
+        return self.combo.currentData(Qt.ItemDataRole.UserRole)
+
+    def _select(self, name: str):
+        row = self.profiles.row_of(name)
+        if row < 0 and self.search.text():
+            self.search.clear()
+            row = self.profiles.row_of(name)
+        if row >= 0:
+            self.combo.setCurrentIndex(row)
+
+    def _favourite_menu(self, pos):
+        name = self.combo.view().indexAt(pos).data(Qt.ItemDataRole.UserRole)
+        if not name:
+            return
+        fav  = name in self.catalog.favourites
+        menu = QMenu(self)
+        action = menu.addAction(self.t["picker_fav_remove" if fav else "picker_fav_add"])
+        if menu.exec(self.combo.view().viewport().mapToGlobal(pos)) is not action:
+            return
+        self.catalog.favourites.symmetric_difference_update({name})
+        self.settings["favourites"] = sorted(self.catalog.favourites)
+        save_settings(self.settings)
+        self.combo.hidePopup()
+        self._filter_configs(self.search.text())
+        self._select(name)
+
+    def _find_fastest(self):
+        endpoints = self.configs.endpoints()
+        if not endpoints or self.scan is not None:
+            return
+        self.btn_fastest.setEnabled(False)
+        self.op_label.setText(self.t["fastest_running"].format(len(endpoints)))
+        self.scan = ScanThread(endpoints)
+        self.scan.results.connect(self._on_scan)
+        self.scan.start()
+
+    def _on_scan(self, results: list):
+        self.scan.wait()
+        self.scan = None
+        self.btn_fastest.setEnabled(True)
+        self.latency = {name: (median, loss, closed) for name, median, loss, closed in results}
+        for name, median, loss, closed in results:
+            self._record(name, history.SCAN, loss=loss,
+                         rtt=math.nan if median is None or closed else median)
+        self.profiles.set_latency(self.latency)
+        name, median, loss, _ = results[0]
+        if median is None:
+            self.op_label.setText(self.t["fastest_none"])
+            return
+        self._select(name)
+        self.op_label.setText(self.t["fastest_done"].format(name, f"{median:.0f}"))
+
+    # Перетащенные на окно .conf, папки и .zip импортируются в CONFIG_DIR.
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        paths = [u.toLocalFile() for u in event.mimeData().urls() if u.isLocalFile()]
+        if not paths or self.importer is not None:
+            return
+        event.acceptProposedAction()
+        self.op_label.setText(self.t["import_running"])
+        self.importer = ImportThread(
+            paths, {n: self.configs.get(n) for n in self.configs.names()})
+        self.importer.done.connect(self._on_import)
+        self.importer.start()
+
+    def _on_import(self, results: list):
+        self.importer.wait()
+        self.importer = None
+        names = [r["name"] for r in results if r["name"]]
+        if self.configs.refresh(names):
+            self._refresh_configs()
+        self.op_label.setText(self.t["import_done"].format(len(names), len(results)))
+        problems = [f"{os.path.basename(r['source'])}: {r['error']}"
+                    for r in results if r["error"]]
+        problems += [f"{r['name']}: {w}" for r in results if r["name"] for w in r["warnings"]]
+        if problems:
+            more = len(problems) - IMPORT_REPORT
+            text = "\n".join(problems[:IMPORT_REPORT])
+            if more > 0:
+                text += "\n" + self.t["import_more"].format(more)
+            QMessageBox.warning(self, self.t["import_title"],
+                                self.t["import_done"].format(len(names), len(results)) +
+                                "\n\n" + text)
 
     def _rename_config(self):
-        old = self.combo.currentText()
-        if not old or old == self.t["empty"]:
+        old = self._selected()
+        if not old:
             return
         new, ok = QInputDialog.getText(
             self, self.t["rename_title"], self.t["rename_prompt"].format(old))
         if ok and new:
             try:
-                os.rename(os.path.join(CONFIG_DIR, f"{old}.conf"),
-                          os.path.join(CONFIG_DIR, f"{new}.conf"))
+                os.rename(self.configs.path(old), self.configs.path(new))
+                self.configs.refresh([old, new])
+                if old in self.catalog.favourites:
+                    self.catalog.favourites ^= {old, new}
+                    self.settings["favourites"] = sorted(self.catalog.favourites)
+                    save_settings(self.settings)
                 self._refresh_configs()
+                self._select(new)
+                self.update_status()
             except Exception as e:
                 QMessageBox.warning(self, self.t["error_title"], str(e))
 
+    # Интерфейсы сверяются целиком только здесь (запуск, опрос без netlink,
+    # смена конфигов); событие netlink меняет один туннель в _on_link.
     def update_status(self):
-        theme = self.settings.get("theme", "tokyo")
         try:
-            with open("/proc/net/dev") as f:
-                content = f.read()
-            active = next(
-                (self.combo.itemText(i) for i in range(self.combo.count())
-                 if self.combo.itemText(i) in content), None)
-            if active:
-                self.status_card.setText(self.t["status_active"].format(active.upper()))
-                self.status_card.setStyleSheet(status_style_active(theme))
+            self._apply_links(*self.connections.sync(self.link_watcher.up_links()))
+        except OSError as e:
+            print(f"[NETLINK] {e}")
+        self._show_status()
+
+    def _show_status(self):
+        styles = theme_styles(self.settings.get("theme", "tokyo"))
+        try:
+            self.supervisor.link(self._primary())
+            self._supervise()
+            names = self.connections.names()
+            if len(names) > 1:
+                text = self.t["status_multi"].format(len(names),
+                                                     ", ".join(n.upper() for n in names))
+                self.status_card.set_state(text, styles["active"])
+            elif names:
+                text = self.t["status_active"].format(names[0].upper())
+                self.status_card.set_state(text, styles["active"])
             else:
-                self.status_card.setText(self.t["status_off"])
-                self.status_card.setStyleSheet(status_style_idle(theme))
+                text = self.t["status_off"]
+                self.status_card.set_state(text, styles["idle"])
+            self._update_tray(text, bool(names))
         except:
-            self.status_card.setText(self.t["status_ready"])
-            self.status_card.setStyleSheet(status_style_idle(theme))
+            self.status_card.set_state(self.t["status_ready"], styles["idle"])
+            self._update_tray(self.t["status_ready"], False)
+
+    # Туннель под надзором failover: цель supervisor, пока она поднята; без
+    # цели — любой поднятый (например, из CLI), чтобы взять его под надзор.
+    def _primary(self):
+        target = self.supervisor.target
+        if target in self.connections:
+            return target
+        return None if target else min(self.connections.names(), default=None)
+
+    def _apply_links(self, added: list, removed: list):
+        for conn in removed:
+            conn.close()
+            self.metrics.forget(iface=conn.name)
+            row = self.tunnel_rows.pop(conn.name, None)
+            if row:
+                row.deleteLater()
+        for conn in added:
+            try:
+                conn.telemetry = Telemetry(conn.name)
+            except OSError as e:
+                print(f"[TELEMETRY] {e}")
+            cfg = self.configs.get(conn.name)
+            if cfg and STUB_ADDR in cfg["interface"].get("dns", []):
+                conn.dns_probe = StatsProbe()
+            self.metrics.set("minivpn_tunnel_up", 1, iface=conn.name)
+            row = self.tunnel_rows[conn.name] = TunnelRow(conn.name, self.t["tunnel_down_tip"])
+            row.disconnect.connect(lambda name: self._down(name, self._unlock([name])))
+            self.tunnel_box.addWidget(row)
+            if conn.telemetry:
+                self._sample(conn)
+        if not (added or removed):
+            return
+        self.tunnel_panel.setVisible(bool(self.tunnel_rows))
+        if self.connections:
+            if not self.telemetry_timer.isActive():
+                self.telemetry_timer.start(TELEMETRY_IDLE if self.idle else TELEMETRY_POLL)
+        else:
+            self.telemetry_timer.stop()
+        self._apply_idle()
+        self._update_controls()
+
+    def _sample_telemetry(self):
+        primary = self._primary()
+        for conn in list(self.connections.active.values()):
+            if conn.telemetry:
+                age = self._sample(conn)
+                if conn.name == primary:
+                    self.supervisor.handshake(age)
+        self._supervise()
+
+    def _sample(self, conn):
+        tm = conn.telemetry
+        try:
+            tm.sample()
+        except OSError:
+            return None
+        self.metrics.set("minivpn_receive_bytes", tm.last[1], iface=tm.iface)
+        self.metrics.set("minivpn_transmit_bytes", tm.last[2], iface=tm.iface)
+        # В фоне тик раз в 5 с, и каждый сэмпл — уже среднее за 5 с.
+        if self.idle or conn.ticks % 5 == 0:
+            tm.sample_peers()
+            if conn.ticks:
+                n = 1 if self.idle else 5
+                rx, tx = tm.rx.values()[-n:], tm.tx.values()[-n:]
+                self._record(tm.iface, history.TRAFFIC,
+                             rx=sum(rx) / len(rx), tx=sum(tx) / len(tx))
+            if conn.dns_probe and not self.idle:
+                conn.dns_stats = conn.dns_probe.poll()
+        conn.ticks += 1
+        age = tm.handshake_age()
+        if age is not None:
+            self.metrics.set("minivpn_handshake_age_seconds", age, iface=tm.iface)
+        row = self.tunnel_rows.get(conn.name)
+        if self.idle or not row:
+            return age
+        text = f"{conn.name.upper()}  " + self.t["telemetry"].format(
+            fmt_rate(tm.rx.last()), fmt_rate(tm.tx.last()),
+            self.t["handshake_age"].format(int(age)) if age is not None else "—",
+            sparkline(tm.rx.values()))
+        if ds := conn.dns_stats:
+            text += "\n" + self.t["dns_stats"].format(ds["hit_rate"], ds["hit_us"],
+                                                      ds["upstream_ms"])
+        row.label.setText(text)
+        return age
+
+    def _supervise(self):
+        if not self.supervisor.dead() or not self.settings.get("failover", True):
+            return
+        # Туннели, поднятые рядом (другие сайты), failover не трогает.
+        ranked = [name for name, *_ in sorted(
+            ((n, *self.latency.get(n, (None, 1.0, False))) for n in self.configs.names()
+             if n not in self.connections or n == self.supervisor.iface),
+            key=rank_key)]
+        step = self.supervisor.next_action(ranked)
+        if step is None:
+            return
+        action, old, name = step
+        backend = self.settings.get("backend", "wg-quick")
+        self.op_label.setText(self.t["failover_try"].format(name))
+        if action == "switch":
+            self.worker.submit("switch", name, self.configs.path(name), backend,
+                               (old, self.configs.path(old)), self._lock())
+            return
+        if old:
+            self.worker.submit("down", old, self.configs.path(old), backend)
+        self.worker.submit("up", name, self.configs.path(name), backend, lock=self._lock())
 
     def _patch_dns(self):
-        sel = self.combo.currentText()
-        if not sel or sel == self.t["empty"]:
+        sel = self._selected()
+        if not sel:
             QMessageBox.warning(self, self.t["dns_title"], self.t["dns_no_config"])
             return
-        path = os.path.join(CONFIG_DIR, f"{sel}.conf")
-        if not os.path.exists(path):
+        path = self.configs.path(sel)
+        cfg  = self.configs.get(sel)
+        if cfg is None:
             QMessageBox.warning(self, self.t["dns_title"],
                                 self.t["dns_not_found"].format(path))
             return
-        if comment_dns_in_config(path):
+        if STUB_ADDR in cfg["interface"].get("dns", [STUB_ADDR]):
+            QMessageBox.information(self, self.t["dns_title"], self.t["dns_already"])
+            return
+        if query_stats() is None:
+            QMessageBox.warning(self, self.t["dns_title"],
+                                self.t["dns_no_stub"].format(STUB_ADDR))
+            return
+        if stub_dns_in_config(path, STUB_ADDR):
+            self.configs.refresh([sel])
             QMessageBox.information(self, self.t["dns_title"],
                                     self.t["dns_patched"].format(path))
         else:
             QMessageBox.information(self, self.t["dns_title"], self.t["dns_already"])
 
+    def _split_tunnel(self):
+        sel = self._selected()
+        if not sel:
+            QMessageBox.warning(self, self.t["split_title"], self.t["dns_no_config"])
+            return
+        path = self.configs.path(sel)
+        try:
+            dlg = SplitDialog(self, self.t, self.settings, read_split(path))
+        except OSError as e:
+            QMessageBox.warning(self, self.t["split_title"], str(e))
+            return
+        if dlg.exec() != QDialog.DialogCode.Accepted:
+            return
+        lists = dlg.lists()
+        try:
+            before, after = split_tunnel_in_config(path, lists["include"], lists["exclude"])
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, self.t["split_title"], str(e))
+            return
+        self.configs.refresh([sel])
+        QMessageBox.information(self, self.t["split_title"],
+                                self.t["split_done"].format(before, after))
+
+    # Профиль поднимается рядом с уже поднятыми туннелями, если не спорит с
+    # ними за маршруты (Connections.conflicts); второй полный туннель —
+    # переключением с первого. Надзор остаётся на основном туннеле.
     def _connect(self):
-        sel = self.combo.currentText()
-        if sel and sel != self.t["empty"]:
-            r = subprocess.run(["sudo", "wg-quick", "up",
-                                os.path.join(CONFIG_DIR, f"{sel}.conf")],
-                               capture_output=True, text=True)
-            if r.returncode != 0:
-                QMessageBox.warning(self, self.t["conn_error"], r.stderr or "Unknown error")
+        sel = self._selected()
+        if not sel or sel in self.connections:
+            return
+        backend   = self.settings.get("backend", "wg-quick")
+        conflicts = self.connections.conflicts(sel)
+        target    = self.supervisor.target
+        supervise = target not in self.connections or target in conflicts
+        if conflicts:
+            old = conflicts[0]
+            if supervise:
+                self.supervisor.want(sel, "switch")
+            self.worker.submit("switch", sel, self.configs.path(sel), backend,
+                               (old, self.configs.path(old)), self._lock())
+            for name in conflicts[1:]:
+                self._down(name)
+            return
+        if supervise:
+            self.supervisor.want(sel)
+        self.worker.submit("up", sel, self.configs.path(sel), backend, lock=self._lock())
 
+    # Выбранный туннель, если он поднят; иначе все поднятые — параллельно.
+    # Kill switch снимается, только когда пользователь гасит все туннели.
     def _disconnect(self):
-        sel = self.combo.currentText()
-        if sel and sel != self.t["empty"]:
-            subprocess.run(["sudo", "wg-quick", "down",
-                            os.path.join(CONFIG_DIR, f"{sel}.conf")],
-                           capture_output=True)
+        sel = self._selected()
+        if self.connections and sel not in self.connections:
+            names = self.connections.names()
+        else:
+            names = [sel] if sel else []
+        lock = self._unlock(names)
+        for name in names:
+            self._down(name, lock)
+
+    def _down(self, name: str, lock: bool = None):
+        if name == self.supervisor.target:
+            self.supervisor.release(name)
+        self.worker.submit("down", name, self.configs.path(name),
+                           self.settings.get("backend", "wg-quick"), lock=lock)
+
+    # True — ставить kill switch вместе с up/switch; None — режим выключен.
+    def _lock(self):
+        return True if self.settings.get("killswitch", False) else None
+
+    # False — снять kill switch вместе с down, если гасятся все туннели.
+    def _unlock(self, names: list):
+        if self._lock() and set(self.connections.names()) <= set(names):
+            return False
+        return None
+
+    # Включение ставит набор сразу, если туннель уже поднят (иначе — при
+    # подключении); выключение снимает его всегда.
+    def _set_killswitch(self, enabled: bool):
+        if enabled and not self.connections:
+            return
+        self.worker.submit("killswitch", "on" if enabled else "off", "", lock=enabled)
+
+    def _on_busy(self, busy: bool):
+        self._update_controls()
+
+    # Кнопки заняты, только пока идёт операция над их профилем.
+    def _update_controls(self):
+        sel = self._selected()
+        busy = bool(sel) and self.worker.pending(sel)
+        self.btn_up.setEnabled(not busy)
+        self.btn_down.setEnabled(not busy)
+        for name, row in self.tunnel_rows.items():
+            row.button.setEnabled(not self.worker.pending(name))
+
+    # Фазы последней операции и так видны в подсказке строки статуса; поток
+    # фаз в stderr — только при профилировании (MINIVPN_PROFILE).
+    def _on_phase(self, job: str, phase: str, ms: float):
+        print(f"[TUNNEL] {job}: {phase} {ms:.0f} ms", file=sys.stderr)
+
+    def _on_job_done(self, action: str, name: str, rc: int, err: str, phases: dict):
+        self.op_label.setToolTip("\n".join(f"{p}: {ms:.0f} ms" for p, ms in phases.items()))
+        if rc == 0 and action in ("up", "switch"):
+            self._record(name, history.CONNECT, connect=phases.get("total", math.nan))
+        if "total" in phases:
+            self.metrics.observe("minivpn_operation_seconds", phases["total"] / 1000,
+                                 action=action, result="ok" if rc == 0 else "error")
+        if action == "killswitch":
+            self.op_label.setText(self.t[f"killswitch_{name}"] if rc == 0 else "")
+            if rc != 0:
+                QMessageBox.warning(self, self.t["killswitch_error"], err or "Unknown error")
+            return
+        if self.supervisor.job_done(action, name, rc):
+            self.op_label.setText(
+                self.t["failover_done"].format(name) if rc == 0 else
+                self.t["failover_failed"].format(name, round(self.supervisor.retry_in())))
+            return
+        if rc != 0:
+            self.op_label.setText("")
+            if action in ("up", "switch"):
+                QMessageBox.warning(self, self.t["conn_error"], err or "Unknown error")
+            return
+        if action == "switch":
+            self.op_label.setText(self.t["op_switch_done"].format(
+                name, round(phases.get("total", 0)), f"{phases.get('cutover', 0):.1f}"))
+            return
+        key = "op_up_done" if action == "up" else "op_down_done"
+        self.op_label.setText(self.t[key].format(name, round(phases.get("total", 0))))
+
+# Профиль запуска закрывается на первом Paint окна (MINIVPN_PROFILE).
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            profiling.mark("first_paint")
+            profiling.report()
+            if os.environ.get("MINIVPN_PROFILE_EXIT"):
+                QTimer.singleShot(0, QApplication.quit)
+        return False
 
 if __name__ == "__main__":
     app        = QApplication(sys.argv)
+    profiling.mark("qapp")
     settings   = load_settings()
     t          = TRANSLATIONS[settings.get("lang", "ru")]
     distro_key = detect_distro()
+    profiling.mark("settings")
 
     handle_first_run(t, distro_key)
     handle_deps_check(t, distro_key)
+    profiling.mark("checks")
 
     window = UltimateVPN(distro_key)
+    if profiling.ENABLED:
+        first_paint = FirstPaint(window)
+        window.installEventFilter(first_paint)
+        app.aboutToQuit.connect(window.shutdown)
     window.show()
+    profiling.mark("show")
     sys.exit(app.exec())
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+from minivpn.common import APP_DIR
+from minivpn.probe import probe_rtt
+
+BENCH_FILE   = os.path.join(APP_DIR, "bench.jsonl")
+BENCH_PORT   = 5299
+RTT_HOST     = "1.1.1.1"   # цель RTT, если сервер бенчмарка не задан
+RTT_COUNT    = 50
+RTT_GAP      = 0.02
+RTT_TIMEOUT  = 1.0
+DURATION     = 5.0
+MAX_DURATION = 60.0
+TIMEOUT      = 5.0
+CHUNK        = 64 * 1024
+UDP_SIZE     = 1200        # с заголовками UDP/IP/WireGuard влезает в MTU 1420
+UDP_RATE     = 50.0        # Мбит/с предлагаемой нагрузки
+UDP_SETTLE   = 0.25        # дать последним датаграммам долететь до отчёта
+UDP_RUNS     = 64
+DNS_NAMES    = ("example.com", "wikipedia.org", "github.com", "cloudflare.com", "kernel.org")
+
+MAGIC   = b"MVB1"
+REQUEST = struct.Struct("!4scd")    # магия, режим D/U, длительность
+COUNT   = struct.Struct("!Q")
+DGRAM   = struct.Struct("!4scI")    # магия, P (данные) / E (конец), номер прогона
+REPORT  = struct.Struct("!4sIQQ")   # магия, номер прогона, пакеты, байты
+
+# Ключ -> (подпись, единица, больше — лучше). Порядок — порядок вывода.
+METRICS = {
+    "rtt_p50":  ("RTT p50", "ms", False),
+    "rtt_p95":  ("RTT p95", "ms", False),
+    "jitter":   ("jitter", "ms", False),
+    "loss":     ("ping loss", "%", False),
+    "tcp_down": ("TCP ↓", "Mbit/s", True),
+    "tcp_up":   ("TCP ↑", "Mbit/s", True),
+    "udp":      ("UDP", "Mbit/s", True),
+    "udp_loss": ("UDP loss", "%", False),
+    "udp_drop": ("UDP drop", "%", False),
+    "dns_p50":  ("DNS p50", "ms", False),
+    "dns_max":  ("DNS max", "ms", False),
+}
+
+def _pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else math.nan
+
+def parse_server(text: str) -> tuple:
+    host, sep, port = text.rpartition(":")
+    if not sep or "]" in port or (host.count(":") and not host.startswith("[")):
+        return text.strip("[]"), BENCH_PORT   # без порта, в т. ч. голый IPv6
+    return host.strip("[]"), int(port)
+
+# --- клиентская часть: синхронные сокеты, каждый тест — своё соединение ---
+
+async def _rtt_series(host: str, port: int, count: int) -> list:
+    samples = []
+    for i in range(count):
+        try:
+            samples.append(await probe_rtt(host, port, RTT_TIMEOUT))
+        except (OSError, asyncio.TimeoutError):
+            samples.append(None)
+        if i + 1 < count:
+            await asyncio.sleep(RTT_GAP)
+    return samples
+
+# Джиттер — среднее модуля разности соседних RTT (RFC 3550 без сглаживания).
+def rtt_test(host: str, port: int = 443, count: int = RTT_COUNT) -> dict:
+    samples = asyncio.run(_rtt_series(host, port, count))
+    ok = [s for s in samples if s is not None]
+    if not ok:
+        raise OSError(f"{host}: no replies")
+    diffs = [abs(b - a) for a, b in zip(ok, ok[1:])]
+    return {"rtt_p50": _pct(ok, 0.5), "rtt_p95": _pct(ok, 0.95),
+            "jitter": sum(diffs) / len(diffs) if diffs else 0.0,
+            "loss": 100.0 * (len(samples) - len(ok)) / len(samples)}
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("server closed the connection")
+        data += chunk
+    return data
+
+def tcp_download(addr: tuple, duration: float = DURATION) -> float:
+    with socket.create_connection(addr, TIMEOUT) as sock:
+        sock.sendall(REQUEST.pack(MAGIC, b"D", duration))
+        buf, total = bytearray(CHUNK), 0
+        start = time.perf_counter()
+        while n := sock.recv_into(buf):
+            total += n
+        elapsed = time.perf_counter() - start
+    return total * 8 / elapsed / 1e6
+
+# Время — до ответа сервера с числом принятых байт: буферы сокетов к этому
+# моменту пусты, и скорость не завышается их объёмом.
+def tcp_upload(addr: tuple, duration: float = DURATION) -> float:
+    with socket.create_connection(addr, TIMEOUT) as sock:
+        sock.sendall(REQUEST.pack(MAGIC, b"U", duration))
+        data  = bytes(CHUNK)
+        start = time.perf_counter()
+        end   = start + duration
+        while time.perf_counter() < end:
+            sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        total = COUNT.unpack(_recv_exact(sock, COUNT.size))[0]
+        elapsed = time.perf_counter() - start
+    return total * 8 / elapsed / 1e6
+
+# Как iperf -u: шлём с заданной скоростью, сервер считает дошедшее. Потери
+# считаются от реально отправленного; то, что не приняла своя очередь
+# (ENOBUFS), — отдельно, как udp_drop от запланированного.
+def udp_test(addr: tuple, duration: float = DURATION, rate: float = UDP_RATE) -> dict:
+    family, _, _, _, sockaddr = socket.getaddrinfo(*addr, type=socket.SOCK_DGRAM)[0]
+    run    = random.getrandbits(32)
+    packet = DGRAM.pack(MAGIC, b"P", run).ljust(UDP_SIZE, b"\0")
+    gap    = UDP_SIZE * 8 / (rate * 1e6)
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.connect(sockaddr)
+        sent, slot, start = 0, 0, time.perf_counter()
+        end = start + duration
+        while (now := time.perf_counter()) < end:
+            due = int((now - start) / gap) + 1
+            try:
+                while slot < due:
+                    sock.send(packet)
+                    sent += 1
+                    slot += 1
+            except OSError:     # ENOBUFS: очередь устройства полна, слоты пропускаем
+                slot = due
+            time.sleep(0.001)
+        time.sleep(UDP_SETTLE)
+        sock.settimeout(0.5)
+        for _ in range(5):
+            sock.send(DGRAM.pack(MAGIC, b"E", run))
+            try:
+                magic, rid, packets, size = REPORT.unpack(sock.recv(REPORT.size))
+            except (socket.timeout, struct.error):
+                continue
+            if magic == MAGIC and rid == run:
+                return {"udp": size * 8 / duration / 1e6,
+                        "udp_loss": 100.0 * max(sent - packets, 0) / sent if sent else 0.0,
+                        "udp_drop": 100.0 * (slot - sent) / slot if slot else 0.0}
+    raise OSError("no UDP report from the server")
+
+def dns_test(names=DNS_NAMES) -> dict:
+    times = []
+    for name in names:
+        start = time.perf_counter()
+        try:
+            socket.getaddrinfo(name, None, type=socket.SOCK_STREAM)
+        except OSError:
+            continue
+        times.append((time.perf_counter() - start) * 1000)
+    if not times:
+        raise OSError("no names resolved")
+    return {"dns_p50": _pct(times, 0.5), "dns_max": max(times)}
+
+# Прогон набора. Без сервера — только RTT до RTT_HOST и DNS. Ошибка одного
+# теста не обрывает остальные, а попадает в errors.
+def run(server: tuple = None, duration: float = DURATION, count: int = RTT_COUNT,
+        rate: float = UDP_RATE, dns_names=DNS_NAMES, on_result=None) -> dict:
+    tests = [("rtt", lambda: rtt_test(*(server or (RTT_HOST, 443)), count))]
+    if server:
+        tests += [("tcp_down", lambda: {"tcp_down": tcp_download(server, duration)}),
+                  ("tcp_up", lambda: {"tcp_up": tcp_upload(server, duration)}),
+                  ("udp", lambda: udp_test(server, duration, rate))]
+    if dns_names:
+        tests.append(("dns", lambda: dns_test(dns_names)))
+    results, errors = {}, {}
+    for test, fn in tests:
+        try:
+            values = fn()
+        except OSError as e:
+            errors[test] = str(e)
+            values = {}
+        results.update(values)
+        if on_result:
+            on_result(test, values, errors.get(test))
+    return {"results": results, "errors": errors}
+
+# --- хранение и сравнение ---
+
+def save_run(record: dict, path: str = BENCH_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+def load_runs(profile: str = None, path: str = BENCH_FILE) -> list:
+    runs = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue     # недописанная строка после сбоя
+                if profile is None or rec.get("profile") == profile:
+                    runs.append(rec)
+    except FileNotFoundError:
+        pass
+    return runs
+
+# Строки (ключ, a, b, изменение в %, стало ли лучше) по метрикам, что есть в обоих.
+def compare(a: dict, b: dict) -> list:
+    rows = []
+    for key, (_, _, higher) in METRICS.items():
+        if key not in a or key not in b:
+            continue
+        va, vb = a[key], b[key]
+        delta  = (vb - va) / va * 100 if va else math.nan
+        rows.append((key, va, vb, delta, vb > va if higher else vb < va))
+    return rows
+
+# --- стенд-сервер: TCP и UDP на одном порту ---
+
+class _UdpCounter(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.runs = {}    # (адрес, прогон) -> [пакеты, байты]
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < DGRAM.size or data[:4] != MAGIC:
+            return
+        _, kind, run = DGRAM.unpack_from(data)
+        key = (addr, run)
+        if kind == b"P":
+            stats = self.runs.get(key)
+            if stats is None:
+                if len(self.runs) >= UDP_RUNS:
+                    del self.runs[next(iter(self.runs))]
+                stats = self.runs[key] = [0, 0]
+            stats[0] += 1
+            stats[1] += len(data)
+        elif kind == b"E":
+            packets, size = self.runs.get(key, (0, 0))
+            self.transport.sendto(REPORT.pack(MAGIC, run, packets, size), addr)
+
+async def _on_tcp(reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        magic, mode, duration = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+        if magic != MAGIC or not 0 < duration <= MAX_DURATION:
+            return
+        if mode == b"D":
+            data, end = bytes(CHUNK), loop.time() + duration
+            while loop.time() < end:
+                writer.write(data)
+                await writer.drain()
+        elif mode == b"U":
+            total = 0
+            while chunk := await reader.read(CHUNK):
+                total += len(chunk)
+            writer.write(COUNT.pack(total))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, OSError, struct.error):
+        pass    # в т. ч. TCP-пинг: соединение без запроса
+    finally:
+        writer.close()
+
+async def serve(addr: str = "0.0.0.0", port: int = BENCH_PORT):
+    loop = asyncio.get_running_loop()
+    udp, _ = await loop.create_datagram_endpoint(_UdpCounter, local_addr=(addr, port))
+    tcp = await asyncio.start_server(_on_tcp, addr, port)
+    return udp, tcp
+
+async def _serve_forever(args):
+    udp, tcp = await serve(args.listen, args.port)
+    print(f"[BENCH] listening on {args.listen}:{args.port}", flush=True)
+    try:
+        await tcp.serve_forever()
+    finally:
+        udp.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="minivpn.bench")
+    parser.add_argument("--listen", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=BENCH_PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve_forever(args))
+    except OSError as e:
+        print(f"minivpn.bench: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import ipaddress
+import re
+
+from minivpn.wgconf import split_endpoint
+
+# ISO 3166-1 alpha-2: страна профиля берётся из Endpoint (национальный домен
+# или метка вида de-fra-1 в имени хоста), а из имени — только в форме
+# «код + номер» или «код + город + номер» (us-nyc-01, CH#12, de1).
+COUNTRIES = set("""
+ad ae af ag ai al am ao aq ar as at au aw ax az ba bb bd be bf bg bh bi bj bl bm
+bn bo bq br bs bt bv bw by bz ca cc cd cf cg ch ci ck cl cm cn co cr cu cv cw cx
+cy cz de dj dk dm do dz ec ee eg eh er es et fi fj fk fm fo fr ga gb gd ge gf gg
+gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn hr ht hu id ie il im in io iq ir
+is it je jm jo jp ke kg kh ki km kn kp kr kw ky kz la lb lc li lk lr ls lt lu lv
+ly ma mc md me mf mg mh mk ml mm mn mo mp mq mr ms mt mu mv mw mx my mz na nc ne
+nf ng ni nl no np nr nu nz om pa pe pf pg ph pk pl pm pn pr ps pt pw py qa re ro
+rs ru rw sa sb sc sd se sg sh si sj sk sl sm sn so sr ss st sv sx sy sz tc td tf
+tg th tj tk tl tm tn to tr tt tv tw tz ua ug um us uy uz va vc ve vg vi vn vu wf
+ws ye yt za zm zw uk
+""".split())
+# Национальные домены, которые массово берут как общие (.io, .me, .tv и т. п.):
+# по ним страну не определяем.
+GENERIC_TLDS = {"ai", "am", "cc", "co", "fm", "gg", "io", "la", "ly", "me", "nu",
+                "sh", "so", "to", "tv", "ws"}
+# Одна буквенная метка после кода (my-home, no-dns, de-bug) страной не считается:
+# нужен номер.
+COUNTRY_RE   = re.compile(r"([a-z]{2})[-_#.\s]?(?:[a-z]{3}[-_#.\s]?)?\d+(?:[-_#.\s]|$)")
+NO_GROUP     = "—"
+
+def country(name: str):
+    m = COUNTRY_RE.match(name.lower())
+    return m.group(1) if m and m.group(1) in COUNTRIES else None
+
+def endpoint_country(endpoint: str):
+    try:
+        host = split_endpoint(endpoint)[0].lower().rstrip(".")
+    except ValueError:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        pass
+    labels = host.split(".")
+    if len(labels) < 2:
+        return None
+    if labels[-1] in COUNTRIES and labels[-1] not in GENERIC_TLDS:
+        return labels[-1]
+    return country(labels[0]) if len(labels) > 2 else None
+
+def flag(cc: str) -> str:
+    cc = "gb" if cc == "uk" else cc
+    return "".join(chr(0x1F1E6 + ord(c) - ord("a")) for c in cc)
+
+def endpoint_group(endpoint: str) -> str:
+    try:
+        host = split_endpoint(endpoint)[0]
+    except ValueError:
+        return NO_GROUP
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return ".".join(host.lower().split(".")[-2:])
+    return str(ipaddress.ip_network(f"{ip}/{24 if ip.version == 4 else 48}", strict=False))
+
+# Группа: страна из Endpoint, затем из имени, иначе домен или подсеть Endpoint.
+def group_of(name: str, cfg: dict) -> tuple:
+    peers = cfg["peers"] if cfg else []
+    ep    = peers[0].get("endpoint") if peers else None
+    cc    = (ep and endpoint_country(ep)) or country(name)
+    if cc:
+        return cc, f"{flag(cc)} {cc.upper()}"
+    if ep:
+        g = endpoint_group(ep)
+        return "~" + g, g
+    return "~~", NO_GROUP
+
+# Плоский список строк для модели выбора: ("group", подпись) и ("profile", имя).
+# Разбор групп кэшируется по stat конфига, так что обновление папки на тысячи
+# профилей пересчитывает только изменившиеся. Фильтр инкрементальный: запрос,
+# продолжающий предыдущий, ищет только среди прошлых совпадений.
+class Catalog:
+    def __init__(self):
+        self.info       = {}     # имя -> (stat, ключ группы, подпись, endpoint, строка поиска)
+        self.order      = []     # имена в порядке (группа, имя)
+        self.favourites = set()
+        self._query     = ""
+        self._matches   = []
+
+    def update(self, entries: dict) -> bool:
+        changed = set(self.info) != set(entries)
+        for name, entry in entries.items():
+            old = self.info.get(name)
+            if old and old[0] == entry["stat"]:
+                continue
+            cfg   = entry["config"]
+            key, label = group_of(name, cfg)
+            peers = cfg["peers"] if cfg else []
+            ep    = peers[0].get("endpoint", "") if peers else ""
+            self.info[name] = (entry["stat"], key, label, ep, f"{name} {label} {ep}".lower())
+            changed = True
+        for name in set(self.info) - set(entries):
+            del self.info[name]
+        if changed:
+            self.order    = sorted(self.info, key=lambda n: (self.info[n][1], n))
+            self._query   = ""
+            self._matches = self.order
+        return changed
+
+    def endpoint(self, name: str) -> str:
+        info = self.info.get(name)
+        return info[3] if info else ""
+
+    def match(self, query: str) -> list:
+        query = query.strip().lower()
+        base  = self._matches if self._query and query.startswith(self._query) else self.order
+        self._matches = [n for n in base if query in self.info[n][4]] if query else self.order
+        self._query   = query
+        return self._matches
+
+    def rows(self, query: str, fav_label: str) -> list:
+        names = self.match(query)
+        rows  = []
+        favs  = [n for n in names if n in self.favourites]
+        if favs:
+            rows.append(("group", fav_label))
+            rows += [("profile", n) for n in favs]
+        label = None
+        for n in names:
+            if n in self.favourites:
+                continue
+            if self.info[n][2] != label:
+                label = self.info[n][2]
+                rows.append(("group", label))
+            rows.append(("profile", n))
+        return rows
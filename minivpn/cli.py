@@ -0,0 +1,351 @@
+import os
+import sys
+
+from minivpn.common import CONFIG_DIR, CONFIG_CACHE, SOCKET_PATH
+
+PARALLEL = 4   # одновременных up/down
+
+USAGE = """usage: mini-vpn <command> [args]
+
+  status [-v]          print active tunnels ("off" and exit 1 when none)
+  list                 list profiles and their endpoints
+  up <name>...         bring profiles up (several in parallel)
+  down [<name>...]     bring profiles down in parallel (all active when none given)
+  switch <name>        move traffic from the active tunnel to <name>
+                       (make-before-break with the native backend)
+  killswitch on|off|status
+                       block traffic outside the tunnel interfaces and profile
+                       Endpoints (nftables); with "killswitch" in settings, up
+                       and switch enable it and taking all tunnels down removes it
+  split <name> [-i NET,...] [-x NET,...] [--clear]
+                       route only -i / everything but -x through <name>;
+                       NET is a CIDR, address, host name or @file
+  import <path>...     validate and copy .conf files, folders and .zip
+                       archives into the config folder, skipping duplicates
+  history [-d DAYS] [-k probe|scan|traffic|connect]
+                       per-profile latency percentiles, loss, traffic or
+                       connect time recorded by the GUI (default: 7 days, probe)
+  fastest [-n N] [--up]
+                       probe all endpoints, print the N fastest and
+                       optionally bring the fastest one up
+  bench [-s HOST[:PORT]] [-t SECONDS] [-n PINGS] [-r MBIT] [-p PROFILE] [--no-dns]
+                       RTT, jitter, DNS and, against a "python3 -m minivpn.bench"
+                       listener, TCP/UDP throughput; the run is saved per profile
+  bench compare [A [B]]
+                       latest two runs of profile A, or latest runs of A and B
+"""
+
+def profile_names() -> set:
+    try:
+        return {f[:-5] for f in os.listdir(CONFIG_DIR) if f.endswith(".conf")}
+    except OSError:
+        return set()
+
+def active_tunnels() -> list:
+    names = profile_names()
+    return sorted(n for n in os.listdir("/sys/class/net") if n in names)
+
+def _connect():
+    if not os.path.exists(SOCKET_PATH):
+        return None
+    from minivpn import rpc
+    return rpc.connect()
+
+def cmd_status(args: list) -> int:
+    active = active_tunnels()
+    print("\n".join(active) or "off")
+    if "-v" in args and (client := _connect()):
+        with client:
+            st = client.call("status")
+        print(f"ip: {st['ip']}\nping: {st['ping']} ms")
+    return 0 if active else 1
+
+def cmd_list(args: list) -> int:
+    if client := _connect():
+        with client:
+            profiles = client.call("list")
+    else:
+        from minivpn.wgconf import ConfigIndex
+        index = ConfigIndex(CONFIG_DIR, CONFIG_CACHE)
+        index.load()
+        endpoints = index.endpoints()
+        profiles  = [{"name": n, "endpoint": endpoints.get(n)} for n in index.names()]
+    for p in profiles:
+        print(f"{p['name']}\t{p['endpoint'] or '—'}")
+    return 0
+
+def _missing_deps() -> bool:
+    from minivpn.common import build_install_cmd, check_dependencies, detect_distro
+    distro  = detect_distro()
+    missing = check_dependencies(distro)
+    if missing:
+        print(f"missing: {', '.join(missing)}", file=sys.stderr)
+        if cmd := build_install_cmd(distro, ["wireguard-tools"]):
+            print(f"install with: {cmd}", file=sys.stderr)
+    return bool(missing)
+
+# Одна операция; у каждого потока своё соединение с демоном. prefix — имя
+# профиля перед строками вывода, когда туннелей несколько и вывод перемешан.
+def _run_one(action: str, name: str, old: str, backend: str, prefix: str,
+             lock: bool = None) -> int:
+    emit = lambda line: print(prefix + line, file=sys.stderr)
+
+    def on_notify(method: str, params: dict):
+        if method == "output":
+            emit(params["line"])
+
+    if client := _connect():
+        from minivpn.rpc import RpcError
+        with client:
+            try:
+                result = client.call(action, on_notify=on_notify, name=name,
+                                     **({"old": old} if old else {}),
+                                     **({"lock": lock} if lock is not None else {}))
+            except RpcError as e:
+                print(e, file=sys.stderr)
+                return 1
+        rc, phases = 0, result["phases"]
+    else:
+        from minivpn.tunnel import execute, summarize_phases
+        path = os.path.join(CONFIG_DIR, f"{name}.conf")
+        if not os.path.exists(path):
+            print(f"{name}: no such profile", file=sys.stderr)
+            return 1
+        rc, err, phases = execute(action, name, path, backend, on_line=emit,
+                                  old=(old, os.path.join(CONFIG_DIR, f"{old}.conf"))
+                                  if old else None, lock=lock)
+        phases = summarize_phases(phases)
+    if rc:
+        return 1
+    if old:
+        print(f"{old} → {name}: switch in {phases.get('total', 0):.0f} ms, "
+              f"gap {phases.get('cutover', 0):.1f} ms")
+    else:
+        print(f"{name}: {action} in {phases.get('total', 0):.0f} ms")
+    return 0
+
+# Несколько профилей поднимаются и опускаются параллельно. С включённым
+# kill switch up/switch ставят его, а down снимает, когда гасит все туннели.
+def run_tunnels(action: str, names: list, old: str = None) -> int:
+    from minivpn.common import load_settings
+    settings = load_settings()
+    backend  = settings.get("backend", "wg-quick")
+    lock     = None
+    if settings.get("killswitch", False):
+        if action != "down":
+            lock = True
+        elif set(active_tunnels()) <= set(names):
+            lock = False
+    if daemon := _connect():
+        daemon.close()
+    elif backend == "wg-quick" and _missing_deps():
+        return 1
+    if len(names) < 2:
+        return max((_run_one(action, n, old, backend, "", lock) for n in names), default=0)
+    from concurrent.futures import ThreadPoolExecutor
+    from minivpn.tunnel import SUDO
+    if not daemon and SUDO:
+        import subprocess
+        subprocess.run(SUDO + ["-v"])   # пароль один раз, а не в каждом потоке разом
+    with ThreadPoolExecutor(min(len(names), PARALLEL)) as pool:
+        codes = list(pool.map(lambda n: _run_one(action, n, old, backend, f"[{n}] ", lock),
+                              names))
+    return max(codes)
+
+def cmd_up(args: list) -> int:
+    if not args:
+        print("up: profile name required", file=sys.stderr)
+        return 2
+    return run_tunnels("up", args)
+
+def cmd_down(args: list) -> int:
+    return run_tunnels("down", args or active_tunnels())
+
+def cmd_switch(args: list) -> int:
+    if len(args) != 1:
+        print("switch: exactly one profile name required", file=sys.stderr)
+        return 2
+    active = active_tunnels()
+    if args[0] in active:
+        print(f"{args[0]}: already active")
+        return 0
+    if not active:
+        return run_tunnels("up", args)
+    return run_tunnels("switch", args, old=active[0])
+
+def cmd_split(args: list) -> int:
+    from minivpn.common import read_split, split_tunnel_in_config
+    if not args:
+        print("split: profile name required", file=sys.stderr)
+        return 2
+    name, path = args[0], os.path.join(CONFIG_DIR, f"{args[0]}.conf")
+    if not os.path.exists(path):
+        print(f"{name}: no such profile", file=sys.stderr)
+        return 1
+    lists = read_split(path)
+    if len(args) == 1:
+        for key, values in lists.items():
+            print(f"{key}\t{', '.join(values) or '—'}")
+        return 0
+    if "--clear" in args:
+        lists = {"include": [], "exclude": []}
+    given = {"-i": [], "-x": []}
+    for i, arg in enumerate(args):
+        if arg in given:
+            given[arg] += [v for v in args[i + 1].split(",") if v]
+    for flag, key in (("-i", "include"), ("-x", "exclude")):
+        if flag in args:
+            lists[key] = given[flag]
+    before, after = split_tunnel_in_config(path, lists["include"], lists["exclude"])
+    print(f"{name}: AllowedIPs {before} → {after} prefixes")
+    if name in active_tunnels():
+        print(f"{name}: reconnect to apply", file=sys.stderr)
+    return 0
+
+def cmd_import(args: list) -> int:
+    from minivpn.importer import import_configs
+    from minivpn.wgconf import ConfigIndex
+    if not args:
+        print("import: path required", file=sys.stderr)
+        return 2
+    index = ConfigIndex(CONFIG_DIR, CONFIG_CACHE)
+    index.load()
+    results = import_configs(args, CONFIG_DIR, {n: index.get(n) for n in index.names()})
+    for r in results:
+        if r["error"]:
+            print(f"{r['source']}: {r['error']}", file=sys.stderr)
+            continue
+        print(f"{r['source']} → {r['name']}")
+        for warning in r["warnings"]:
+            print(f"{r['source']}: warning: {warning}", file=sys.stderr)
+    names = [r["name"] for r in results if r["name"]]
+    index.refresh(names)
+    print(f"imported {len(names)} of {len(results)}")
+    return 0 if len(names) == len(results) else 1
+
+def cmd_history(args: list) -> int:
+    import math
+    import time
+    from minivpn import history
+    days = float(args[args.index("-d") + 1]) if "-d" in args else 7.0
+    kind = args[args.index("-k") + 1] if "-k" in args else "probe"
+    if kind not in history.KINDS:
+        raise ValueError(f"unknown kind {kind}")
+    try:
+        store = history.History(writable=False)
+    except FileNotFoundError:
+        print("no history yet", file=sys.stderr)
+        return 1
+    with store:
+        rows = store.summary(sorted(profile_names()), history.KINDS[kind],
+                             time.time() - days * 86400)
+    from minivpn.telemetry import fmt_rate
+    fmt = lambda v, f: "—" if math.isnan(v) else f(v)
+    for name, st in sorted(rows.items(), key=lambda r: (math.isnan(r[1]["rtt_p50"]),
+                                                         r[1]["rtt_p50"], r[0])):
+        if kind == "traffic":
+            cols = [f"↓ {fmt(st['rx'], fmt_rate)}", f"↑ {fmt(st['tx'], fmt_rate)}"]
+        elif kind == "connect":
+            cols = [f"connect {fmt(st['connect'], '{:.0f} ms'.format)}"]
+        else:
+            cols = [f"p50 {fmt(st['rtt_p50'], '{:.1f} ms'.format)}",
+                    f"p95 {fmt(st['rtt_p95'], '{:.1f} ms'.format)}",
+                    f"{fmt(st['loss'], '{:.1%}'.format)} loss"]
+        print("\t".join([name, f"{st['samples']} samples"] + cols))
+    return 0 if rows else 1
+
+def cmd_fastest(args: list) -> int:
+    import asyncio
+    from minivpn.probe import scan_endpoints
+    from minivpn.wgconf import ConfigIndex
+    count = int(args[args.index("-n") + 1]) if "-n" in args else 5
+    index = ConfigIndex(CONFIG_DIR, CONFIG_CACHE)
+    index.load()
+    results = asyncio.run(scan_endpoints(index.endpoints()))
+    for name, median, loss, closed in results[:count]:
+        rtt = f"{median:.1f} ms" if median is not None else "—"
+        print(f"{name}\t{rtt}\t{loss:.0%} loss" + ("\tport closed" if closed else ""))
+    if not results or results[0][1] is None:
+        return 1
+    return run_tunnels("up", [results[0][0]]) if "--up" in args else 0
+
+def _bench_compare(args: list) -> int:
+    import math
+    import time
+    from minivpn import bench
+    profiles = args or active_tunnels()[:1] or ["direct"]
+    if len(profiles) == 1:
+        runs = bench.load_runs(profiles[0])[-2:]
+    else:
+        runs = [r for p in profiles[:2] for r in bench.load_runs(p)[-1:]]
+    if len(runs) < 2:
+        print(f"compare: need two runs, have {len(runs)}", file=sys.stderr)
+        return 1
+    a, b = runs
+    stamp = lambda r: f"{r['profile']} {time.strftime('%Y-%m-%d %H:%M', time.localtime(r['time']))}"
+    print(f"{'':<10}\t{stamp(a)}\t{stamp(b)}")
+    for key, va, vb, delta, better in bench.compare(a["results"], b["results"]):
+        label, unit, _ = bench.METRICS[key]
+        change = "—" if math.isnan(delta) else f"{delta:+.1f}%" + (" ✓" if better else "")
+        print(f"{label:<10}\t{va:.1f} {unit}\t{vb:.1f} {unit}\t{change}")
+    return 0
+
+def cmd_bench(args: list) -> int:
+    import time
+    from minivpn import bench
+    if args[:1] == ["compare"]:
+        return _bench_compare(args[1:])
+    server   = bench.parse_server(args[args.index("-s") + 1]) if "-s" in args else None
+    duration = float(args[args.index("-t") + 1]) if "-t" in args else bench.DURATION
+    count    = int(args[args.index("-n") + 1]) if "-n" in args else bench.RTT_COUNT
+    rate     = float(args[args.index("-r") + 1]) if "-r" in args else bench.UDP_RATE
+    profile  = (args[args.index("-p") + 1] if "-p" in args else
+                ",".join(active_tunnels()) or "direct")
+    if not 0 < duration <= bench.MAX_DURATION or count < 1 or rate <= 0:
+        raise ValueError("bad -t, -n or -r")
+
+    def on_result(test, values, error):
+        if error:
+            print(f"{test}: {error}", file=sys.stderr)
+        for key, v in values.items():
+            label, unit, _ = bench.METRICS[key]
+            print(f"{label:<10}\t{v:.1f} {unit}")
+
+    print(f"profile: {profile}", file=sys.stderr)
+    out = bench.run(server, duration, count, rate,
+                    () if "--no-dns" in args else bench.DNS_NAMES, on_result)
+    if out["results"]:
+        bench.save_run({"profile": profile, "time": time.time(),
+                        "server": f"{server[0]}:{server[1]}" if server else None,
+                        "duration": duration, **out})
+    return 1 if out["errors"] else 0
+
+def cmd_killswitch(args: list) -> int:
+    if args[:1] not in (["on"], ["off"], ["status"]):
+        print("killswitch: on, off or status", file=sys.stderr)
+        return 2
+    import subprocess
+    from minivpn.tunnel import KILLSWITCH
+    return subprocess.run(KILLSWITCH + [args[0], "--config-dir", CONFIG_DIR]).returncode
+
+COMMANDS = {"status": cmd_status, "list": cmd_list, "up": cmd_up,
+            "down": cmd_down, "switch": cmd_switch, "split": cmd_split,
+            "import": cmd_import, "history": cmd_history, "fastest": cmd_fastest,
+            "bench": cmd_bench, "killswitch": cmd_killswitch}
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(USAGE, end="", file=sys.stderr)
+        return 2
+    try:
+        return COMMANDS[argv[0]](argv[1:])
+    except (ValueError, IndexError) as e:
+        print(f"{argv[0]}: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"{argv[0]}: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
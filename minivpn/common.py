@@ -0,0 +1,263 @@
+import os
+
+CONFIG_DIR     = os.path.expanduser("~/vpn-configs")
+APP_DIR        = os.path.expanduser("~/.config/mini-vpn")
+FIRST_RUN_FLAG = os.path.join(APP_DIR, ".first_run_done")
+SETTINGS_FILE  = os.path.join(APP_DIR, "settings.json")
+CONFIG_CACHE   = os.path.join(APP_DIR, "configs.json")
+SOCKET_PATH    = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or APP_DIR, "mini-vpn.sock")
+HELPER_SOCKET  = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or APP_DIR, "mini-vpn-helper.sock")
+UPSTREAM_MARK  = "# mini-vpn upstream DNS ="
+SPLIT_MARK     = "# mini-vpn split"
+ALLOWED_MARK   = "# mini-vpn AllowedIPs ="
+
+# json, re and shutil are imported where used: `mini-vpn status` loads this
+# module on every shell prompt and must stay cheap to import.
+
+# Схема settings.json: ключ -> тип или множество допустимых значений. Значение
+# не по схеме отбрасывается при загрузке, и действует умолчание у .get().
+SETTINGS_VERSION    = 1
+SETTINGS_MIGRATIONS = {}   # версия N -> функция(dict) -> dict, переводящая с N-1
+DEFAULT_SETTINGS    = {"lang": "ru", "theme": "tokyo"}
+SETTINGS_SCHEMA     = {
+    "lang":             {"ru", "en"},
+    "theme":            str,
+    "win_w":            int,
+    "win_h":            int,
+    "favourites":       list,
+    "backend":          {"wg-quick", "native"},
+    "failover":         bool,
+    "tray":             bool,
+    "killswitch":       bool,
+    "dead_window":      (int, float),
+    "ip_interval":      (int, float),
+    "ping_interval":    (int, float),
+    "ping_host":        str,
+    "metrics_port":     int,
+    "metrics_textfile": str,
+}
+
+_settings = None
+
+# Один JsonStore на процесс: load_settings() отдаёт его словарь из памяти, так
+# что все читатели видят одни и те же настройки, а save_settings() лишь
+# планирует атомарную запись — серия изменений ложится на диск одной записью.
+def settings_store():
+    global _settings
+    if _settings is None:
+        import atexit
+        from minivpn.store import JsonStore
+        _settings = JsonStore(SETTINGS_FILE, SETTINGS_VERSION, SETTINGS_MIGRATIONS,
+                              SETTINGS_SCHEMA, DEFAULT_SETTINGS)
+        atexit.register(_settings.close)
+    return _settings
+
+def load_settings() -> dict:
+    return settings_store().data
+
+def save_settings(data: dict):
+    settings_store().save(data)
+
+def flush_settings():
+    if _settings is not None:
+        _settings.flush()
+
+DISTROS = {
+    "arch": {
+        "label":   "Arch / Manjaro / EndeavourOS",
+        "pm":      "pacman",
+        "install": "sudo pacman -S --needed --noconfirm {pkgs}",
+        "term":    ["konsole", "kitty", "alacritty", "gnome-terminal", "xterm"],
+        "pkgs": {
+            "wireguard-tools": "wireguard-tools",
+            "openresolv":      "openresolv",
+            "python-requests": "python-requests",
+        },
+        "binaries": ["wg", "wg-quick"],
+    },
+    "debian": {
+        "label":   "Debian / Ubuntu / Mint / Pop!_OS",
+        "pm":      "apt",
+        "install": "sudo apt-get install -y {pkgs}",
+        "term":    ["gnome-terminal", "konsole", "kitty", "alacritty", "xterm"],
+        "pkgs": {
+            "wireguard-tools": "wireguard",
+            "openresolv":      "openresolv",
+            "python-requests": "python3-requests",
+        },
+        "binaries": ["wg", "wg-quick"],
+    },
+    "fedora": {
+        "label":   "Fedora / RHEL / CentOS",
+        "pm":      "dnf",
+        "install": "sudo dnf install -y {pkgs}",
+        "term":    ["gnome-terminal", "konsole", "kitty", "xterm"],
+        "pkgs": {
+            "wireguard-tools": "wireguard-tools",
+            "openresolv":      "openresolv",
+            "python-requests": "python3-requests",
+        },
+        "binaries": ["wg", "wg-quick"],
+    },
+    "opensuse": {
+        "label":   "openSUSE Tumbleweed / Leap",
+        "pm":      "zypper",
+        "install": "sudo zypper install -y {pkgs}",
+        "term":    ["konsole", "gnome-terminal", "xterm"],
+        "pkgs": {
+            "wireguard-tools": "wireguard-tools",
+            "openresolv":      "openresolv",
+            "python-requests": "python3-requests",
+        },
+        "binaries": ["wg", "wg-quick"],
+    },
+    "void": {
+        "label":   "Void Linux",
+        "pm":      "xbps",
+        "install": "sudo xbps-install -Sy {pkgs}",
+        "term":    ["xterm", "kitty", "alacritty"],
+        "pkgs": {
+            "wireguard-tools": "wireguard-tools",
+            "openresolv":      "openresolv",
+            "python-requests": "python3-requests",
+        },
+        "binaries": ["wg", "wg-quick"],
+    },
+}
+
+def detect_distro() -> str:
+    try:
+        with open("/etc/os-release") as f:
+            c = f.read().lower()
+    except:
+        return "unknown"
+    if any(x in c for x in ["arch", "manjaro", "endeavouros", "garuda", "artix"]):
+        return "arch"
+    if any(x in c for x in ["debian", "ubuntu", "mint", "pop", "elementary", "kali", "zorin"]):
+        return "debian"
+    if any(x in c for x in ["fedora", "rhel", "centos", "rocky", "alma"]):
+        return "fedora"
+    if any(x in c for x in ["opensuse", "suse"]):
+        return "opensuse"
+    if "void" in c:
+        return "void"
+    return "unknown"
+
+def build_install_cmd(distro_key: str, pkg_keys: list) -> str:
+    distro = DISTROS.get(distro_key)
+    if not distro:
+        return ""
+    names = [n for k in pkg_keys if (n := distro["pkgs"].get(k, k))]
+    return distro["install"].format(pkgs=" ".join(names)) if names else ""
+
+def check_dependencies(distro_key: str) -> list:
+    import shutil
+    if distro_key == "unknown":
+        return []
+    return [b for b in DISTROS[distro_key]["binaries"] if not shutil.which(b)]
+
+def _write_config(conf_path: str, lines: list):
+    from minivpn.store import write_atomic
+    write_atomic(conf_path, "".join(lines).encode(), os.stat(conf_path).st_mode & 0o7777)
+
+def stub_dns_in_config(conf_path: str, stub: str) -> bool:
+    # DNS = <серверы> → DNS = <stub>; исходные серверы остаются строкой-пометкой,
+    # по ней локальный кэш находит upstream. Поисковые домены сохраняются.
+    import re
+    from minivpn.wgconf import split_dns
+    try:
+        with open(conf_path) as f:
+            lines = f.readlines()
+        new_lines, changed = [], False
+        for line in lines:
+            m = re.match(r"^\s*DNS\s*=(.*)", line, re.IGNORECASE)
+            if not m:
+                new_lines.append(line)
+                continue
+            servers, search = split_dns([v.strip() for v in m.group(1).split(",") if v.strip()])
+            if servers == [stub]:
+                new_lines.append(line)
+                continue
+            new_lines.append(f"{UPSTREAM_MARK} {', '.join(servers)}\n")
+            new_lines.append(f"DNS = {', '.join([stub] + search)}\n")
+            changed = True
+        if changed:
+            _write_config(conf_path, new_lines)
+        return changed
+    except Exception as e:
+        print(f"[DNS] {e}")
+        return False
+
+def read_split(conf_path: str) -> dict:
+    split = {"include": [], "exclude": []}
+    with open(conf_path) as f:
+        for line in f:
+            if line.startswith(SPLIT_MARK):
+                key, _, value = line[len(SPLIT_MARK):].partition("=")
+                if key.strip() in split:
+                    split[key.strip()] += [v.strip() for v in value.split(",") if v.strip()]
+    return split
+
+def split_tunnel_in_config(conf_path: str, include: list, exclude: list) -> tuple:
+    # AllowedIPs каждого пира = (исходные ∩ include) − exclude, сжатые до
+    # минимального набора префиксов. Исходные AllowedIPs и списки остаются
+    # строками-пометками: повторный вызов считает от них, пустые списки
+    # возвращают конфиг как был. Возвращает (префиксов до, после).
+    import ipaddress
+    import re
+    from minivpn import split
+    from minivpn.wgconf import split_endpoint
+    allowed_re  = re.compile(r"^\s*AllowedIPs\s*=([^#]*)", re.IGNORECASE)
+    endpoint_re = re.compile(r"^\s*Endpoint\s*=([^#]*)", re.IGNORECASE)
+    inc = split.to_intervals(split.resolve(include)) if include else None
+    exc = split.to_intervals(split.resolve(exclude)) if exclude else None
+    with open(conf_path) as f:
+        lines = f.readlines()
+    blocks = [[]]
+    for line in lines:
+        if line.strip().startswith("["):
+            blocks.append([])
+        blocks[-1].append(line)
+    out, before, after = [], 0, 0
+    for block in blocks:
+        head = block[0].strip().lower() if block else ""
+        if head == "[interface]":
+            out.append(block[0])
+            out += [f"{SPLIT_MARK} {k} = {', '.join(v)}\n"
+                    for k, v in (("include", include), ("exclude", exclude)) if v]
+            out += [l for l in block[1:] if not l.startswith(SPLIT_MARK)]
+            continue
+        if head != "[peer]":
+            out += block
+            continue
+        source = ([l[len(ALLOWED_MARK):] for l in block if l.startswith(ALLOWED_MARK)] or
+                  [m.group(1) for l in block if (m := allowed_re.match(l))])
+        original = [v.strip() for s in source for v in s.split(",") if v.strip()]
+        rest, at = [], None
+        for l in block:
+            if l.startswith(ALLOWED_MARK) or allowed_re.match(l):
+                at = len(rest) if at is None else at
+            else:
+                rest.append(l)
+        if at is None:
+            at = len(rest)
+            while at > 1 and not rest[at - 1].strip():
+                at -= 1
+        if include or exclude:
+            iv = split.derive(split.to_intervals(
+                ipaddress.ip_network(c, strict=False) for c in original), inc, exc)
+            ends = [m.group(1).strip() for l in block if (m := endpoint_re.match(l))]
+            if ends:
+                host = split_endpoint(ends[0])[0]
+                iv = split.carve_endpoint(iv, split.to_intervals(split.resolve([host])))
+            derived = split.to_cidrs(iv)
+            new = [f"{ALLOWED_MARK} {', '.join(original)}\n"]
+        else:
+            derived, new = original, []
+        if derived:
+            new.append(f"AllowedIPs = {', '.join(derived)}\n")
+        before += len(original)
+        after  += len(derived)
+        out += rest[:at] + new + rest[at:]
+    _write_config(conf_path, out)
+    return before, after
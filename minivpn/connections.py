@@ -0,0 +1,143 @@
+import ipaddress
+import threading
+import time
+
+from minivpn.split import BITS, to_intervals
+
+class Connection:
+    __slots__ = ("name", "since", "telemetry", "dns_probe", "dns_stats", "ticks")
+
+    def __init__(self, name: str):
+        self.name      = name
+        self.since     = time.time()
+        self.telemetry = None
+        self.dns_probe = None
+        self.dns_stats = None
+        self.ticks     = 0
+
+    def close(self):
+        for res in (self.telemetry, self.dns_probe):
+            if res:
+                res.close()
+        self.telemetry = self.dns_probe = self.dns_stats = None
+
+# Поднятые туннели по интерфейсам. Интерфейс называется как профиль (так его
+# называют и wg-quick, и нативный бэкенд), поэтому сопоставление — поиск в
+# словаре индекса конфигов, а событие netlink меняет состояние одного туннеля,
+# не пересчитывая остальные. link() и sync() возвращают (поднятые, упавшие).
+class Connections:
+    def __init__(self, index):
+        self.index   = index
+        self.active  = {}    # интерфейс -> Connection
+        self._routes = {}    # профиль -> (stat конфига, результат routes())
+
+    def __contains__(self, name) -> bool:
+        return name in self.active
+
+    def __len__(self) -> int:
+        return len(self.active)
+
+    def names(self) -> list:
+        return sorted(self.active)
+
+    def link(self, name: str, up: bool) -> tuple:
+        if up and name not in self.active and name in self.index:
+            conn = self.active[name] = Connection(name)
+            return [conn], []
+        if not up and name in self.active:
+            return [], [self.active.pop(name)]
+        return [], []
+
+    def sync(self, links: set) -> tuple:
+        now     = {n for n in links if n in self.index}
+        removed = [self.active.pop(n) for n in sorted(set(self.active) - now)]
+        added   = []
+        for name in sorted(now - set(self.active)):
+            conn = self.active[name] = Connection(name)
+            added.append(conn)
+        return added, removed
+
+    # (префиксы AllowedIPs, полный ли туннель): полный — забирает хотя бы
+    # половину адресов семейства, как 0.0.0.0/0 или он же за вычетом LAN.
+    def routes(self, name: str) -> tuple:
+        entry = self.index.entries.get(name)
+        if not entry:
+            return frozenset(), False
+        cached = self._routes.get(name)
+        if cached and cached[0] == entry["stat"]:
+            return cached[1]
+        nets = set()
+        for peer in entry["config"]["peers"]:
+            for value in peer.get("allowedips", []):
+                try:
+                    nets.add(ipaddress.ip_network(value, strict=False))
+                except ValueError:
+                    pass
+        iv   = to_intervals(nets)
+        full = any(sum(hi - lo for lo, hi in iv[v]) * 2 >= 1 << BITS[v] for v in BITS)
+        self._routes[name] = (entry["stat"], (frozenset(nets), full))
+        return self._routes[name][1]
+
+    # Поднятые туннели, с которыми профиль рядом не поднять: оба полные (одна
+    # таблица маршрутизации по умолчанию) или делят одинаковый префикс. Более
+    # узкие сети внутри полного туннеля не мешают — маршрут выбирается по
+    # длиннейшему префиксу.
+    def conflicts(self, name: str) -> list:
+        nets, full = self.routes(name)
+        out = []
+        for other in self.names():
+            if other == name:
+                continue
+            other_nets, other_full = self.routes(other)
+            if (full and other_full) or nets & other_nets:
+                out.append(other)
+        return out
+
+# Очередь операций с туннелями для пула потоков: задания над разными профилями
+# идут параллельно, над одним профилем (switch занимает оба) — по очереди подачи.
+class JobQueue:
+    def __init__(self):
+        self.cond    = threading.Condition()
+        self.waiting = []       # (ключ, профили, задание) в порядке подачи
+        self.running = set()    # профили, над которыми идёт операция
+        self.keys    = set()    # (action, name) поданных и не завершённых
+        self.closed  = False
+
+    def put(self, key: tuple, profiles, job) -> bool:
+        with self.cond:
+            if key in self.keys or self.closed:
+                return False
+            self.keys.add(key)
+            self.waiting.append((key, frozenset(profiles), job))
+            self.cond.notify_all()
+            return True
+
+    def pending(self, name: str) -> bool:
+        with self.cond:
+            return any(name == key[1] for key in self.keys)
+
+    def take(self):
+        with self.cond:
+            while not self.closed:
+                blocked = set(self.running)
+                for i, (key, profiles, job) in enumerate(self.waiting):
+                    if not profiles & blocked:
+                        del self.waiting[i]
+                        self.running |= profiles
+                        return key, profiles, job
+                    blocked |= profiles   # не обгонять раннее задание того же профиля
+                self.cond.wait()
+            return None
+
+    # True, если после этого задания очередь пуста.
+    def done(self, key: tuple, profiles) -> bool:
+        with self.cond:
+            self.running -= profiles
+            self.keys.discard(key)
+            self.cond.notify_all()
+            return not self.keys
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
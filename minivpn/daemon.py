@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import contextlib
+import grp
+import os
+import signal
+import sys
+import time
+
+from minivpn import netlink
+from minivpn import dns
+from minivpn import metrics
+from minivpn import native
+from minivpn.common import CONFIG_DIR, CONFIG_CACHE, SOCKET_PATH, load_settings
+from minivpn.inotify import Inotify, CONFIG_EVENTS, IN_Q_OVERFLOW
+from minivpn.monitor import MonitorEngine
+from minivpn.rpc import RpcError, OP_BUSY, OP_FAILED, INVALID_PARAMS, serve
+from minivpn.tunnel import execute, run_killswitch, summarize_phases
+from minivpn.wgconf import ConfigIndex
+
+SAMPLE_INTERVAL = 5.0   # опрос счётчиков интерфейсов для метрик
+
+def read_counters(iface: str) -> dict:
+    base = f"/sys/class/net/{iface}/statistics/"
+    counters = {}
+    for key in ("rx_bytes", "tx_bytes"):
+        try:
+            with open(base + key) as f:
+                counters[key] = int(f.read())
+        except (OSError, ValueError):
+            pass
+    return counters
+
+class Engine:
+    def __init__(self, config_dir: str = CONFIG_DIR, cache_file: str = CONFIG_CACHE,
+                 backend: str = "wg-quick", dns_addr: str = None, exporter: dict = None):
+        self.configs   = ConfigIndex(config_dir, cache_file)
+        self.links     = netlink.LinkTable()
+        self.backend   = backend
+        self.ip        = "—"
+        self.ping      = "—"
+        self.ops       = {}
+        self.busy      = set()   # (action, name): только для ошибки «уже выполняется»
+        self.locks     = {}      # профиль -> asyncio.Lock
+        self.started   = time.time()
+        self.link_sock = None
+        self.ino       = None
+        self.metrics   = metrics.Registry()
+        self.monitor   = MonitorEngine(self._on_ip, self._on_ping, metrics=self.metrics)
+        self.export    = exporter
+        self.exporter  = None
+        self._exported = set()
+        self.dns_addr  = dns_addr
+        self.resolver  = None
+        self._servers  = ()
+        self._tasks    = []
+
+    def _on_ip(self, ip: str):
+        self.ip = ip
+
+    def _on_ping(self, ping: str):
+        self.ping = ping
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.configs.load()
+        try:
+            self.ino = Inotify()
+            self.ino.add_watch(self.configs.config_dir, CONFIG_EVENTS)
+            loop.add_reader(self.ino.fileno(), self._on_config_events)
+        except OSError as e:
+            print(f"[INOTIFY] {e}", file=sys.stderr)
+            self.ino = None
+        try:
+            self.link_sock = netlink.open_link_socket()
+            self.links.load(self.link_sock)
+            self.link_sock.setblocking(False)
+            loop.add_reader(self.link_sock.fileno(), self._on_link_events)
+        except OSError as e:
+            print(f"[NETLINK] {e}", file=sys.stderr)
+            self.link_sock = None
+        self._tasks.append(asyncio.create_task(self.monitor.run()))
+        if self.dns_addr:
+            config_dir     = self.configs.config_dir
+            self.resolver  = dns.StubResolver(lambda: dns.profile_upstreams(config_dir))
+            self._servers  = await dns.serve(self.resolver, self.dns_addr)
+        if self.export is not None:
+            self.exporter = metrics.Exporter(self.metrics, **self.export)
+            self._tasks.append(asyncio.create_task(self._sample_loop()))
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        self.monitor.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.exporter:
+            self.exporter.close()
+
+    def _on_config_events(self):
+        events = self.ino.read()
+        if any(mask & IN_Q_OVERFLOW for _, mask, _, _ in events):
+            self.configs.rescan()
+        else:
+            self.configs.refresh({n[:-5] for _, _, _, n in events if n.endswith(".conf")})
+
+    def _on_link_events(self):
+        try:
+            if self.links.drain(self.link_sock):
+                self.monitor.refresh_ip()
+        except OSError as e:
+            print(f"[NETLINK] {e}", file=sys.stderr)
+
+    # Счётчики и рукопожатия собираются здесь, а не на запрос метрик.
+    # Рукопожатие — только через netlink: без прав его просто нет в выдаче.
+    async def _sample_loop(self):
+        while True:
+            active = set(self.active())
+            for name in self._exported - active:
+                self.metrics.forget(iface=name)
+            for name in active:
+                counters = read_counters(name)
+                self.metrics.set("minivpn_tunnel_up", 1, iface=name)
+                if "rx_bytes" in counters:
+                    self.metrics.set("minivpn_receive_bytes", counters["rx_bytes"], iface=name)
+                if "tx_bytes" in counters:
+                    self.metrics.set("minivpn_transmit_bytes", counters["tx_bytes"], iface=name)
+                try:
+                    handshake = max((p["handshake"] for p in native.get_peers(name)), default=0)
+                except OSError:
+                    handshake = 0
+                if handshake:
+                    self.metrics.set("minivpn_handshake_age_seconds",
+                                     time.time() - handshake, iface=name)
+            self._exported = active
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def up_links(self) -> set:
+        if self.link_sock:
+            return self.links.up_links()
+        with open("/proc/net/dev") as f:
+            return {line.split(":", 1)[0].strip() for line in f.readlines()[2:]}
+
+    def active(self) -> list:
+        if not self.ino:
+            self.configs.rescan()
+        return sorted(n for n in self.up_links() if n in self.configs)
+
+    async def rpc_list(self, notify) -> list:
+        if not self.ino:
+            self.configs.rescan()
+        endpoints = self.configs.endpoints()
+        return [{"name": n, "endpoint": endpoints.get(n)} for n in self.configs.names()]
+
+    async def rpc_status(self, notify) -> dict:
+        return {"active": self.active(), "ip": self.ip, "ping": self.ping}
+
+    async def rpc_metrics(self, notify) -> dict:
+        return {"ip": self.ip, "ping": self.ping, "uptime": time.time() - self.started,
+                "interfaces": {n: read_counters(n) for n in self.active()},
+                "ops": self.ops,
+                "dns": self.resolver.stats() if self.resolver else None}
+
+    async def rpc_up(self, notify, name: str, lock: bool = None) -> dict:
+        return await self._run("up", name, notify, lock=lock)
+
+    async def rpc_down(self, notify, name: str, lock: bool = None) -> dict:
+        return await self._run("down", name, notify, lock=lock)
+
+    async def rpc_switch(self, notify, name: str, old: str, lock: bool = None) -> dict:
+        return await self._run("switch", name, notify, old, lock)
+
+    async def rpc_killswitch(self, notify, enable: bool) -> dict:
+        if not isinstance(enable, bool):
+            raise RpcError(INVALID_PARAMS, f"invalid enable: {enable!r}")
+        rc, err, phases = await asyncio.to_thread(run_killswitch, enable, self.configs.config_dir)
+        if rc != 0:
+            raise RpcError(OP_FAILED, err or "killswitch failed")
+        return {"action": "killswitch", "rc": rc, "error": err,
+                "phases": summarize_phases(phases)}
+
+    async def _run(self, action: str, name: str, notify, old: str = None,
+                   lock: bool = None) -> dict:
+        for profile in filter(None, (name, old)):
+            if profile not in self.configs:
+                raise RpcError(INVALID_PARAMS, f"unknown profile: {profile}")
+        if lock not in (None, True, False):
+            raise RpcError(INVALID_PARAMS, f"invalid lock: {lock!r}")
+        if (action, name) in self.busy:
+            raise RpcError(OP_BUSY, f"{action} {name} already in progress")
+        loop = asyncio.get_running_loop()
+        emit = lambda method, **p: loop.call_soon_threadsafe(lambda: notify(method, **p))
+        self.busy.add((action, name))
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # Операции над одним профилем — по очереди (switch занимает оба),
+                # над разными — параллельно; порядок захвата один для всех.
+                for profile in sorted({name, old} if old else {name}):
+                    await stack.enter_async_context(
+                        self.locks.setdefault(profile, asyncio.Lock()))
+                rc, err, phases = await asyncio.to_thread(
+                    execute, action, name, self.configs.path(name), self.backend,
+                    lambda line: emit("output", line=line),
+                    lambda phase, ms: emit("phase", phase=phase, ms=ms),
+                    (old, self.configs.path(old)) if old else None, lock)
+        finally:
+            self.busy.discard((action, name))
+        result = {"action": action, "rc": rc, "error": err,
+                  "phases": summarize_phases(phases), "time": time.time()}
+        if "total" in result["phases"]:
+            self.metrics.observe("minivpn_operation_seconds", result["phases"]["total"] / 1000,
+                                 action=action, result="ok" if rc == 0 else "error")
+        self.ops[name] = result
+        if rc != 0:
+            raise RpcError(OP_FAILED, err or f"{action} {name} failed")
+        return result
+
+async def run(args):
+    exporter = None
+    if args.metrics or args.metrics_textfile:
+        exporter = {"textfile": args.metrics_textfile}
+        if args.metrics:
+            exporter["addr"], exporter["port"] = args.metrics
+    engine = Engine(args.config_dir, args.cache, args.backend,
+                    dns.STUB_ADDR if args.dns else None, exporter)
+    await engine.start()
+    gid    = grp.getgrnam(args.group).gr_gid if args.group else -1
+    server = await serve(engine, args.socket, 0o660 if args.group else 0o600, gid)
+    stop   = asyncio.Event()
+    loop   = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"mini-vpn daemon listening on {args.socket}", file=sys.stderr)
+    await stop.wait()
+    server.close()
+    await server.wait_closed()
+    await engine.stop()
+    os.unlink(args.socket)
+
+def listen_addr(value: str) -> tuple:
+    addr, _, port = value.rpartition(":")
+    try:
+        return addr.strip("[]") or metrics.METRICS_ADDR, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid [ADDR:]PORT: {value}") from None
+
+def main(argv=None) -> int:
+    settings = load_settings()
+    parser = argparse.ArgumentParser(prog="minivpn.daemon")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--config-dir", default=CONFIG_DIR)
+    parser.add_argument("--cache", default=CONFIG_CACHE)
+    parser.add_argument("--backend", choices=["wg-quick", "native"],
+                        default=settings.get("backend", "wg-quick"))
+    parser.add_argument("--group", help="allow members of this group to use the socket")
+    parser.add_argument("--dns", action="store_true",
+                        help=f"serve the caching DNS resolver on {dns.STUB_ADDR}")
+    parser.add_argument("--metrics", metavar="[ADDR:]PORT", type=listen_addr,
+                        help=f"serve Prometheus metrics over HTTP (default address "
+                             f"{metrics.METRICS_ADDR})")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="write metrics for the node_exporter textfile collector")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run(args))
+    except (RuntimeError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
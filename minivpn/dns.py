@@ -0,0 +1,364 @@
+import argparse
+import asyncio
+import os
+import random
+import signal
+import socket
+import statistics
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+from minivpn.common import CONFIG_DIR, UPSTREAM_MARK
+from minivpn.telemetry import Ring
+from minivpn.wgconf import split_dns
+
+STUB_ADDR        = "127.0.0.153"
+STUB_PORT        = 53
+CACHE_SIZE       = 4096
+MAX_TTL          = 86400
+NEG_TTL          = 30      # ответ без записей и без SOA
+PREFETCH_HITS    = 3       # столько попаданий — и запись считается горячей
+PREFETCH_LEFT    = 0.1     # горячая запись обновляется, когда осталось 10% TTL
+UPSTREAM_TIMEOUT = 2.0
+UPSTREAM_REFRESH = 5.0
+STATS_NAME       = "stats.mini-vpn"
+
+HEADER    = struct.Struct("!HHHHHH")
+RR_FIXED  = struct.Struct("!HHIH")
+QR, AA, TC, RD, RA = 0x8000, 0x0400, 0x0200, 0x0100, 0x0080
+RCODE_SERVFAIL, RCODE_NXDOMAIN = 2, 3
+TYPE_TXT, TYPE_OPT, CLASS_CH   = 16, 41, 3
+
+def _skip_name(msg: bytes, off: int) -> int:
+    while True:
+        n = msg[off]
+        if n == 0:
+            return off + 1
+        if n & 0xC0 == 0xC0:
+            return off + 2
+        off += n + 1
+
+def parse_question(msg: bytes) -> tuple:
+    labels, off = [], HEADER.size
+    while msg[off]:
+        n = msg[off]
+        labels.append(msg[off + 1:off + 1 + n].decode("ascii", "replace").lower())
+        off += n + 1
+    qtype, qclass = struct.unpack_from("!HH", msg, off + 1)
+    return ".".join(labels), qtype, qclass, off + 5
+
+def ttl_offsets(msg: bytes) -> list:
+    # Смещения и значения TTL всех записей, кроме OPT (там в поле TTL флаги EDNS).
+    _, _, qd, an, ns, ar = HEADER.unpack_from(msg)
+    off = HEADER.size
+    for _ in range(qd):
+        off = _skip_name(msg, off) + 4
+    ttls = []
+    for _ in range(an + ns + ar):
+        off = _skip_name(msg, off)
+        rtype, _, ttl, rdlen = RR_FIXED.unpack_from(msg, off)
+        if rtype != TYPE_OPT:
+            ttls.append((off + 4, ttl))
+        off += RR_FIXED.size + rdlen
+    return ttls
+
+def _with_id(msg: bytes, qid: int) -> bytes:
+    return struct.pack("!H", qid) + msg[2:]
+
+def _error(query: bytes, rcode: int) -> bytes:
+    qid, flags = struct.unpack_from("!HH", query)
+    end = parse_question(query)[3]
+    return (HEADER.pack(qid, QR | RA | (flags & RD) | rcode, 1, 0, 0, 0) +
+            query[HEADER.size:end])
+
+def _truncated(query: bytes) -> bytes:
+    qid, flags = struct.unpack_from("!HH", query)
+    end = parse_question(query)[3]
+    return HEADER.pack(qid, QR | RA | TC | (flags & RD), 1, 0, 0, 0) + query[HEADER.size:end]
+
+def _txt_reply(query: bytes, text: str) -> bytes:
+    qid, flags = struct.unpack_from("!HH", query)
+    end  = parse_question(query)[3]
+    data = text.encode()[:255]
+    return (HEADER.pack(qid, QR | AA | (flags & RD), 1, 1, 0, 0) + query[HEADER.size:end] +
+            struct.pack("!HHHIH", 0xC00C, TYPE_TXT, CLASS_CH, 0, len(data) + 1) +
+            bytes([len(data)]) + data)
+
+def build_query(name: str, qtype: int, qclass: int = 1, qid: int = None) -> bytes:
+    qname = b"".join(bytes([len(p)]) + p.encode() for p in name.strip(".").split(".")) + b"\0"
+    qid   = random.getrandbits(16) if qid is None else qid
+    return HEADER.pack(qid, RD, 1, 0, 0, 0) + qname + struct.pack("!HH", qtype, qclass)
+
+def profile_upstreams(config_dir: str = CONFIG_DIR) -> list:
+    # Серверы из пометки, оставленной кнопкой DNS, у поднятых сейчас профилей.
+    servers = []
+    for name in sorted(os.listdir("/sys/class/net")):
+        try:
+            with open(os.path.join(config_dir, f"{name}.conf")) as f:
+                for line in f:
+                    if line.startswith(UPSTREAM_MARK):
+                        values = [v.strip() for v in line[len(UPSTREAM_MARK):].split(",")]
+                        servers += split_dns(values)[0]
+        except OSError:
+            continue
+    return servers
+
+class Entry:
+    __slots__ = ("msg", "ttls", "stored", "ttl", "hits")
+
+    def __init__(self, msg: bytes, ttls: list, now: float):
+        self.msg    = msg
+        self.ttls   = ttls
+        self.stored = now
+        self.ttl    = min([t for _, t in ttls] or [NEG_TTL])
+        self.hits   = 0
+
+    def render(self, qid: int, now: float) -> bytes:
+        age = int(now - self.stored)
+        msg = bytearray(self.msg)
+        struct.pack_into("!H", msg, 0, qid)
+        for off, ttl in self.ttls:
+            struct.pack_into("!I", msg, off, max(0, ttl - age))
+        return bytes(msg)
+
+class StubResolver:
+    def __init__(self, upstreams=profile_upstreams, cache_size: int = CACHE_SIZE):
+        self.upstreams   = upstreams
+        self.cache_size  = cache_size
+        self.cache       = OrderedDict()
+        self.inflight    = {}
+        self.hits        = 0
+        self.misses      = 0
+        self.prefetches  = 0
+        self.failures    = 0
+        self.hit_us      = Ring(256)
+        self.upstream_ms = Ring(256)
+        self._servers    = []
+        self._servers_at = -UPSTREAM_REFRESH
+
+    def servers(self) -> list:
+        now = time.monotonic()
+        if now - self._servers_at >= UPSTREAM_REFRESH:
+            try:
+                self._servers = self.upstreams()
+            except OSError:
+                self._servers = []
+            self._servers_at = now
+        return self._servers
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        med   = lambda ring: statistics.median(ring.values()) if ring.count else 0.0
+        return {"hits": self.hits, "misses": self.misses, "prefetches": self.prefetches,
+                "failures": self.failures, "size": len(self.cache),
+                "hit_rate": self.hits / total if total else 0.0,
+                "hit_us": med(self.hit_us), "upstream_ms": med(self.upstream_ms)}
+
+    async def resolve(self, query: bytes) -> bytes:
+        start = time.perf_counter()
+        qid   = struct.unpack_from("!H", query)[0]
+        qname, qtype, qclass, _ = parse_question(query)
+        if qclass == CLASS_CH and qname == STATS_NAME:
+            s = self.stats()
+            return _txt_reply(query, " ".join(
+                f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in s.items()))
+        key   = (qname, qtype, qclass)
+        now   = time.monotonic()
+        entry = self.cache.get(key)
+        if entry and now - entry.stored < entry.ttl:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            entry.hits += 1
+            if (entry.hits >= PREFETCH_HITS and key not in self.inflight and
+                    entry.ttl - (now - entry.stored) < entry.ttl * PREFETCH_LEFT):
+                self.prefetches += 1
+                self._fetch(key, query)
+            reply = entry.render(qid, now)
+            self.hit_us.push((time.perf_counter() - start) * 1e6)
+            return reply
+        self.misses += 1
+        try:
+            reply = await asyncio.shield(self.inflight.get(key) or self._fetch(key, query))
+        except (OSError, asyncio.TimeoutError, ValueError):
+            self.failures += 1
+            return _error(query, RCODE_SERVFAIL)
+        return _with_id(reply, qid)
+
+    def _fetch(self, key: tuple, query: bytes) -> asyncio.Task:
+        # Одна задача на имя: одинаковые промахи и предвыборка ждут один ответ.
+        task = asyncio.ensure_future(self._forward(key, query))
+        self.inflight[key] = task
+        task.add_done_callback(lambda t: self.inflight.pop(key, None))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _forward(self, key: tuple, query: bytes) -> bytes:
+        servers = self.servers()
+        if not servers:
+            raise OSError("no upstream DNS for the active profile")
+        query = _with_id(query, random.getrandbits(16))
+        error = None
+        for server in servers:
+            start = time.perf_counter()
+            try:
+                reply = await asyncio.wait_for(_udp_exchange(server, query), UPSTREAM_TIMEOUT)
+                if struct.unpack_from("!H", reply, 2)[0] & TC:
+                    reply = await asyncio.wait_for(_tcp_exchange(server, query),
+                                                   UPSTREAM_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                error = e
+                continue
+            self.upstream_ms.push((time.perf_counter() - start) * 1000)
+            self._store(key, reply)
+            return reply
+        raise error
+
+    def _store(self, key: tuple, reply: bytes):
+        flags = struct.unpack_from("!H", reply, 2)[0]
+        if flags & TC or (flags & 0xF) not in (0, RCODE_NXDOMAIN):
+            return
+        ttls = [(off, min(ttl, MAX_TTL)) for off, ttl in ttl_offsets(reply)]
+        self.cache[key] = Entry(reply, ttls, time.monotonic())
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+async def _udp_exchange(server: str, query: bytes) -> bytes:
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ":" in server else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        await loop.sock_connect(sock, (server, 53))
+        await loop.sock_sendall(sock, query)
+        while True:
+            reply = await loop.sock_recv(sock, 65535)
+            if reply[:2] == query[:2] and len(reply) >= HEADER.size:
+                return reply
+
+async def _tcp_exchange(server: str, query: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection(server, 53)
+    try:
+        writer.write(struct.pack("!H", len(query)) + query)
+        await writer.drain()
+        size = struct.unpack("!H", await reader.readexactly(2))[0]
+        return await reader.readexactly(size)
+    finally:
+        writer.close()
+
+class _UdpServer(asyncio.DatagramProtocol):
+    def __init__(self, resolver: StubResolver):
+        self.resolver  = resolver
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        asyncio.ensure_future(self._answer(data, addr))
+
+    async def _answer(self, data: bytes, addr):
+        try:
+            reply = await self.resolver.resolve(data)
+        except (IndexError, struct.error, UnicodeError):
+            return
+        # Без EDNS клиент принимает не больше 512 байт — пусть повторит по TCP.
+        if len(reply) > 512 and HEADER.unpack_from(data)[5] == 0:
+            reply = _truncated(data)
+        self.transport.sendto(reply, addr)
+
+async def serve(resolver: StubResolver, addr: str = STUB_ADDR, port: int = STUB_PORT):
+    async def on_tcp(reader, writer):
+        try:
+            while True:
+                size  = struct.unpack("!H", await reader.readexactly(2))[0]
+                reply = await resolver.resolve(await reader.readexactly(size))
+                writer.write(struct.pack("!H", len(reply)) + reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, OSError, IndexError, struct.error):
+            pass
+        finally:
+            writer.close()
+
+    loop = asyncio.get_running_loop()
+    udp, _ = await loop.create_datagram_endpoint(lambda: _UdpServer(resolver),
+                                                 local_addr=(addr, port))
+    tcp = await asyncio.start_server(on_tcp, addr, port)
+    return udp, tcp
+
+def query_stats(addr: str = STUB_ADDR, port: int = STUB_PORT, timeout: float = 0.3):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.sendto(build_query(STATS_NAME, TYPE_TXT, CLASS_CH), (addr, port))
+            return parse_stats(sock.recv(4096))
+        except OSError:
+            return None
+
+def parse_stats(reply: bytes):
+    if not HEADER.unpack_from(reply)[3]:
+        return None
+    off  = _skip_name(reply, parse_question(reply)[3]) + RR_FIXED.size
+    text = reply[off + 1:off + 1 + reply[off]].decode()
+    stats = {}
+    for item in text.split():
+        k, _, v = item.partition("=")
+        stats[k] = float(v) if "." in v else int(v)
+    return stats
+
+class StatsProbe:
+    # Неблокирующий опрос для GUI: poll() забирает ответ на прошлый запрос
+    # и отправляет следующий, так что UI-поток никогда не ждёт резолвер.
+    def __init__(self, addr: str = STUB_ADDR, port: int = STUB_PORT):
+        self.sock  = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.connect((addr, port))
+        self.stats = None
+
+    def poll(self):
+        fresh = None
+        try:
+            while True:
+                fresh = parse_stats(self.sock.recv(4096))
+        except (BlockingIOError, InterruptedError):
+            pass
+        except (OSError, IndexError, struct.error, UnicodeError, ValueError):
+            fresh = None
+        self.stats = fresh
+        try:
+            self.sock.send(build_query(STATS_NAME, TYPE_TXT, CLASS_CH))
+        except OSError:
+            pass
+        return self.stats
+
+    def close(self):
+        self.sock.close()
+
+async def run(args):
+    resolver = StubResolver(lambda: profile_upstreams(args.config_dir))
+    udp, tcp = await serve(resolver, args.listen, args.port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"mini-vpn DNS cache on {args.listen}:{args.port}", file=sys.stderr)
+    await stop.wait()
+    udp.close()
+    tcp.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="minivpn.dns")
+    parser.add_argument("--listen", default=STUB_ADDR)
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--config-dir", default=CONFIG_DIR)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run(args))
+    except OSError as e:
+        print(f"minivpn.dns: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import signal
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+from minivpn import native, rpc
+from minivpn.common import CONFIG_DIR, HELPER_SOCKET
+from minivpn.killswitch import NAME_RE
+from minivpn.store import write_atomic
+from minivpn.tunnel import ROOT_DIR, execute, run_killswitch, summarize_phases
+from minivpn.wgconf import load_config, parse_config
+
+BACKENDS      = ("wg-quick", "native")
+PARENT_POLL   = 2.0
+START_TIMEOUT = 120.0   # pkexec ждёт, пока пользователь введёт пароль
+
+def log(msg: str):
+    print(f"[#] {msg}", file=sys.stderr, flush=True)
+
+# Долгоживущая привилегированная сессия: запускается один раз через sudo или
+# pkexec и принимает по Unix-сокету (0600, владелец — пользователь GUI) только
+# up/down/switch по имени профиля и kill switch. Папка конфигов доступна
+# пользователю на запись, поэтому хуки PreUp/PostUp/PreDown/PostDown и
+# SaveConfig сессия не принимает: иначе любой его процесс выполнил бы команду
+# от root без запроса пароля. Проверенный конфиг копируется в папку root
+# (0700), и wg-quick читает уже копию — подменить файл после проверки нельзя.
+# Профили с хуками поднимаются через sudo на каждое действие.
+class Session:
+    def __init__(self, config_dir: str, owner: int = -1):
+        self.config_dir = config_dir
+        self.owner      = owner
+        self.run_dir    = tempfile.mkdtemp(prefix="mini-vpn-helper-")
+        self.locks      = {}   # профиль -> asyncio.Lock: разные профили — параллельно
+
+    def _path(self, name) -> str:
+        if not isinstance(name, str) or not NAME_RE.fullmatch(name):
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"invalid profile name: {name!r}")
+        path = os.path.join(self.config_dir, f"{name}.conf")
+        if not os.path.isfile(path):
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"unknown profile: {name}")
+        return path
+
+    # Копия конфига для wg-quick. O_NOFOLLOW и владелец файла — чтобы через
+    # симлинк или чужой файл не прочитать от root то, что пользователю закрыто.
+    def _snapshot(self, name: str) -> str:
+        try:
+            fd = os.open(self._path(name), os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError as e:
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"{name}: {e.strerror}")
+        with os.fdopen(fd) as f:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode) or self.owner not in (-1, st.st_uid):
+                raise rpc.RpcError(rpc.INVALID_PARAMS, f"{name}: not a config owned by the user")
+            text = f.read()
+        if not native.native_supported(parse_config(text)):
+            raise rpc.RpcError(rpc.INVALID_PARAMS,
+                               f"{name}: PreUp/PostUp/PreDown/PostDown hooks and SaveConfig "
+                               "are not run by the privileged session")
+        path = os.path.join(self.run_dir, f"{name}.conf")
+        write_atomic(path, text.encode(), sync=False)
+        return path
+
+    def close(self):
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    async def rpc_hello(self, notify) -> dict:
+        return {"pid": os.getpid()}
+
+    async def rpc_up(self, notify, name: str, backend: str = "wg-quick",
+                     lock: bool = None) -> dict:
+        return await self._run("up", name, backend, notify, lock=lock)
+
+    async def rpc_down(self, notify, name: str, backend: str = "wg-quick",
+                       lock: bool = None) -> dict:
+        return await self._run("down", name, backend, notify, lock=lock)
+
+    async def rpc_switch(self, notify, name: str, old: str, backend: str = "wg-quick",
+                         lock: bool = None) -> dict:
+        return await self._run("switch", name, backend, notify, old, lock)
+
+    # Набор строится по своей папке конфигов, как и пути в _path().
+    async def rpc_killswitch(self, notify, enable: bool) -> dict:
+        if not isinstance(enable, bool):
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"invalid enable: {enable!r}")
+        rc, err, phases = await asyncio.to_thread(run_killswitch, enable, self.config_dir)
+        return {"action": "killswitch", "rc": rc, "error": err,
+                "phases": summarize_phases(phases)}
+
+    async def _run(self, action: str, name: str, backend: str, notify, old: str = None,
+                   lock: bool = None) -> dict:
+        if backend not in BACKENDS:
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"unknown backend: {backend}")
+        if lock not in (None, True, False):
+            raise rpc.RpcError(rpc.INVALID_PARAMS, f"invalid lock: {lock!r}")
+        self._path(name)
+        if old:
+            self._path(old)
+        loop = asyncio.get_running_loop()
+        emit = lambda method, **p: loop.call_soon_threadsafe(lambda: notify(method, **p))
+        async with contextlib.AsyncExitStack() as stack:
+            # switch занимает оба профиля; порядок захвата один — без взаимоблокировок.
+            for profile in sorted({name, old} if old else {name}):
+                await stack.enter_async_context(self.locks.setdefault(profile, asyncio.Lock()))
+            path     = self._snapshot(name)
+            old      = (old, self._snapshot(old)) if old else None
+            on_phase = lambda phase, ms: emit("phase", phase=phase, ms=ms)
+            rc, err, phases = await asyncio.to_thread(
+                execute, action, name, path, backend,
+                lambda line: emit("output", line=line), on_phase, old)
+            # Набор kill switch — по папке профилей, а не по папке копий.
+            if rc == 0 and lock is not None:
+                rc, err, more = await asyncio.to_thread(
+                    run_killswitch, lock, self.config_dir, on_phase)
+                phases += more
+        return {"action": action, "rc": rc, "error": err, "phases": summarize_phases(phases)}
+
+async def _watch_parent(pid: int, stop: asyncio.Event):
+    while True:
+        await asyncio.sleep(PARENT_POLL)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            stop.set()
+            return
+
+async def serve(args):
+    session = Session(args.config_dir, args.owner)
+    server  = await rpc.serve(session, args.socket, 0o600, uid=args.owner)
+    stop   = asyncio.Event()
+    loop   = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    watch = asyncio.create_task(_watch_parent(args.parent, stop)) if args.parent else None
+    await stop.wait()
+    if watch:
+        watch.cancel()
+    server.close()
+    await server.wait_closed()
+    session.close()
+    os.unlink(args.socket)
+
+def serve_main(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="minivpn.helper serve")
+    parser.add_argument("--socket", default=HELPER_SOCKET)
+    parser.add_argument("--config-dir", default=CONFIG_DIR)
+    parser.add_argument("--owner", type=int, default=-1, help="uid that may use the socket")
+    parser.add_argument("--parent", type=int, help="exit when this process exits")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except (RuntimeError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+# Способы поднять сессию, от тихого к интерактивному: sudo без пароля (NOPASSWD
+# или свежий кэш), графический запрос polkit, и только при наличии терминала —
+# обычный sudo с паролем в этом терминале. Скрытого запроса пароля не бывает.
+def launchers():
+    yield ["sudo", "-n"]
+    # NOPASSWD только на wg-quick: sudo на каждое действие и так проходит
+    # молча — не спрашивать пароль ради сессии.
+    try:
+        if subprocess.run(["sudo", "-n", "-l", "wg-quick"], capture_output=True).returncode == 0:
+            return
+    except OSError:
+        pass
+    if shutil.which("pkexec"):
+        yield ["pkexec"]
+    if sys.stdin and sys.stdin.isatty():
+        yield ["sudo"]
+
+def start(path: str = HELPER_SOCKET, config_dir: str = CONFIG_DIR,
+          timeout: float = START_TIMEOUT):
+    if client := rpc.connect(path):
+        return client
+    # pkexec сбрасывает окружение и рабочую папку — пакет ищется через PYTHONPATH.
+    cmd = ["env", f"PYTHONPATH={ROOT_DIR}", sys.executable, "-m", "minivpn.helper", "serve",
+           "--socket", path, "--config-dir", os.path.abspath(config_dir),
+           "--owner", str(os.getuid()), "--parent", str(os.getpid())]
+    for launcher in launchers():
+        try:
+            proc = subprocess.Popen(launcher + cmd, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            continue
+        deadline = time.monotonic() + timeout
+        while proc.poll() is None and time.monotonic() < deadline:
+            if client := rpc.connect(path):
+                return client
+            time.sleep(0.05)
+        if proc.poll() is None:
+            proc.kill()
+    return None
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        return serve_main(argv[1:])
+    parser = argparse.ArgumentParser(prog="minivpn.helper")
+    parser.add_argument("action", choices=["up", "down", "switch"])
+    parser.add_argument("config")
+    parser.add_argument("target", nargs="?", help="switch: config to move traffic to")
+    args = parser.parse_args(argv)
+    if (args.action == "switch") != bool(args.target):
+        parser.error("switch takes <old-config> <new-config>; up/down take one config")
+    paths = [args.config] + ([args.target] if args.target else [])
+    names = [os.path.basename(p).rsplit(".", 1)[0] for p in paths]
+    name  = names[-1]
+    try:
+        cfgs = [load_config(p) for p in paths]
+        for n, cfg in zip(names, cfgs):
+            if not native.native_supported(cfg):
+                print(f"{n}: PreUp/PostUp hooks and SaveConfig need wg-quick", file=sys.stderr)
+                return 2
+        if args.action == "switch":
+            native.switch(names[0], cfgs[0], name, cfgs[1], log)
+        else:
+            (native.up if args.action == "up" else native.down)(name, cfgs[0], log)
+    except (OSError, ValueError, KeyError, subprocess.SubprocessError) as e:
+        print(f"{args.action} {name}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import bisect
+import fcntl
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from minivpn.common import APP_DIR
+
+HISTORY_FILE = os.path.join(APP_DIR, "history.bin")
+MAGIC        = b"MVH1"
+
+PROBE, SCAN, TRAFFIC, CONNECT = 1, 2, 3, 4
+KINDS = {"probe": PROBE, "scan": SCAN, "traffic": TRAFFIC, "connect": CONNECT}
+
+# Ярусы: (ширина корзины в секундах, ёмкость). Сырые записи, поминутные и
+# почасовые агрегаты; при переполнении кольцо перезаписывает самое старое.
+TIERS  = ((0, 16384), (60, 32768), (3600, 16384))   # ≈ 5 МБ
+
+# Запись фиксированного размера: ts, crc32 имени профиля, число сэмплов, вид,
+# ярус, средние rtt/loss/rx/tx/connect и гистограмма RTT — по ней p95
+# считается и после прореживания, без хранения самих значений.
+HIST_RATIO = 1.35
+HIST_EDGES = [3.0 * HIST_RATIO ** i for i in range(23)]   # 3 мс … ~2.2 с, 24 корзины
+HEADER     = struct.Struct("<4sHH6I")
+HEADER_LEN = 64
+RECORD     = struct.Struct("<IIHBB5f24H")
+FIELDS     = 5   # rtt, loss, rx, tx, connect
+
+def profile_id(name: str) -> int:
+    return zlib.crc32(name.encode())
+
+def _bucket(rtt: float) -> int:
+    return bisect.bisect_right(HIST_EDGES, rtt)
+
+# Сумма записей: средние с весами по числу сэмплов, гистограммы складываются.
+class Acc:
+    __slots__ = ("bucket", "count", "sums", "ns", "hist", "exact")
+
+    def __init__(self, bucket: int = 0):
+        self.bucket = bucket
+        self.count  = 0
+        self.sums   = [0.0] * FIELDS
+        self.ns     = [0] * FIELDS
+        self.hist   = [0] * len(HIST_EDGES) + [0]
+        self.exact  = []      # rtt сырых записей, пока агрегатов не было
+
+    def add(self, count: int, values, hist, raw: bool):
+        self.count += count
+        for i, v in enumerate(values):
+            if not math.isnan(v):
+                self.sums[i] += v * count
+                self.ns[i]   += count
+        for i, h in enumerate(hist):
+            self.hist[i] += h
+        if self.exact is not None:
+            if not raw:
+                self.exact = None
+            elif not math.isnan(values[0]):
+                self.exact.append(values[0])
+
+    def mean(self, field: int) -> float:
+        return self.sums[field] / self.ns[field] if self.ns[field] else math.nan
+
+    def quantile(self, q: float) -> float:
+        if self.exact:
+            values = sorted(self.exact)
+            return values[min(int(q * len(values)), len(values) - 1)]
+        total = sum(self.hist)
+        if not total:
+            return math.nan
+        rank = q * total
+        for i, h in enumerate(self.hist):
+            if rank < h:
+                # Внутри корзины — геометрически, как растут сами границы.
+                if i == 0:
+                    return HIST_EDGES[0] * rank / h
+                return HIST_EDGES[i - 1] * HIST_RATIO ** (rank / h)
+            rank -= h
+        return HIST_EDGES[-1] * HIST_RATIO
+
+    def record(self, profile: int, kind: int, tier: int) -> bytes:
+        hist = [min(h, 0xFFFF) for h in self.hist]
+        return RECORD.pack(self.bucket, profile, min(self.count, 0xFFFF), kind, tier,
+                           *(self.mean(i) for i in range(FIELDS)), *hist)
+
+# Кольца в одном mmap-файле; запись — только в процессе, взявшем flock,
+# чтение — откуда угодно, без загрузки файла целиком: двоичный поиск по ts.
+class History:
+    def __init__(self, path: str = HISTORY_FILE, writable: bool = True):
+        self.path     = path
+        self.writable = writable
+        self.offsets  = []
+        off = HEADER_LEN
+        for _, cap in TIERS:
+            self.offsets.append(off)
+            off += cap * RECORD.size
+        self.size = off
+        self.acc  = {}    # (ярус, профиль, вид) -> Acc текущей корзины
+        self.open = [0] * len(TIERS)   # текущая корзина яруса
+        if writable:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(self.fd)
+                raise
+            if os.fstat(self.fd).st_size != self.size:
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+            self.mm = mmap.mmap(self.fd, self.size)
+        else:
+            self.fd = os.open(path, os.O_RDONLY)
+            if os.fstat(self.fd).st_size != self.size:
+                os.close(self.fd)
+                raise OSError(f"{path}: unexpected size")
+            self.mm = mmap.mmap(self.fd, self.size, access=mmap.ACCESS_READ)
+        magic, version, recsize, *ring = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or recsize != RECORD.size:
+            if not writable:
+                raise OSError(f"{path}: not a mini-vpn history file")
+            ring = [0] * 6
+            HEADER.pack_into(self.mm, 0, MAGIC, 1, RECORD.size, *ring)
+        self.heads  = ring[0::2]
+        self.counts = ring[1::2]
+
+    def close(self):
+        if self.writable:
+            for tier in range(1, len(TIERS)):
+                self._flush_tier(tier)
+            self.mm.flush()
+        self.mm.close()
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _slot(self, tier: int, i: int) -> int:
+        cap = TIERS[tier][1]
+        return self.offsets[tier] + (self.heads[tier] - self.counts[tier] + i) % cap * RECORD.size
+
+    def _ts(self, tier: int, i: int) -> int:
+        return struct.unpack_from("<I", self.mm, self._slot(tier, i))[0]
+
+    def _append(self, tier: int, rec: bytes):
+        cap = TIERS[tier][1]
+        off = self.offsets[tier] + self.heads[tier] * RECORD.size
+        self.mm[off:off + RECORD.size] = rec
+        self.heads[tier]  = (self.heads[tier] + 1) % cap
+        self.counts[tier] = min(self.counts[tier] + 1, cap)
+        # Заголовок — после записи: читатель не увидит недописанную запись.
+        struct.pack_into("<2I", self.mm, 8 + 8 * tier, self.heads[tier], self.counts[tier])
+
+    # Корзина закрывается целиком для всех профилей сразу: иначе профиль, который
+    # замолчал, дописал бы свою запись позже чужих и сломал порядок по ts.
+    def _flush_tier(self, tier: int):
+        for key in sorted(k for k in self.acc if k[0] == tier):
+            acc = self.acc.pop(key)
+            _, profile, kind = key
+            self._append(tier, acc.record(profile, kind, tier))
+            self._fold(tier + 1, profile, kind, acc.bucket, acc.count,
+                       [acc.mean(i) for i in range(FIELDS)], acc.hist)
+
+    def _fold(self, tier: int, profile: int, kind: int, ts: int, count: int, values, hist):
+        if tier >= len(TIERS):
+            return
+        bucket = ts - ts % TIERS[tier][0]
+        if bucket > self.open[tier]:
+            self._flush_tier(tier)
+            self.open[tier] = bucket
+        acc = self.acc.get((tier, profile, kind))
+        if acc is None:
+            acc = self.acc[tier, profile, kind] = Acc(bucket)
+        acc.add(count, values, hist, False)
+
+    def add(self, name: str, kind: int, rtt: float = math.nan, loss: float = math.nan,
+            rx: float = math.nan, tx: float = math.nan, connect: float = math.nan,
+            ts: float = None):
+        ts = int(time.time() if ts is None else ts)
+        if self.counts[0]:
+            ts = max(ts, self._ts(0, self.counts[0] - 1))   # кольцо упорядочено по ts
+        hist = [0] * (len(HIST_EDGES) + 1)
+        if not math.isnan(rtt):
+            hist[_bucket(rtt)] = 1
+        values, profile = (rtt, loss, rx, tx, connect), profile_id(name)
+        self._append(0, RECORD.pack(ts, profile, 1, kind, 0, *values, *hist))
+        self._fold(1, profile, kind, ts, 1, values, hist)
+
+    def _lower(self, tier: int, ts: int) -> int:
+        lo, hi = 0, self.counts[tier]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts(tier, mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # Отрезок [lo, hi) покрывается самым грубым ярусом, у которого есть целые
+    # корзины внутри него; края добираются более мелкими. Гистограммы
+    # складываются без потерь, так что p95 за неделю читает сотни записей.
+    def _cover(self, lo: int, hi: int, tier: int) -> list:
+        if lo >= hi:
+            return []
+        if tier == 0:
+            return [(0, lo, hi)]
+        width, n = TIERS[tier][0], self.counts[tier]
+        if not n:
+            return self._cover(lo, hi, tier - 1)
+        a = max(-(-lo // width) * width, self._ts(tier, 0))
+        b = min(hi // width * width, self._ts(tier, n - 1) + width)
+        if a >= b:
+            return self._cover(lo, hi, tier - 1)
+        return self._cover(lo, a, tier - 1) + [(tier, a, b)] + self._cover(b, hi, tier - 1)
+
+    def _records(self, tier: int, lo: int, hi: int):
+        start, end = self._lower(tier, lo), self._lower(tier, hi)
+        cap = TIERS[tier][1]
+        first = (self.heads[tier] - self.counts[tier]) % cap
+        a, b = (first + start) % cap, (first + end) % cap
+        base  = self.offsets[tier]
+        view  = memoryview(self.mm)
+        spans = [(a, b)] if a < b or start == end else [(a, cap), (0, b)]
+        try:
+            for x, y in spans:
+                yield from RECORD.iter_unpack(view[base + x * RECORD.size:base + y * RECORD.size])
+        finally:
+            view.release()
+
+    def query(self, names: list, kind: int, since: float, until: float = None) -> dict:
+        until = time.time() if until is None else until
+        ids   = {profile_id(n): n for n in names}
+        out   = {}
+        for tier, lo, hi in self._cover(int(since), int(until) + 1, len(TIERS) - 1):
+            for ts, profile, count, k, _, *rest in self._records(tier, lo, hi):
+                if k != kind or profile not in ids:
+                    continue
+                acc = out.get(ids[profile])
+                if acc is None:
+                    acc = out[ids[profile]] = Acc()
+                acc.add(count, rest[:FIELDS], rest[FIELDS:], tier == 0)
+        return out
+
+    def summary(self, names: list, kind: int, since: float, until: float = None) -> dict:
+        return {name: {"samples": acc.count,
+                       "rtt_p50": acc.quantile(0.5), "rtt_p95": acc.quantile(0.95),
+                       "loss": acc.mean(1), "rx": acc.mean(2), "tx": acc.mean(3),
+                       "connect": acc.mean(4)}
+                for name, acc in self.query(names, kind, since, until).items()}
@@ -0,0 +1,226 @@
+import base64
+import ipaddress
+import os
+import re
+import tempfile
+import zipfile
+
+from minivpn.wgconf import parse_config, split_endpoint, HOOK_KEYS
+
+MAX_CONFIG = 64 * 1024   # больше — не WireGuard-конфиг (и защита от zip-бомб)
+NAME_MAX   = 15          # IFNAMSIZ - 1: имя файла становится именем интерфейса
+BAD_NAME   = re.compile(r"[^a-zA-Z0-9_=+.-]+")
+
+# Источники: .conf, папки (рекурсивно) и .zip. Архив не распаковывается на
+# диск — члены читаются по одному. Выдаёт (источник, имя, bytes | ошибка).
+def iter_sources(paths: list):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for f in sorted(files):
+                    if f.endswith(".conf") and not f.startswith("."):
+                        yield _read_file(os.path.join(root, f))
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    base = os.path.basename(info.filename)
+                    if (info.is_dir() or not base.endswith(".conf") or base.startswith(".")
+                            or "__MACOSX" in info.filename):
+                        continue
+                    source = f"{path}:{info.filename}"
+                    if info.file_size > MAX_CONFIG:
+                        yield source, base[:-5], "file too large"
+                        continue
+                    try:
+                        with zf.open(info) as f:
+                            yield source, base[:-5], f.read(MAX_CONFIG + 1)
+                    except (OSError, zipfile.BadZipFile, RuntimeError) as e:
+                        yield source, base[:-5], str(e)
+        else:
+            yield _read_file(path)
+
+def _read_file(path: str) -> tuple:
+    stem = os.path.basename(path).rsplit(".", 1)[0]
+    try:
+        with open(path, "rb") as f:
+            return path, stem, f.read(MAX_CONFIG + 1)
+    except OSError as e:
+        return path, stem, e.strerror or str(e)
+
+def _key(value: str, what: str) -> list:
+    try:
+        ok = len(base64.b64decode(value, validate=True)) == 32
+    except ValueError:
+        ok = False
+    return [] if ok else [f"invalid {what}"]
+
+def _nets(values: list, what: str) -> tuple:
+    nets, errors = [], []
+    for v in values:
+        try:
+            nets.append(ipaddress.ip_network(v, strict=False))
+        except ValueError:
+            errors.append(f"invalid {what} {v}")
+    return nets, errors
+
+# Только разбор и проверки, без ФС: ~0.1 мс на конфиг, тысяча — доли секунды.
+# Возвращает (текст, ключ дедупликации, ошибки, предупреждения, (адреса, PrivateKey)).
+def check(data) -> tuple:
+    if isinstance(data, str):
+        return None, None, [data], [], None
+    if len(data) > MAX_CONFIG:
+        return None, None, ["file too large"], [], None
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None, None, ["not UTF-8 text"], [], None
+    cfg    = parse_config(text)
+    iface  = cfg["interface"]
+    errors = []
+    if not iface:
+        errors.append("no [Interface] section")
+    if "privatekey" not in iface:
+        errors.append("no PrivateKey")
+    else:
+        errors += _key(iface["privatekey"], "PrivateKey")
+    addrs, errs = _nets(iface.get("address", []), "Address")
+    errors += errs
+    if not iface.get("address"):
+        errors.append("no Address")
+    elif len(set(addrs)) != len(addrs):
+        errors.append("duplicate Address")
+    if not cfg["peers"]:
+        errors.append("no [Peer] section")
+    key, seen = [], []
+    for i, peer in enumerate(cfg["peers"], 1):
+        if "publickey" not in peer:
+            errors.append(f"peer {i}: no PublicKey")
+        else:
+            errors += [f"peer {i}: {e}" for e in _key(peer["publickey"], "PublicKey")]
+        if "presharedkey" in peer:
+            errors += [f"peer {i}: {e}" for e in _key(peer["presharedkey"], "PresharedKey")]
+        endpoint = peer.get("endpoint", "")
+        try:
+            host, port = split_endpoint(endpoint)
+            if not host or not 0 < port < 65536:
+                raise ValueError
+        except ValueError:
+            errors.append(f"peer {i}: invalid Endpoint {endpoint}" if endpoint else
+                          f"peer {i}: no Endpoint")
+        nets, errs = _nets(peer.get("allowedips", []), "AllowedIPs")
+        errors += [f"peer {i}: {e}" for e in errs]
+        # Пересекающиеся AllowedIPs разных пиров wg молча отдаёт последнему.
+        if any(a.version == b.version and a.overlaps(b) for a in nets for b in seen):
+            errors.append(f"peer {i}: AllowedIPs overlap another peer")
+        seen += nets
+        key.append((peer.get("publickey", ""), endpoint.lower()))
+    warnings = [f"runs {k} commands as root" for k in HOOK_KEYS if k in iface]
+    return text, tuple(sorted(key)), errors, warnings, _ident(iface)
+
+def _ident(iface: dict) -> tuple:
+    addrs = set()
+    for v in iface.get("address", []):
+        try:
+            addrs.add(str(ipaddress.ip_interface(v).ip))
+        except ValueError:
+            pass
+    return addrs, iface.get("privatekey")
+
+# Кэш конфигов хранит их без ключей — PrivateKey уже импортированного профиля
+# читается из его файла.
+def _existing_ident(config_dir: str, name: str, cfg: dict) -> tuple:
+    addrs, private = _ident(cfg["interface"])
+    if private is None:
+        try:
+            with open(os.path.join(config_dir, f"{name}.conf")) as f:
+                private = parse_config(f.read())["interface"].get("privatekey")
+        except OSError:
+            pass
+    return addrs, private
+
+# Профили с общим Address или PrivateKey не поднять одновременно. У
+# провайдеров это обычное дело (один ключ и адрес на все серверы), поэтому
+# это предупреждение, а не ошибка. owners: адрес/ключ -> первый профиль.
+def clashes(ident: tuple, owners: dict) -> list:
+    addrs, private = ident
+    out = [f"Address {a} also used by {owners[a]}" for a in sorted(addrs) if a in owners]
+    if private and ("key", private) in owners:
+        out.append(f"same PrivateKey as {owners['key', private]}")
+    return out
+
+def _own(name: str, ident: tuple, owners: dict):
+    addrs, private = ident
+    for a in addrs:
+        owners.setdefault(a, name)
+    if private:
+        owners.setdefault(("key", private), name)
+
+def dedup_key(cfg: dict) -> tuple:
+    return tuple(sorted((p.get("publickey", ""), p.get("endpoint", "").lower())
+                        for p in cfg["peers"]))
+
+def safe_name(stem: str) -> str:
+    return BAD_NAME.sub("-", stem).strip("-.")[:NAME_MAX] or "wg"
+
+def _names(stem: str):
+    yield stem
+    for n in range(2, 1000):
+        suffix = f"-{n}"
+        yield stem[:NAME_MAX - len(suffix)] + suffix
+
+def write_new(config_dir: str, stem: str, text: str) -> str:
+    # Сначала полный файл во временном (0600: в нём PrivateKey), потом link под
+    # свободным именем: link атомарен и не перезаписывает существующий конфиг.
+    fd, tmp = tempfile.mkstemp(dir=config_dir, prefix=".import-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        for name in _names(stem):
+            try:
+                os.link(tmp, os.path.join(config_dir, f"{name}.conf"))
+                return name
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"no free name for {stem}")
+    finally:
+        os.unlink(tmp)
+
+# existing: {имя: разобранный конфиг} — уже импортированные профили, дубликаты
+# против них тоже отбрасываются. Результат в порядке источников:
+# {"source", "name", "error", "warnings"}.
+# Проверка идёт в потоке вызывающего: пул процессов разбору мелких файлов не
+# нужен, а fork многопоточного GUI мог оставить детям захваченные блокировки.
+def import_configs(paths: list, config_dir: str, existing: dict = None) -> list:
+    items   = list(iter_sources(paths))
+    checked = [check(data) for _, _, data in items]
+    known, owners = {}, {}
+    for name, cfg in (existing or {}).items():
+        if cfg:
+            known[dedup_key(cfg)] = name
+            _own(name, _existing_ident(config_dir, name, cfg), owners)
+    os.makedirs(config_dir, exist_ok=True)
+    results = []
+    for (source, stem, _), (text, key, errors, warnings, ident) in zip(items, checked):
+        result = {"source": source, "name": None, "error": None, "warnings": warnings}
+        results.append(result)
+        if errors:
+            result["error"] = "; ".join(errors)
+        elif key in known:
+            result["error"] = f"duplicate of {known[key]}"
+        else:
+            try:
+                result["name"] = known[key] = write_new(config_dir, safe_name(stem), text)
+            except OSError as e:
+                result["error"] = str(e)
+                continue
+            result["warnings"] = warnings + clashes(ident, owners)
+            _own(result["name"], ident, owners)
+    dir_fd = os.open(config_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return results
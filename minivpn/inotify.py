@@ -0,0 +1,53 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_Q_OVERFLOW  = 0x00004000
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+# IN_CREATE — ради жёстких ссылок (импорт кладёт конфиги через link).
+CONFIG_EVENTS  = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_CREATE
+
+EVENT = struct.Struct("=iIII")
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+def _check(ret: int) -> int:
+    if ret < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return ret
+
+class Inotify:
+    def __init__(self):
+        self.fd = _check(_libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self):
+        os.close(self.fd)
+
+    def add_watch(self, path: str, mask: int) -> int:
+        return _check(_libc.inotify_add_watch(self.fd, os.fsencode(path), mask))
+
+    def read(self) -> list:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return events
+            off = 0
+            while off + EVENT.size <= len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, off)
+                name = data[off + EVENT.size:off + EVENT.size + length].split(b"\0", 1)[0]
+                events.append((wd, mask, cookie, os.fsdecode(name)))
+                off += EVENT.size + length
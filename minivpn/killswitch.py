@@ -0,0 +1,107 @@
+import argparse
+import glob
+import ipaddress
+import os
+import re
+import socket
+import subprocess
+import sys
+
+from minivpn.common import CONFIG_DIR
+from minivpn.wgconf import load_config, split_endpoint
+
+TABLE   = "inet mini_vpn_killswitch"
+NAME_RE = re.compile(r"[a-zA-Z0-9_=+.-]{1,15}")   # как у wg-quick
+
+# Эндпоинты профилей: (адрес, порт). Имена резолвятся здесь, пока DNS ещё
+# открыт, — в правилах nft только адреса.
+def endpoints(cfgs) -> set:
+    out = set()
+    for cfg in cfgs:
+        for peer in cfg["peers"]:
+            if "endpoint" not in peer:
+                continue
+            try:
+                host, port = split_endpoint(peer["endpoint"])
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+            except (OSError, ValueError):
+                continue
+            out |= {(ipaddress.ip_address(info[4][0]), port) for info in infos}
+    return out
+
+def _set(items) -> str:
+    return "{ " + ", ".join(items) + " }"
+
+# Весь набор — одна транзакция nft -f: «table; delete table» делает замену
+# идемпотентной, и правила меняются разом, без окна между ними. Наружу
+# выпускаются только интерфейсы туннелей, эндпоинты и служебный трафик
+# канала (DHCP, обнаружение соседей IPv6) — без него аплинк потеряет адрес.
+def ruleset(ifaces, eps) -> str:
+    # Имя уходит в скрипт nft, выполняемый от root: кавычка или перевод строки
+    # в нём — уже чужая команда.
+    for i in ifaces:
+        if not NAME_RE.fullmatch(i):
+            raise ValueError(f"bad interface name: {i!r}")
+    rules = ['oifname "lo" accept']
+    if ifaces:
+        quoted = sorted(f'"{i}"' for i in ifaces)
+        rules.append(f"oifname {_set(quoted)} accept")
+    for family, version in (("ip", 4), ("ip6", 6)):
+        pairs = sorted(f"{a} . {p}" for a, p in eps if a.version == version)
+        if pairs:
+            rules.append(f"{family} daddr . udp dport {_set(pairs)} accept")
+    rules += ["udp sport 68 udp dport 67 accept",
+              "meta nfproto ipv6 udp sport 546 udp dport 547 accept",
+              "icmpv6 type { nd-router-solicit, nd-neighbor-solicit, nd-neighbor-advert } accept"]
+    body = "\n".join(f"\t\t{r}" for r in rules)
+    return (f"table {TABLE}\ndelete table {TABLE}\n"
+            f"table {TABLE} {{\n\tchain output {{\n"
+            f"\t\ttype filter hook output priority 0; policy drop;\n{body}\n\t}}\n}}\n")
+
+def _nft(script: str):
+    proc = subprocess.run(["nft", "-f", "-"], input=script, capture_output=True, text=True)
+    if proc.returncode:
+        raise OSError(proc.stderr.strip() or f"nft exited with {proc.returncode}")
+
+# Интерфейс называется как профиль, поэтому туннели разрешаются по именам
+# всех профилей папки: набор не зависит от того, какие из них подняты, и
+# переподключение или failover не требуют его менять. Файлы с именем, которое
+# wg-quick не примет за интерфейс, пропускаются.
+def apply(config_dir: str = CONFIG_DIR):
+    names, cfgs = [], []
+    for path in sorted(glob.glob(os.path.join(config_dir, "*.conf"))):
+        if not NAME_RE.fullmatch(os.path.basename(path)[:-5]):
+            continue
+        try:
+            cfgs.append(load_config(path))
+        except (OSError, ValueError):
+            continue
+        names.append(os.path.basename(path)[:-5])
+    _nft(ruleset(names, endpoints(cfgs)))
+
+def remove():
+    _nft(f"table {TABLE}\ndelete table {TABLE}\n")
+
+def active() -> bool:
+    proc = subprocess.run(["nft", "list", "table", *TABLE.split()], capture_output=True)
+    return proc.returncode == 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="minivpn.killswitch")
+    parser.add_argument("action", choices=["on", "off", "status"])
+    parser.add_argument("--config-dir", default=CONFIG_DIR)
+    args = parser.parse_args(argv)
+    try:
+        if args.action == "on":
+            apply(args.config_dir)
+        elif args.action == "off":
+            remove()
+        else:
+            print("on" if active() else "off")
+    except OSError as e:
+        print(f"killswitch {args.action}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import bisect
+import math
+import os
+import threading
+import time
+
+METRICS_ADDR    = "127.0.0.1"
+METRICS_PORT    = 9586
+TEXTFILE_PERIOD = 15.0
+OPENMETRICS     = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS      = "text/plain; version=0.0.4; charset=utf-8"
+
+RTT_BUCKETS  = (0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+OP_BUCKETS   = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+LOOP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Имя семейства -> (тип, описание, корзины гистограммы).
+FAMILIES = {
+    "minivpn_start_time_seconds":    ("gauge", "Unix time the process started", None),
+    "minivpn_tunnel_up":             ("gauge", "WireGuard interface of a profile is up", None),
+    "minivpn_handshake_age_seconds": ("gauge", "Seconds since the latest WireGuard handshake", None),
+    "minivpn_receive_bytes":         ("counter", "Bytes received on the tunnel interface", None),
+    "minivpn_transmit_bytes":        ("counter", "Bytes sent on the tunnel interface", None),
+    "minivpn_probe_rtt_seconds":     ("histogram", "Round-trip time of the latency probe", RTT_BUCKETS),
+    "minivpn_probe_failures":        ("counter", "Latency probes that got no reply", None),
+    "minivpn_operation_seconds":     ("histogram", "Duration of up, down and switch operations", OP_BUCKETS),
+    "minivpn_monitor_loop_seconds":  ("histogram", "Duration of one IP or ping monitor iteration", LOOP_BUCKETS),
+}
+
+def _num(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return "NaN" if math.isnan(v) else repr(v)
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _fmt(labels: tuple) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum    = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1   # le включительно
+        self.sum += v
+
+# Значения обновляются там, где их и так считают (цикл монитора, телеметрия,
+# завершение задания), а запрос метрик лишь сериализует готовое — без чтения
+# /sys и без подпроцессов. Текст кэшируется до следующего изменения.
+class Registry:
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.series  = {name: {} for name in FAMILIES}   # имя -> {метки: значение}
+        self.version = 0
+        self._cache  = {}
+        self.set("minivpn_start_time_seconds", time.time())
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.series[name][tuple(sorted(labels.items()))] = float(value)
+            self.version += 1
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[name][key] = self.series[name].get(key, 0.0) + value
+            self.version += 1
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            h = self.series[name].get(key)
+            if h is None:
+                h = self.series[name][key] = Histogram(FAMILIES[name][2])
+            h.observe(value)
+            self.version += 1
+
+    # Убрать ряды с этими метками во всех семействах, например ушедшего интерфейса.
+    def forget(self, **labels):
+        pairs = set(labels.items())
+        with self.lock:
+            for series in self.series.values():
+                for key in [k for k in series if pairs <= set(k)]:
+                    del series[key]
+            self.version += 1
+
+    # openmetrics=False — формат 0.0.4 для textfile-коллектора node_exporter:
+    # там у счётчика суффикс _total и в # TYPE, а маркера # EOF нет.
+    def render(self, openmetrics: bool = True) -> bytes:
+        with self.lock:
+            cached = self._cache.get(openmetrics)
+            if cached and cached[0] == self.version:
+                return cached[1]
+            lines = []
+            for name, (kind, text, _) in FAMILIES.items():
+                series = self.series[name]
+                if not series:
+                    continue
+                suffix = "_total" if kind == "counter" else ""
+                family = name if openmetrics else name + suffix
+                lines += [f"# HELP {family} {text}", f"# TYPE {family} {kind}"]
+                for key, v in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{suffix}{_fmt(key)} {_num(v)}")
+                        continue
+                    total = 0
+                    for bound, n in zip(v.bounds + (math.inf,), v.counts):
+                        total += n
+                        lines.append(f"{name}_bucket{_fmt(key + (('le', _num(bound)),))} {total}")
+                    lines.append(f"{name}_count{_fmt(key)} {total}")
+                    lines.append(f"{name}_sum{_fmt(key)} {_num(v.sum)}")
+            if openmetrics:
+                lines.append("# EOF")
+            data = ("\n".join(lines) + "\n").encode()
+            self._cache[openmetrics] = (self.version, data)
+            return data
+
+def write_textfile(registry: Registry, path: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(registry.render(openmetrics=False))
+    os.replace(tmp, path)
+
+# http.server тянет email и mimetypes — импорт только если эндпоинт включён,
+# чтобы не удлинять запуск окна.
+def _http_server(registry: Registry, addr: str, port: int):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            om   = "application/openmetrics-text" in self.headers.get("Accept", "")
+            body = registry.render(om)
+            self.send_response(200)
+            self.send_header("Content-Type", OPENMETRICS if om else PROMETHEUS)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    return server
+
+# HTTP-эндпоинт на loopback и/или периодическая запись файла для textfile-
+# коллектора; оба работают в своих потоках и только читают Registry.
+class Exporter:
+    def __init__(self, registry: Registry, port: int = None, addr: str = METRICS_ADDR,
+                 textfile: str = None, period: float = TEXTFILE_PERIOD):
+        self.registry = registry
+        self.textfile = textfile
+        self.period   = period
+        self.server   = None
+        self._stop    = threading.Event()
+        self._threads = []
+        if port is not None:
+            self.server = _http_server(registry, addr, port)
+            self._start(self.server.serve_forever)
+        if textfile:
+            self._start(self._write_loop)
+
+    @property
+    def address(self) -> tuple:
+        return self.server.server_address if self.server else None
+
+    def _start(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _write_loop(self):
+        written = None
+        while True:
+            if self.registry.version != written:
+                written = self.registry.version
+                try:
+                    write_textfile(self.registry, self.textfile)
+                except OSError as e:
+                    print(f"[METRICS] {e}")
+            if self._stop.wait(self.period):
+                return
+
+    def close(self):
+        self._stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self._threads:
+            thread.join(1)
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from minivpn.probe import HttpClient, probe_rtt
+
+IP_URL            = "https://api.ipify.org"
+PING_HOST         = "1.1.1.1"
+IP_INTERVAL       = 30.0
+PING_INTERVAL     = 7.0
+
+class MonitorEngine:
+    def __init__(self, on_ip, on_ping, ip_interval: float = IP_INTERVAL,
+                 ping_interval: float = PING_INTERVAL, ping_host: str = PING_HOST,
+                 ip_url: str = IP_URL, metrics=None):
+        self.on_ip         = on_ip
+        self.on_ping       = on_ping
+        self.ip_interval   = ip_interval
+        self.ping_interval = ping_interval
+        self.ping_host     = ping_host
+        self.http          = HttpClient(ip_url)
+        self.metrics       = metrics
+        self._loop         = None
+        self._task         = None
+        self._wake_ip      = None
+        self._wake_ping    = None
+        self._stopped      = False
+        self.ip_paused     = False
+
+    async def run(self):
+        self._loop    = asyncio.get_running_loop()
+        self._wake_ip   = asyncio.Event()
+        self._wake_ping = asyncio.Event()
+        # Сначала _task, потом проверка _stopped: stop() из другого потока
+        # ставит флаг и затем смотрит _task, так что отмена не теряется.
+        self._task = asyncio.gather(self._ip_loop(), self._ping_loop())
+        if self._stopped:
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.http.close()
+
+    def stop(self):
+        self._stopped = True
+        if self._loop and self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def refresh_ip(self):
+        if self._loop and self._wake_ip:
+            self._loop.call_soon_threadsafe(self._refresh_ip)
+
+    def _refresh_ip(self):
+        self.http.close()
+        self._wake_ip.set()
+
+    # Фоновый режим: запросы IP останавливаются (IP только показывается),
+    # а пинг, нужный для проверки туннеля, идёт с другим интервалом.
+    def set_idle(self, idle: bool, ping_interval: float):
+        if self._loop and self._wake_ip:
+            self._loop.call_soon_threadsafe(self._set_idle, idle, ping_interval)
+        else:
+            self.ip_paused, self.ping_interval = idle, ping_interval
+
+    def _set_idle(self, idle: bool, ping_interval: float):
+        if self.ip_paused and not idle:
+            self._wake_ip.set()
+        if ping_interval != self.ping_interval:
+            self._wake_ping.set()
+        self.ip_paused, self.ping_interval = idle, ping_interval
+
+    async def _sleep(self, wake: asyncio.Event, timeout):
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+
+    async def _sleep_ip(self):
+        await self._sleep(self._wake_ip, self.ip_interval)
+        while self.ip_paused:
+            await self._sleep(self._wake_ip, None)
+
+    def _timing(self, loop: str, start: float):
+        if self.metrics:
+            self.metrics.observe("minivpn_monitor_loop_seconds",
+                                 time.perf_counter() - start, loop=loop)
+
+    async def _ip_loop(self):
+        while True:
+            ip, start = "—", time.perf_counter()
+            try:
+                status, body = await self.http.get()
+                if status == 200:
+                    ip = body.strip()
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+                pass
+            self._timing("ip", start)
+            self.on_ip(ip)
+            await self._sleep_ip()
+
+    async def _ping_loop(self):
+        while True:
+            ping, start = "—", time.perf_counter()
+            try:
+                rtt  = await probe_rtt(self.ping_host)
+                ping = f"{rtt:.1f}"
+                if self.metrics:
+                    self.metrics.observe("minivpn_probe_rtt_seconds", rtt / 1000)
+            except (OSError, asyncio.TimeoutError):
+                if self.metrics:
+                    self.metrics.inc("minivpn_probe_failures")
+            self._timing("ping", start)
+            self.on_ping(ping)
+            await self._sleep(self._wake_ping, self.ping_interval)
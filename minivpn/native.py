@@ -0,0 +1,394 @@
+import base64
+import errno
+import ipaddress
+import shutil
+import socket
+import struct
+import subprocess
+import time
+
+from minivpn import netlink as nl
+from minivpn.wgconf import HOOK_KEYS, split_dns, split_endpoint
+
+DEFAULT_MTU       = 1420
+DEFAULT_TABLE     = 51820
+KICK_KEEPALIVE    = 25
+HANDSHAKE_TIMEOUT = 10.0
+
+WG_CMD_GET_DEVICE          = 0
+WG_CMD_SET_DEVICE          = 1
+WGDEVICE_A_IFNAME          = 2
+WGDEVICE_A_PRIVATE_KEY     = 3
+WGDEVICE_A_FLAGS           = 5
+WGDEVICE_A_LISTEN_PORT     = 6
+WGDEVICE_A_FWMARK          = 7
+WGDEVICE_A_PEERS           = 8
+WGDEVICE_F_REPLACE_PEERS   = 1
+WGPEER_A_PUBLIC_KEY        = 1
+WGPEER_A_PRESHARED_KEY     = 2
+WGPEER_A_FLAGS             = 3
+WGPEER_A_ENDPOINT          = 4
+WGPEER_A_KEEPALIVE         = 5
+WGPEER_A_LAST_HANDSHAKE    = 6
+WGPEER_A_RX_BYTES          = 7
+WGPEER_A_TX_BYTES          = 8
+WGPEER_A_ALLOWEDIPS        = 9
+WGPEER_F_REPLACE_ALLOWEDIPS = 2
+WGALLOWEDIP_A_FAMILY       = 1
+WGALLOWEDIP_A_IPADDR       = 2
+WGALLOWEDIP_A_CIDR_MASK    = 3
+
+FAMILY = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+def native_supported(cfg: dict) -> bool:
+    iface = cfg["interface"]
+    return (not any(k in iface for k in HOOK_KEYS)
+            and iface.get("saveconfig", "false").lower() != "true")
+
+def _key(value: str) -> bytes:
+    key = base64.b64decode(value, validate=True)
+    if len(key) != 32:
+        raise ValueError(f"invalid key length: {value}")
+    return key
+
+def _sockaddr(endpoint: str) -> bytes:
+    host, port = split_endpoint(endpoint)
+    family, _, _, _, addr = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+    packed = socket.inet_pton(family, addr[0])
+    if family == socket.AF_INET:
+        return struct.pack("=H", family) + struct.pack("!H", port) + packed + b"\0" * 8
+    return (struct.pack("=H", family) + struct.pack("!HI", port, 0) + packed +
+            struct.pack("=I", addr[3]))
+
+def routing(cfg: dict) -> tuple:
+    iface = cfg["interface"]
+    nets  = sorted({ipaddress.ip_network(c, strict=False)
+                    for p in cfg["peers"] for c in p.get("allowedips", [])},
+                   key=lambda n: (-n.prefixlen, n.version, n))
+    table  = iface.get("table", "auto").lower()
+    mark   = iface.get("fwmark", "off").lower()
+    fwmark = 0 if mark == "off" else int(mark, 0)
+    if table == "off":
+        return nets, None, fwmark
+    if table == "auto":
+        if any(n.prefixlen == 0 for n in nets):
+            return nets, "auto", fwmark or DEFAULT_TABLE
+        return nets, nl.RT_TABLE_MAIN, fwmark
+    return nets, nl.RT_TABLE_MAIN if table == "main" else int(table), fwmark
+
+def set_device(gn: nl.NetlinkSocket, family: int, name: str, cfg: dict, fwmark: int):
+    iface = cfg["interface"]
+    peers = []
+    for i, peer in enumerate(cfg["peers"]):
+        attrs = [nl.pack_attr(WGPEER_A_PUBLIC_KEY, _key(peer["publickey"])),
+                 nl.pack_u32(WGPEER_A_FLAGS, WGPEER_F_REPLACE_ALLOWEDIPS)]
+        if "presharedkey" in peer:
+            attrs.append(nl.pack_attr(WGPEER_A_PRESHARED_KEY, _key(peer["presharedkey"])))
+        if "endpoint" in peer:
+            attrs.append(nl.pack_attr(WGPEER_A_ENDPOINT, _sockaddr(peer["endpoint"])))
+        if peer.get("persistentkeepalive", "off") != "off":
+            attrs.append(nl.pack_u16(WGPEER_A_KEEPALIVE, int(peer["persistentkeepalive"])))
+        ips = []
+        for j, cidr in enumerate(peer.get("allowedips", [])):
+            net = ipaddress.ip_network(cidr, strict=False)
+            ips.append(nl.pack_nested(
+                j, nl.pack_u16(WGALLOWEDIP_A_FAMILY, FAMILY[net.version]),
+                nl.pack_attr(WGALLOWEDIP_A_IPADDR, net.network_address.packed),
+                nl.pack_u8(WGALLOWEDIP_A_CIDR_MASK, net.prefixlen)))
+        attrs.append(nl.pack_nested(WGPEER_A_ALLOWEDIPS, *ips))
+        peers.append(nl.pack_nested(i, *attrs))
+    attrs = [nl.pack_str(WGDEVICE_A_IFNAME, name),
+             nl.pack_attr(WGDEVICE_A_PRIVATE_KEY, _key(iface["privatekey"])),
+             nl.pack_u32(WGDEVICE_A_FLAGS, WGDEVICE_F_REPLACE_PEERS),
+             nl.pack_u32(WGDEVICE_A_FWMARK, fwmark),
+             nl.pack_nested(WGDEVICE_A_PEERS, *peers)]
+    if "listenport" in iface:
+        attrs.append(nl.pack_u16(WGDEVICE_A_LISTEN_PORT, int(iface["listenport"])))
+    gn.request(family, nl.GENLMSG.pack(WG_CMD_SET_DEVICE, 1, 0) + b"".join(attrs))
+
+def _peer_keepalive(peer: dict) -> int:
+    value = peer.get("persistentkeepalive", "off")
+    return 0 if value == "off" else int(value)
+
+def set_keepalive(gn: nl.NetlinkSocket, family: int, name: str, cfg: dict, kick: bool = False):
+    # Только PersistentKeepalive, без REPLACE_PEERS — сессии пиров не сбрасываются.
+    # Переход 0 → N на поднятом интерфейсе сразу шлёт keepalive и запускает рукопожатие.
+    peers = [nl.pack_nested(i, nl.pack_attr(WGPEER_A_PUBLIC_KEY, _key(peer["publickey"])),
+                            nl.pack_u16(WGPEER_A_KEEPALIVE,
+                                        _peer_keepalive(peer) or (KICK_KEEPALIVE if kick else 0)))
+             for i, peer in enumerate(cfg["peers"])]
+    gn.request(family, nl.GENLMSG.pack(WG_CMD_SET_DEVICE, 1, 0) +
+               nl.pack_str(WGDEVICE_A_IFNAME, name) + nl.pack_nested(WGDEVICE_A_PEERS, *peers))
+
+def get_device(name: str) -> list:
+    with nl.NetlinkSocket(nl.NETLINK_GENERIC) as gn:
+        replies = gn.request(nl.genl_family(gn, "wireguard"),
+                             nl.GENLMSG.pack(WG_CMD_GET_DEVICE, 1, 0) +
+                             nl.pack_str(WGDEVICE_A_IFNAME, name), nl.NLM_F_DUMP)
+    return [nl.parse_attrs(body, nl.GENLMSG.size) for _, body in replies]
+
+def device_fwmark(name: str) -> int:
+    for attrs in get_device(name):
+        if WGDEVICE_A_FWMARK in attrs:
+            return struct.unpack("=I", attrs[WGDEVICE_A_FWMARK])[0]
+    return 0
+
+def get_peers(name: str) -> list:
+    peers = []
+    for attrs in get_device(name):
+        for raw in nl.parse_attrs(attrs.get(WGDEVICE_A_PEERS, b"")).values():
+            p = nl.parse_attrs(raw)
+            peers.append({
+                "public_key": base64.b64encode(p[WGPEER_A_PUBLIC_KEY]).decode(),
+                "handshake":  struct.unpack("=qq", p[WGPEER_A_LAST_HANDSHAKE])[0],
+                "rx":         struct.unpack("=Q", p[WGPEER_A_RX_BYTES])[0],
+                "tx":         struct.unpack("=Q", p[WGPEER_A_TX_BYTES])[0],
+            })
+    return peers
+
+def add_link(rt: nl.NetlinkSocket, name: str):
+    rt.request(nl.RTM_NEWLINK, nl.IFINFO.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+               nl.pack_str(nl.IFLA_IFNAME, name) +
+               nl.pack_nested(nl.IFLA_LINKINFO, nl.pack_str(nl.IFLA_INFO_KIND, "wireguard")),
+               nl.NLM_F_CREATE | nl.NLM_F_EXCL)
+
+def set_link_up(rt: nl.NetlinkSocket, index: int, mtu: int):
+    rt.request(nl.RTM_NEWLINK, nl.IFINFO.pack(socket.AF_UNSPEC, 0, index, nl.IFF_UP, nl.IFF_UP) +
+               nl.pack_u32(nl.IFLA_MTU, mtu))
+
+def del_link(rt: nl.NetlinkSocket, name: str):
+    rt.request(nl.RTM_DELLINK, nl.IFINFO.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+               nl.pack_str(nl.IFLA_IFNAME, name))
+
+def add_address(rt: nl.NetlinkSocket, index: int, cidr: str):
+    addr = ipaddress.ip_interface(cidr)
+    family = FAMILY[addr.version]
+    attrs = nl.pack_attr(nl.IFA_ADDRESS, addr.ip.packed)
+    if family == socket.AF_INET:
+        attrs += nl.pack_attr(nl.IFA_LOCAL, addr.ip.packed)
+    rt.request(nl.RTM_NEWADDR, nl.IFADDR.pack(family, addr.network.prefixlen, 0, 0, index) + attrs,
+               nl.NLM_F_CREATE | nl.NLM_F_EXCL)
+
+def wait_handshake(name: str, cfg: dict, timeout: float = HANDSHAKE_TIMEOUT):
+    keys = {base64.b64encode(_key(p["publickey"])).decode()
+            for p in cfg["peers"] if "endpoint" in p}
+    deadline = time.monotonic() + timeout
+    while not keys <= {p["public_key"] for p in get_peers(name) if p["handshake"]}:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{name}: no handshake within {timeout:.0f} s")
+        time.sleep(0.05)
+
+def add_route(rt: nl.NetlinkSocket, index: int, net, table: int,
+              flags: int = nl.NLM_F_CREATE | nl.NLM_F_EXCL):
+    rt.request(nl.RTM_NEWROUTE,
+               nl.RTMSG.pack(FAMILY[net.version], net.prefixlen, 0, 0, table if table < 256 else 252,
+                             nl.RTPROT_BOOT, nl.RT_SCOPE_LINK, nl.RTN_UNICAST, 0) +
+               nl.pack_attr(nl.RTA_DST, net.network_address.packed) +
+               nl.pack_u32(nl.RTA_OIF, index) + nl.pack_u32(nl.RTA_TABLE, table), flags)
+
+# Как add_route у wg-quick: при Table = auto в таблицу fwmark идут только /0 —
+# на неё указывает правило своего семейства. Остальные префиксы ложатся в
+# main: у семейства без /0 правила нет, и из таблицы fwmark их бы не видели.
+def route_table(net, table, fwmark: int) -> int:
+    if table != "auto":
+        return table
+    return fwmark if net.prefixlen == 0 else nl.RT_TABLE_MAIN
+
+def _rules(family: int, table: int) -> list:
+    hdr = nl.FIBRULE.pack(family, 0, 0, 0, 0, 0, 0, nl.FR_ACT_TO_TBL, nl.FIB_RULE_INVERT)
+    sup = nl.FIBRULE.pack(family, 0, 0, 0, 0, 0, 0, nl.FR_ACT_TO_TBL, 0)
+    return [hdr + nl.pack_u32(nl.FRA_FWMARK, table) + nl.pack_u32(nl.FRA_TABLE, table),
+            sup + nl.pack_u32(nl.FRA_TABLE, nl.RT_TABLE_MAIN) +
+            nl.pack_u32(nl.FRA_SUPPRESS_PREFIXLEN, 0)]
+
+def add_rules(rt: nl.NetlinkSocket, family: int, table: int):
+    for rule in _rules(family, table):
+        rt.request(nl.RTM_NEWRULE, rule, nl.NLM_F_CREATE)
+    if family == socket.AF_INET:
+        with open("/proc/sys/net/ipv4/conf/all/src_valid_mark", "w") as f:
+            f.write("1")
+
+def del_rules(rt: nl.NetlinkSocket, family: int, table: int):
+    for rule in _rules(family, table):
+        while True:
+            try:
+                rt.request(nl.RTM_DELRULE, rule)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                break
+
+def _bypass_rules(cfg: dict) -> list:
+    # Пакеты к Endpoint нового туннеля идут мимо старого, пока тот ещё поднят.
+    rules = set()
+    for peer in cfg["peers"]:
+        if "endpoint" not in peer:
+            continue
+        host, port = split_endpoint(peer["endpoint"])
+        for family, _, _, _, addr in socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM):
+            ip = ipaddress.ip_address(addr[0])
+            rules.add(nl.FIBRULE.pack(family, ip.max_prefixlen, 0, 0, 0, 0, 0,
+                                      nl.FR_ACT_TO_TBL, 0) +
+                      nl.pack_attr(nl.FRA_DST, ip.packed) +
+                      nl.pack_u32(nl.FRA_TABLE, nl.RT_TABLE_MAIN))
+    return sorted(rules)
+
+def _del_bypass(rt: nl.NetlinkSocket, rules: list):
+    for rule in rules:
+        try:
+            rt.request(nl.RTM_DELRULE, rule)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+def set_dns(name: str, values: list, log):
+    if not values or not shutil.which("resolvconf"):
+        return
+    servers, search = split_dns(values)
+    data = "".join(f"nameserver {s}\n" for s in servers)
+    if search:
+        data += f"search {' '.join(search)}\n"
+    log(f"resolvconf -a tun.{name} -m 0 -x")
+    subprocess.run(["resolvconf", "-a", f"tun.{name}", "-m", "0", "-x"],
+                   input=data, text=True, check=True)
+
+def del_dns(name: str, values: list, log):
+    if not values or not shutil.which("resolvconf"):
+        return
+    log(f"resolvconf -d tun.{name} -f")
+    subprocess.run(["resolvconf", "-d", f"tun.{name}", "-f"], check=False)
+
+def _configure(rt: nl.NetlinkSocket, gn: nl.NetlinkSocket, name: str, cfg: dict,
+               fwmark: int, log) -> int:
+    iface = cfg["interface"]
+    index = socket.if_nametoindex(name)
+    log(f"wg setconf {name}")
+    set_device(gn, nl.genl_family(gn, "wireguard"), name, cfg, fwmark)
+    for cidr in iface.get("address", []):
+        log(f"ip address add {cidr} dev {name}")
+        add_address(rt, index, cidr)
+    mtu = int(iface.get("mtu", DEFAULT_MTU))
+    log(f"ip link set mtu {mtu} up dev {name}")
+    set_link_up(rt, index, mtu)
+    return index
+
+def up(name: str, cfg: dict, log=lambda msg: None):
+    nets, table, fwmark = routing(cfg)
+    with nl.NetlinkSocket(socket.NETLINK_ROUTE) as rt, \
+         nl.NetlinkSocket(nl.NETLINK_GENERIC) as gn:
+        log(f"ip link add {name} type wireguard")
+        add_link(rt, name)
+        try:
+            index = _configure(rt, gn, name, cfg, fwmark, log)
+            set_dns(name, cfg["interface"].get("dns", []), log)
+            if table is None:
+                return
+            for net in nets:
+                rt_table = route_table(net, table, fwmark)
+                log(f"ip route add {net} dev {name} table {rt_table}")
+                add_route(rt, index, net, rt_table)
+                if table == "auto" and net.prefixlen == 0:
+                    log(f"ip rule add not fwmark {fwmark} table {fwmark}")
+                    add_rules(rt, FAMILY[net.version], fwmark)
+        except Exception:
+            down(name, cfg)
+            raise
+
+def _fwmark(name: str, fwmark: int) -> int:
+    # После switch туннель может жить не на таблице по умолчанию — берём её у устройства.
+    try:
+        return device_fwmark(name) or fwmark
+    except OSError:
+        return fwmark
+
+def _default_families(nets: list) -> list:
+    return sorted({n.version for n in nets if n.prefixlen == 0})
+
+# Маршруты интерфейса — и в main, и в таблице fwmark — ядро удаляет вместе с
+# ним; снимать нужно только правила.
+def down(name: str, cfg: dict, log=lambda msg: None):
+    nets, table, fwmark = routing(cfg)
+    with nl.NetlinkSocket(socket.NETLINK_ROUTE) as rt:
+        if table == "auto":
+            fwmark = _fwmark(name, fwmark)
+            for version in _default_families(nets):
+                log(f"ip rule delete table {fwmark}")
+                del_rules(rt, FAMILY[version], fwmark)
+        log(f"ip link delete dev {name}")
+        try:
+            del_link(rt, name)
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+    del_dns(name, cfg["interface"].get("dns", []), log)
+
+def switch(old: str, old_cfg: dict, name: str, cfg: dict, log=lambda msg: None):
+    # Make-before-break: новый интерфейс поднимается рядом со старым, трафик
+    # переводится на него одной сменой правил/маршрутов (фаза "cutover" —
+    # это и есть разрыв), и только потом старый удаляется.
+    old_nets, old_table, old_mark = routing(old_cfg)
+    nets, table, fwmark = routing(cfg)
+    if old_table == "auto":
+        old_mark = _fwmark(old, old_mark)
+        if table == "auto" and fwmark == old_mark:
+            fwmark += 1
+    bypass = _bypass_rules(cfg)
+    with nl.NetlinkSocket(socket.NETLINK_ROUTE) as rt, \
+         nl.NetlinkSocket(nl.NETLINK_GENERIC) as gn:
+        family = nl.genl_family(gn, "wireguard")
+        log(f"ip link add {name} type wireguard")
+        add_link(rt, name)
+        cut = False
+        try:
+            log("ip rule add to <endpoints> lookup main")
+            for rule in bypass:
+                rt.request(nl.RTM_NEWRULE, rule, nl.NLM_F_CREATE)
+            index = _configure(rt, gn, name, cfg, fwmark, log)
+            log(f"wait for handshake on {name}")
+            set_keepalive(gn, family, name, cfg, kick=True)
+            wait_handshake(name, cfg)
+            set_keepalive(gn, family, name, cfg)
+            # Таблица fwmark нового туннеля пока ни на что не влияет — /0
+            # кладутся в неё заранее; префиксы main меняются уже в cutover.
+            if table == "auto":
+                for net in nets:
+                    if net.prefixlen == 0:
+                        log(f"ip route add {net} dev {name} table {fwmark}")
+                        add_route(rt, index, net, fwmark)
+            log("cutover")
+            cut = True
+            if table == "auto":
+                for version in _default_families(nets):
+                    add_rules(rt, FAMILY[version], fwmark)
+            if table is not None:
+                for net in nets:
+                    if table != "auto" or net.prefixlen:   # /0 уже в таблице fwmark
+                        add_route(rt, index, net, route_table(net, table, fwmark),
+                                  nl.NLM_F_CREATE | nl.NLM_F_REPLACE)
+        except Exception:
+            # До cutover трафик не трогали: хватает удалить новый интерфейс.
+            if cut:
+                down(name, cfg)
+            else:
+                del_link(rt, name)
+            _del_bypass(rt, bypass)
+            raise
+        set_dns(name, cfg["interface"].get("dns", []), log)
+        if old_table == "auto":
+            # suppress_prefixlength у обоих туннелей одинаковое и удаляется вместе
+            # со старым — возвращаем копию нового поверх его правила fwmark.
+            shared = _default_families(nets) if table == "auto" else []
+            for version in _default_families(old_nets):
+                log(f"ip rule delete table {old_mark}")
+                del_rules(rt, FAMILY[version], old_mark)
+                if version in shared:
+                    rt.request(nl.RTM_NEWRULE, _rules(FAMILY[version], fwmark)[1],
+                               nl.NLM_F_CREATE)
+        log(f"ip link delete dev {old}")
+        try:
+            del_link(rt, old)
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+        _del_bypass(rt, bypass)
+    del_dns(old, old_cfg["interface"].get("dns", []), log)
@@ -0,0 +1,242 @@
+import errno
+import os
+import socket
+import struct
+
+NETLINK_GENERIC = 16
+
+RTMGRP_LINK   = 0x1
+
+NLMSG_ERROR   = 2
+NLMSG_DONE    = 3
+RTM_NEWLINK   = 16
+RTM_DELLINK   = 17
+RTM_GETLINK   = 18
+
+RTM_NEWADDR   = 20
+RTM_NEWROUTE  = 24
+RTM_NEWRULE   = 32
+RTM_DELRULE   = 33
+
+NLM_F_REQUEST = 0x001
+NLM_F_MULTI   = 0x002
+NLM_F_ACK     = 0x004
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL    = 0x200
+NLM_F_CREATE  = 0x400
+NLM_F_DUMP    = 0x300
+
+IFLA_IFNAME    = 3
+IFLA_MTU       = 4
+IFLA_LINKINFO  = 18
+IFLA_INFO_KIND = 1
+IFF_UP         = 0x1
+NLA_F_NESTED   = 0x8000
+NLA_TYPE_MASK  = 0x3fff
+
+IFA_ADDRESS   = 1
+IFA_LOCAL     = 2
+
+RTA_DST       = 1
+RTA_OIF       = 4
+RTA_TABLE     = 15
+RT_TABLE_MAIN = 254
+RTPROT_BOOT   = 3
+RT_SCOPE_LINK = 253
+RTN_UNICAST   = 1
+
+FRA_DST                = 1
+FRA_PRIORITY           = 6
+FRA_FWMARK             = 10
+FRA_SUPPRESS_PREFIXLEN = 14
+FRA_TABLE              = 15
+FR_ACT_TO_TBL          = 1
+FIB_RULE_INVERT        = 0x2
+
+GENL_ID_CTRL          = 0x10
+CTRL_CMD_GETFAMILY    = 3
+CTRL_ATTR_FAMILY_ID   = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+NLMSG   = struct.Struct("=LHHLL")
+IFINFO  = struct.Struct("=BxHiII")
+IFADDR  = struct.Struct("=BBBBI")
+RTMSG   = struct.Struct("=BBBBBBBBI")
+FIBRULE = struct.Struct("=BBBBBBBBI")
+GENLMSG = struct.Struct("=BBH")
+RTATTR  = struct.Struct("=HH")
+
+def align(n: int) -> int:
+    return (n + 3) & ~3
+
+def pack_message(mtype: int, flags: int, seq: int, payload: bytes) -> bytes:
+    return NLMSG.pack(NLMSG.size + len(payload), mtype, flags, seq, 0) + payload
+
+def pack_attr(atype: int, data: bytes) -> bytes:
+    length = RTATTR.size + len(data)
+    return RTATTR.pack(length, atype) + data + b"\0" * (align(length) - length)
+
+def pack_u8(atype: int, value: int) -> bytes:
+    return pack_attr(atype, struct.pack("=B", value))
+
+def pack_u16(atype: int, value: int) -> bytes:
+    return pack_attr(atype, struct.pack("=H", value))
+
+def pack_u32(atype: int, value: int) -> bytes:
+    return pack_attr(atype, struct.pack("=I", value))
+
+def pack_str(atype: int, value: str) -> bytes:
+    return pack_attr(atype, value.encode() + b"\0")
+
+def pack_nested(atype: int, *attrs: bytes) -> bytes:
+    return pack_attr(atype | NLA_F_NESTED, b"".join(attrs))
+
+def parse_messages(data: bytes):
+    off = 0
+    while off + NLMSG.size <= len(data):
+        length, mtype, flags, seq, _ = NLMSG.unpack_from(data, off)
+        if length < NLMSG.size:
+            break
+        yield mtype, flags, seq, data[off + NLMSG.size:off + length]
+        off += align(length)
+
+def parse_attrs(data: bytes, off: int = 0) -> dict:
+    attrs = {}
+    while off + RTATTR.size <= len(data):
+        length, atype = RTATTR.unpack_from(data, off)
+        if length < RTATTR.size:
+            break
+        attrs[atype & NLA_TYPE_MASK] = data[off + RTATTR.size:off + length]
+        off += align(length)
+    return attrs
+
+def parse_error(payload: bytes) -> int:
+    return -struct.unpack_from("=i", payload)[0]
+
+def parse_link(payload: bytes):
+    if len(payload) < IFINFO.size:
+        return None
+    _, _, index, flags, _ = IFINFO.unpack_from(payload)
+    name = parse_attrs(payload, IFINFO.size).get(IFLA_IFNAME)
+    if name is None:
+        return None
+    return index, name.split(b"\0", 1)[0].decode(errors="replace"), bool(flags & IFF_UP)
+
+class NetlinkSocket:
+    def __init__(self, proto: int):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, proto)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((0, 0))
+        self.seq = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def request(self, mtype: int, payload: bytes, flags: int = 0) -> list:
+        self.seq += 1
+        self.sock.send(pack_message(mtype, NLM_F_REQUEST | NLM_F_ACK | flags,
+                                    self.seq, payload))
+        replies = []
+        while True:
+            for rtype, _, seq, body in parse_messages(self.sock.recv(1 << 20)):
+                if seq != self.seq:
+                    continue
+                if rtype == NLMSG_ERROR:
+                    err = parse_error(body)
+                    if err:
+                        raise OSError(err, os.strerror(err))
+                    return replies
+                if rtype == NLMSG_DONE:
+                    return replies
+                replies.append((rtype, body))
+
+def genl_family(nl: NetlinkSocket, name: str) -> int:
+    replies = nl.request(GENL_ID_CTRL, GENLMSG.pack(CTRL_CMD_GETFAMILY, 1, 0) +
+                         pack_str(CTRL_ATTR_FAMILY_NAME, name))
+    attrs = parse_attrs(replies[0][1], GENLMSG.size)
+    return struct.unpack("=H", attrs[CTRL_ATTR_FAMILY_ID][:2])[0]
+
+def open_link_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((0, RTMGRP_LINK))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def request_link_dump(sock: socket.socket, seq: int = 1):
+    sock.send(pack_message(RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP, seq,
+                           IFINFO.pack(socket.AF_UNSPEC, 0, 0, 0, 0)))
+
+class LinkTable:
+    def __init__(self):
+        self.links   = {}
+        self._resync = None
+
+    def up_links(self) -> set:
+        return {name for name, up in self.links.values() if up}
+
+    def start_resync(self):
+        self._resync = set()
+
+    def feed(self, data: bytes) -> list:
+        changes = []
+        for mtype, _, _, payload in parse_messages(data):
+            if mtype == NLMSG_DONE and self._resync is not None:
+                for index in set(self.links) - self._resync:
+                    name, up = self.links.pop(index)
+                    if up:
+                        changes.append((name, False))
+                self._resync = None
+            elif mtype == NLMSG_ERROR and parse_error(payload):
+                raise OSError(parse_error(payload), "netlink request failed")
+            elif mtype in (RTM_NEWLINK, RTM_DELLINK):
+                link = parse_link(payload)
+                if link is None:
+                    continue
+                index, name, up = link
+                if mtype == RTM_DELLINK:
+                    up = False
+                    old = self.links.pop(index, None)
+                else:
+                    old = self.links.get(index)
+                    self.links[index] = (name, up)
+                    if self._resync is not None:
+                        self._resync.add(index)
+                if old is not None and old[0] != name and old[1]:
+                    changes.append((old[0], False))
+                if (old is None and up) or (old is not None and (old[0] != name or old[1] != up)):
+                    changes.append((name, up))
+        return changes
+
+    def load(self, sock: socket.socket):
+        self.start_resync()
+        request_link_dump(sock)
+        while self._resync is not None:
+            self.feed(sock.recv(1 << 16))
+
+    def drain(self, sock: socket.socket) -> list:
+        changes = []
+        while True:
+            try:
+                data = sock.recv(1 << 16)
+            except BlockingIOError:
+                return changes
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                self.start_resync()
+                request_link_dump(sock)
+                continue
+            if not data:
+                return changes
+            changes += self.feed(data)
@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import os
+import socket
+import ssl
+import statistics
+import struct
+import time
+from urllib.parse import urlsplit
+
+from minivpn.wgconf import split_endpoint
+
+ICMP_ECHO   = {socket.AF_INET: (8, 0), socket.AF_INET6: (128, 129)}
+ICMP_PROTO  = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+ICMP_HEADER = struct.Struct("!BBHHH")
+
+SCAN_COUNT       = 3
+SCAN_CONCURRENCY = 64
+SCAN_TIMEOUT     = 1.0
+
+_seq = itertools.count(1)
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+async def _resolve(host: str, port: int = 0):
+    loop  = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return infos[0][0], infos[0][4]
+
+async def icmp_rtt(host: str, timeout: float = 1.0) -> float:
+    family, addr = await _resolve(host)
+    loop = asyncio.get_running_loop()
+    req_type, rep_type = ICMP_ECHO[family]
+    seq     = next(_seq) & 0xffff
+    payload = os.urandom(16)
+    packet  = ICMP_HEADER.pack(req_type, 0, 0, 0, seq) + payload
+    packet  = ICMP_HEADER.pack(req_type, 0, _checksum(packet), 0, seq) + payload
+    with socket.socket(family, socket.SOCK_DGRAM, ICMP_PROTO[family]) as sock:
+        sock.setblocking(False)
+        sock.connect(addr[:2] if family == socket.AF_INET else addr)
+        start = time.perf_counter()
+        await loop.sock_sendall(sock, packet)
+        await asyncio.wait_for(_echo_reply(sock, rep_type, seq, payload), timeout)
+        return (time.perf_counter() - start) * 1000
+
+async def _echo_reply(sock: socket.socket, rep_type: int, seq: int, payload: bytes):
+    loop = asyncio.get_running_loop()
+    while True:
+        reply = await loop.sock_recv(sock, 1024)
+        if len(reply) < ICMP_HEADER.size:
+            continue
+        rtype, _, _, _, rseq = ICMP_HEADER.unpack_from(reply)
+        if rtype == rep_type and rseq == seq and reply[ICMP_HEADER.size:] == payload:
+            return
+
+# (мс, порт закрыт): RST тоже даёт время, но значит лишь «хост жив, порт закрыт».
+async def _tcp_connect(host: str, port: int, timeout: float) -> tuple:
+    family, addr = await _resolve(host, port)
+    loop = asyncio.get_running_loop()
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.setblocking(False)
+        start, closed = time.perf_counter(), False
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, addr), timeout)
+        except ConnectionRefusedError:
+            closed = True
+        return (time.perf_counter() - start) * 1000, closed
+
+async def tcp_rtt(host: str, port: int = 443, timeout: float = 1.0) -> float:
+    return (await _tcp_connect(host, port, timeout))[0]
+
+async def probe(host: str, port: int = 443, timeout: float = 1.0) -> tuple:
+    try:
+        return await icmp_rtt(host, timeout), False
+    except PermissionError:
+        return await _tcp_connect(host, port, timeout)
+
+async def probe_rtt(host: str, port: int = 443, timeout: float = 1.0) -> float:
+    return (await probe(host, port, timeout))[0]
+
+# (медиана, потери, порт закрыт): closed — хоть одна проба кончилась RST.
+async def probe_endpoint(endpoint: str, count: int = SCAN_COUNT,
+                         timeout: float = SCAN_TIMEOUT) -> tuple:
+    host, port = split_endpoint(endpoint)
+    samples, closed = [], False
+    for i in range(count):
+        try:
+            rtt, rst = await probe(host, port, timeout)
+            samples.append(rtt)
+            closed |= rst
+        except (OSError, asyncio.TimeoutError):
+            pass
+        if i + 1 < count:
+            await asyncio.sleep(0.05)
+    return (statistics.median(samples) if samples else None), 1 - len(samples) / count, closed
+
+# Полные ответы — выше «порт закрыт», те — выше молчащих; внутри — по потерям и RTT.
+def rank_key(result: tuple) -> tuple:
+    name, median, loss, closed = result
+    return (median is None, closed, loss,
+            median if median is not None else float("inf"), name)
+
+async def scan_endpoints(endpoints: dict, count: int = SCAN_COUNT,
+                         concurrency: int = SCAN_CONCURRENCY,
+                         timeout: float = SCAN_TIMEOUT) -> list:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(name: str, endpoint: str) -> tuple:
+        async with sem:
+            try:
+                return (name, *await probe_endpoint(endpoint, count, timeout))
+            except (OSError, ValueError):
+                return name, None, 1.0, False
+
+    return sorted(await asyncio.gather(*(one(n, e) for n, e in endpoints.items())),
+                  key=rank_key)
+
+class HttpClient:
+    def __init__(self, url: str, timeout: float = 3.0):
+        u = urlsplit(url)
+        self.host    = u.hostname
+        self.tls     = u.scheme == "https"
+        self.port    = u.port or (443 if self.tls else 80)
+        self.path    = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.timeout = timeout
+        self.reader  = None
+        self.writer  = None
+        self._ssl    = ssl.create_default_context() if self.tls else None
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def get(self) -> tuple:
+        fresh = self.writer is None
+        try:
+            if fresh:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self._ssl),
+                    self.timeout)
+            return await asyncio.wait_for(self._request(), self.timeout)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            self.close()
+            if fresh:
+                raise
+        return await self.get()
+
+    async def _request(self) -> tuple:
+        self.writer.write(f"GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          "User-Agent: mini-vpn\r\nConnection: keep-alive\r\n\r\n".encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise EOFError("connection closed")
+        status  = int(line.partition(b" ")[2][:3])   # ValueError, если строка статуса битая
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+            while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body.decode(errors="replace")
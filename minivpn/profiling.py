@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+import time
+
+# Импортируется первым из mini-vpn.py, поэтому START ≈ начало исполнения скрипта.
+START   = time.perf_counter()
+TARGET  = os.environ.get("MINIVPN_PROFILE", "")
+ENABLED = bool(TARGET)
+
+_marks = []
+_last  = START
+
+def mark(phase: str):
+    global _last
+    if not ENABLED:
+        return
+    now = time.perf_counter()
+    _marks.append((phase, (now - _last) * 1000))
+    _last = now
+
+def results() -> dict:
+    return {"phases": dict(_marks), "total": (_last - START) * 1000}
+
+def report():
+    if not ENABLED:
+        return
+    data = results()
+    if TARGET in ("1", "stderr"):
+        for phase, ms in _marks:
+            print(f"[STARTUP] {phase:<12} {ms:8.1f} ms", file=sys.stderr)
+        print(f"[STARTUP] {'total':<12} {data['total']:8.1f} ms", file=sys.stderr)
+        return
+    tmp = TARGET + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, TARGET)
@@ -0,0 +1,132 @@
+import json
+import os
+import socket
+import struct
+
+from minivpn.common import SOCKET_PATH
+
+PARSE_ERROR      = -32700
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS   = -32602
+INTERNAL_ERROR   = -32603
+OP_FAILED        = 1
+OP_BUSY          = 2
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+def _encode(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode() + b"\n"
+
+# Права сокета задаются umask в момент bind, а не chmod/chown после: путь
+# лежит в папке, которую контролирует пользователь, и от root вызов по
+# подменённому на симлинк пути сменил бы владельца чужого файла. С uid сокет
+# открыт всем (0666), а клиентов проверяет SO_PEERCRED: пускаются только uid
+# и root. Группа ставится через lchown — он симлинки не разыменовывает.
+async def serve(handler, path: str = SOCKET_PATH, mode: int = 0o600, gid: int = -1,
+                uid: int = -1):
+    import asyncio
+    if os.path.exists(path):
+        if client := connect(path):
+            client.close()
+            raise RuntimeError(f"daemon already listening on {path}")
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if uid >= 0:
+        mode = 0o666
+    umask = os.umask(~mode & 0o777)
+    try:
+        server = await asyncio.start_unix_server(
+            lambda r, w: _session(handler, r, w, uid), path)
+    finally:
+        os.umask(umask)
+    if gid >= 0:
+        os.lchown(path, -1, gid)
+    return server
+
+def _peer_uid(writer) -> int:
+    sock = writer.get_extra_info("socket")
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+async def _session(handler, reader, writer, uid: int = -1):
+    if uid >= 0 and _peer_uid(writer) not in (uid, 0):
+        writer.close()
+        return
+    def notify(method: str, **params):
+        if not writer.is_closing():
+            writer.write(_encode({"jsonrpc": "2.0", "method": method, "params": params}))
+
+    try:
+        while line := await reader.readline():
+            rid = None
+            try:
+                req = json.loads(line)
+                rid = req.get("id")
+                fn  = getattr(handler, f"rpc_{req['method']}", None)
+                if fn is None:
+                    raise RpcError(METHOD_NOT_FOUND, f"unknown method: {req['method']}")
+                result = await fn(notify, **(req.get("params") or {}))
+                resp   = {"jsonrpc": "2.0", "id": rid, "result": result}
+            except RpcError as e:
+                resp = {"jsonrpc": "2.0", "id": rid, "error": {"code": e.code, "message": str(e)}}
+            except TypeError as e:
+                resp = {"jsonrpc": "2.0", "id": rid, "error": {"code": INVALID_PARAMS, "message": str(e)}}
+            except (ValueError, KeyError, AttributeError) as e:
+                resp = {"jsonrpc": "2.0", "id": rid, "error": {"code": PARSE_ERROR, "message": str(e)}}
+            except Exception as e:
+                resp = {"jsonrpc": "2.0", "id": rid, "error": {"code": INTERNAL_ERROR, "message": str(e)}}
+            writer.write(_encode(resp))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+class RpcClient:
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.file = self.sock.makefile("rwb")
+        self.seq  = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def call(self, method: str, on_notify=None, **params):
+        self.seq += 1
+        self.file.write(_encode({"jsonrpc": "2.0", "id": self.seq,
+                                 "method": method, "params": params}))
+        self.file.flush()
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("daemon closed the connection")
+            msg = json.loads(line)
+            if "id" not in msg:
+                if on_notify:
+                    on_notify(msg["method"], msg.get("params") or {})
+                continue
+            if "error" in msg:
+                raise RpcError(msg["error"]["code"], msg["error"]["message"])
+            return msg["result"]
+
+def connect(path: str = SOCKET_PATH, timeout: float = None):
+    try:
+        return RpcClient(path, timeout)
+    except OSError:
+        return None
@@ -0,0 +1,125 @@
+import ipaddress
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+BITS        = {4: 32, 6: 128}
+AF          = {4: socket.AF_INET, 6: socket.AF_INET6}
+RESOLVERS   = 16     # параллельных getaddrinfo для доменных списков
+FULL        = {v: [(0, 1 << b)] for v, b in BITS.items()}
+
+# Множество адресов храним как отсортированные непересекающиеся полуинтервалы
+# [lo, hi) на семейство: объединение, пересечение и разность — линейные проходы
+# слиянием, а обратно в CIDR интервал раскладывается жадно за O(bits).
+
+def _merge(iv: list) -> list:
+    out = []
+    for lo, hi in sorted(iv):
+        if out and lo <= out[-1][1]:
+            if hi > out[-1][1]:
+                out[-1] = (out[-1][0], hi)
+        else:
+            out.append((lo, hi))
+    return out
+
+def _subtract(a: list, b: list) -> list:
+    out, j = [], 0
+    for lo, hi in a:
+        while j < len(b) and b[j][1] <= lo:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] < hi:
+            if b[k][0] > lo:
+                out.append((lo, b[k][0]))
+            lo = max(lo, b[k][1])
+            k += 1
+        if lo < hi:
+            out.append((lo, hi))
+    return out
+
+def _intersect(a: list, b: list) -> list:
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if lo < hi:
+            out.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+def _cidrs(lo: int, hi: int, bits: int):
+    # Наибольший выровненный по lo блок, влезающий в остаток, — минимальное
+    # разбиение интервала на префиксы.
+    while lo < hi:
+        size = lo & -lo or 1 << bits
+        while size > hi - lo:
+            size >>= 1
+        yield lo, bits - size.bit_length() + 1
+        lo += size
+
+def to_intervals(nets) -> dict:
+    iv = {4: [], 6: []}
+    for net in nets:
+        lo = int(net.network_address)
+        iv[net.version].append((lo, lo + net.num_addresses))
+    return {v: _merge(x) for v, x in iv.items()}
+
+# Строки, а не ip_network: на сотнях тысяч префиксов объекты — основная цена.
+def to_cidrs(iv: dict) -> list:
+    out = []
+    for v in (4, 6):
+        af, size = AF[v], BITS[v] // 8
+        out += [f"{socket.inet_ntop(af, lo.to_bytes(size, 'big'))}/{plen}"
+                for a, b in iv[v] for lo, plen in _cidrs(a, b, BITS[v])]
+    return out
+
+def derive(allowed: dict, include: dict = None, exclude: dict = None) -> dict:
+    out = {}
+    for v in (4, 6):
+        iv = allowed[v]
+        if include is not None:
+            iv = _intersect(iv, include[v])
+        if exclude is not None:
+            iv = _subtract(iv, exclude[v])
+        out[v] = iv
+    return out
+
+# Семейство, оставшееся /0 целиком, wg-quick уводит через fwmark-правила; иначе
+# маршруты ставятся в main, и пакеты к самому серверу ушли бы в его же туннель.
+def carve_endpoint(iv: dict, endpoint: dict) -> dict:
+    return {v: x if x == FULL[v] else _subtract(x, endpoint[v]) for v, x in iv.items()}
+
+def _read_list(path: str) -> list:
+    with open(path) as f:
+        return [v for line in f for v in line.split("#", 1)[0].replace(",", " ").split()]
+
+def _lookup(host: str) -> list:
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_DGRAM)
+    except OSError as e:
+        raise ValueError(f"{host}: {e}") from None
+    return [ipaddress.ip_network(info[4][0].split("%", 1)[0]) for info in infos]
+
+# Записи: CIDR или адрес, @файл со списком (по записи на строку или через
+# запятую) или доменное имя — оно раскрывается в текущие A/AAAA.
+def resolve(entries: list) -> list:
+    nets, hosts, queue = [], [], list(entries)
+    while queue:
+        entry = queue.pop().strip()
+        if not entry:
+            continue
+        if entry.startswith("@"):
+            queue += _read_list(entry[1:])
+            continue
+        try:
+            nets.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            if "/" in entry or not all(p.isalnum() or p == "-" for p in entry.replace(".", "")):
+                raise ValueError(f"{entry}: not a network, list or host name") from None
+            hosts.append(entry)
+    if hosts:
+        with ThreadPoolExecutor(min(RESOLVERS, len(hosts))) as pool:
+            for found in pool.map(_lookup, hosts):
+                nets += found
+    return nets
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+STORE_DELAY = 1.0   # с: серия изменений (ресайз, тема, язык) — одна запись на диск
+
+# Временный файл рядом, fsync, rename поверх и fsync папки: после сбоя на диске
+# либо старое содержимое, либо новое целиком. sync=False — для кэшей, которые
+# можно пересобрать: без fsync запись в разы дешевле.
+def write_atomic(path: str, data: bytes, mode: int = 0o600, sync: bool = True):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(fd, mode)   # без umask: права конфига сохраняются как были
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(fd)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if sync:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _valid(value, rule) -> bool:
+    if isinstance(rule, (set, frozenset)):
+        return value in rule
+    types = rule if isinstance(rule, tuple) else (rule,)
+    # bool — подкласс int: True не должен сойти за ширину окна.
+    return isinstance(value, types) and (bool in types or not isinstance(value, bool))
+
+# JSON-словарь в памяти с отложенной атомарной записью. Чтение — из памяти;
+# save() лишь снимает снимок, а таймер через delay пишет последний снимок, так
+# что серия изменений даёт одну запись. Схема: ключ -> тип, кортеж типов или
+# множество допустимых значений; неверные значения отбрасываются (действует
+# умолчание у .get). Миграции: {версия: функция(dict) -> dict} — каждая
+# переводит файл с версии N-1 на N; файл без "version" — версия 0.
+class JsonStore:
+    def __init__(self, path: str, version: int = 0, migrations: dict = None,
+                 schema: dict = None, defaults: dict = None, delay: float = STORE_DELAY):
+        self.path       = path
+        self.version    = version
+        self.migrations = migrations or {}
+        self.schema     = schema or {}
+        self.defaults   = defaults or {}
+        self.delay      = delay
+        self.lock       = threading.Lock()
+        self.io_lock    = threading.Lock()
+        self.timer      = None
+        self.pending    = None   # снимок, ещё не записанный на диск
+        self.written    = None   # содержимое файла на диске
+        self.data       = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return self._migrate(dict(self.defaults))
+        except OSError as e:
+            print(f"[STORE] {e}")
+            return self._migrate(dict(self.defaults))
+        try:
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError("not an object")
+        except ValueError as e:
+            # Битый файл не затирается умолчаниями молча — остаётся рядом.
+            bad = self.path + ".bad"
+            print(f"[STORE] {self.path}: {e}; kept as {bad}")
+            try:
+                os.replace(self.path, bad)
+            except OSError:
+                pass
+            return self._migrate(dict(self.defaults))
+        self.written = raw
+        migrated = self._migrate(data)
+        if json.dumps(migrated).encode() != raw:
+            self.save(migrated)
+        return migrated
+
+    def _migrate(self, data: dict) -> dict:
+        version = data.get("version", 0)
+        if not _valid(version, int):
+            version = 0
+        # Файл более новой версии не понижаем: неизвестные ключи сохраняются.
+        while version < self.version:
+            version += 1
+            if migrate := self.migrations.get(version):
+                data = migrate(data)
+            data["version"] = version
+        for key, rule in self.schema.items():
+            if key in data and not _valid(data[key], rule):
+                print(f"[STORE] {self.path}: dropping invalid {key}={data[key]!r}")
+                del data[key]
+        return data
+
+    def save(self, data: dict = None):
+        if data is not None:
+            self.data = data
+        snapshot = json.dumps(self.data).encode()
+        with self.lock:
+            self.pending = snapshot
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                snapshot, self.pending = self.pending, None
+                if self.timer and self.timer is not threading.current_thread():
+                    self.timer.cancel()
+                self.timer = None
+            if snapshot is None or snapshot == self.written:
+                return
+            try:
+                write_atomic(self.path, snapshot)
+                self.written = snapshot
+            except OSError as e:
+                print(f"[STORE] {e}")
+                with self.lock:
+                    self.pending = self.pending or snapshot   # повторится со следующим save
+
+    close = flush
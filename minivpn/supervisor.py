@@ -0,0 +1,103 @@
+import time
+
+DEAD_WINDOW  = 30.0    # с без ответа пробы и без рукопожатия — туннель мёртв
+RECONNECTS   = 2       # попыток на том же профиле перед переходом к следующему
+BACKOFF_BASE = 5.0
+BACKOFF_MAX  = 300.0
+
+# Следит за туннелем, который должен быть поднят, и решает, когда его переподнять
+# или переключиться на следующий профиль. Сам ничего не запускает: next_action()
+# возвращает задание, job_done() сообщает итог.
+class Supervisor:
+    def __init__(self, window: float = DEAD_WINDOW, reconnects: int = RECONNECTS,
+                 clock=time.monotonic):
+        self.window     = window
+        self.reconnects = reconnects
+        self.clock      = clock
+        self.target     = None   # профиль, который должен быть поднят
+        self.iface      = None   # профиль, поднятый сейчас
+        self.pending    = None   # (action, name, auto) задания в работе
+        self.alive_at   = 0.0    # последний ответ пробы или рукопожатие
+        self.attempts   = 0      # попыток в текущем инциденте — для backoff
+        self.failures   = 0      # попыток на текущем target
+        self.tried      = set()  # профили, исчерпавшие попытки в инциденте
+        self.retry_at   = 0.0
+
+    def _settle(self):
+        self.attempts = self.failures = 0
+        self.tried.clear()
+        self.retry_at = 0.0
+
+    def want(self, name: str, action: str = "up"):
+        self.target   = name
+        self.pending  = (action, name, False)
+        self.alive_at = self.clock()
+        self._settle()
+
+    def release(self, name: str):
+        self.target  = None
+        self.pending = ("down", name, False)
+        self._settle()
+
+    def link(self, iface):
+        if iface == self.iface:
+            return
+        # Цель пропала не по ходу своего задания или восстановления — значит,
+        # её опустили в обход GUI (mini-vpn down, демон): надзор снимается,
+        # а не поднимает туннель обратно.
+        lost = self.iface is not None and self.iface == self.target and not self.attempts
+        self.iface    = iface
+        self.alive_at = self.clock()
+        # Туннель, поднятый в обход GUI (CLI, демон), тоже берём под надзор.
+        if (iface or lost) and self.pending is None:
+            self.target = iface
+
+    def probe(self, ok: bool):
+        if ok and self.iface and self.iface == self.target:
+            self.alive_at = self.clock()
+            self._settle()
+
+    def handshake(self, age):
+        if age is not None and self.iface == self.target:
+            self.alive_at = max(self.alive_at, self.clock() - age)
+
+    def dead(self) -> bool:
+        if self.target is None or self.pending is not None:
+            return False
+        return self.iface != self.target or self.clock() - self.alive_at > self.window
+
+    def retry_in(self) -> float:
+        return max(0.0, self.retry_at - self.clock())
+
+    # (action, old, name): "up" — поднять name (старый old, если есть, сначала
+    # опустить), "switch" — перевести трафик с живого ещё old на name.
+    def next_action(self, ranked: list):
+        now = self.clock()
+        if not self.dead() or now < self.retry_at:
+            return None
+        if self.failures >= self.reconnects:
+            self.tried.add(self.target)
+            rest = [n for n in ranked if n not in self.tried]
+            if not rest:
+                self.tried.clear()
+                rest = ranked
+            if rest:
+                self.target   = rest[0]
+                self.failures = 0
+        self.attempts += 1
+        self.failures += 1
+        self.retry_at  = now + min(BACKOFF_BASE * 2 ** (self.attempts - 1), BACKOFF_MAX)
+        action = "switch" if self.iface and self.iface != self.target else "up"
+        self.pending = (action, self.target, True)
+        return action, self.iface, self.target
+
+    # True, если задание запускал сам supervisor.
+    def job_done(self, action: str, name: str, rc: int) -> bool:
+        if not self.pending or self.pending[:2] != (action, name):
+            return False
+        auto = self.pending[2]
+        self.pending  = None
+        self.alive_at = self.clock()
+        if rc != 0 and not auto:
+            self.target = self.iface
+        return auto
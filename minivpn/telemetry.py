@@ -0,0 +1,102 @@
+import array
+import os
+import subprocess
+import time
+
+from minivpn import native
+
+HISTORY = 60
+SPARK   = "▁▂▃▄▅▆▇█"
+
+_sudo_ok = True
+
+class Ring:
+    def __init__(self, size: int = HISTORY):
+        self.data  = array.array("d", bytes(8 * size))
+        self.size  = size
+        self.head  = 0
+        self.count = 0
+
+    def push(self, value: float):
+        self.data[self.head] = value
+        self.head  = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def last(self) -> float:
+        return self.data[self.head - 1] if self.count else 0.0
+
+    def values(self) -> list:
+        start = self.head - self.count
+        return [self.data[i % self.size] for i in range(start, self.head)]
+
+def sparkline(values: list) -> str:
+    top = max(values, default=0.0)
+    if top <= 0:
+        return SPARK[0] * len(values)
+    return "".join(SPARK[min(int(v / top * len(SPARK)), len(SPARK) - 1)] for v in values)
+
+def fmt_rate(bps: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if bps < 1024:
+            return f"{bps:.0f} {unit}" if unit == "B/s" else f"{bps:.1f} {unit}"
+        bps /= 1024
+    return f"{bps:.1f} GB/s"
+
+def parse_wg_dump(text: str) -> list:
+    peers = []
+    for line in text.splitlines()[1:]:
+        f = line.split("\t")
+        if len(f) >= 8:
+            peers.append({"public_key": f[0], "handshake": int(f[4]),
+                          "rx": int(f[5]), "tx": int(f[6])})
+    return peers
+
+def wg_peers(iface: str) -> list:
+    global _sudo_ok
+    try:
+        return native.get_peers(iface)
+    except PermissionError:
+        pass
+    if not _sudo_ok:
+        return []
+    r = subprocess.run(["sudo", "-n", "wg", "show", iface, "dump"],
+                       capture_output=True, text=True)
+    if r.returncode != 0:
+        _sudo_ok = False
+        return []
+    return parse_wg_dump(r.stdout)
+
+class Telemetry:
+    def __init__(self, iface: str, history: int = HISTORY):
+        base = f"/sys/class/net/{iface}/statistics/"
+        self.iface     = iface
+        self.fds       = [os.open(base + n, os.O_RDONLY) for n in ("rx_bytes", "tx_bytes")]
+        self.rx        = Ring(history)
+        self.tx        = Ring(history)
+        self.last      = None
+        self.peers     = []
+        self.handshake = 0
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+    def sample(self):
+        now    = time.monotonic()
+        rx, tx = (int(os.pread(fd, 32, 0)) for fd in self.fds)
+        if self.last:
+            dt = (now - self.last[0]) or 1e-9
+            self.rx.push(max(rx - self.last[1], 0) / dt)
+            self.tx.push(max(tx - self.last[2], 0) / dt)
+        self.last = (now, rx, tx)
+
+    def sample_peers(self):
+        try:
+            self.peers = wg_peers(self.iface)
+        except OSError:
+            self.peers = []
+        self.handshake = max((p["handshake"] for p in self.peers), default=0)
+
+    def handshake_age(self):
+        return time.time() - self.handshake if self.handshake else None
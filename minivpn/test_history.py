@@ -0,0 +1,55 @@
+import math
+import random
+
+from minivpn import history
+from minivpn.history import HIST_RATIO, PROBE, History
+
+# p95 после свёртки в поминутный и почасовой ярусы считается по гистограмме;
+# она должна попадать в корзину точного p95 по сырым сэмплам.
+
+T0 = 1_700_000_000 // 3600 * 3600
+
+def _exact(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+def _fill(path: str, hours: int = 3, step: int = 2) -> list:
+    rng, samples = random.Random(3), []
+    with History(path) as h:
+        for ts in range(T0, T0 + hours * 3600, step):
+            rtt = rng.lognormvariate(math.log(40), 0.6)
+            h.add("de-fra-01", PROBE, rtt=rtt, loss=0.0, ts=ts)
+            h.add("nl-ams-01", PROBE, rtt=rtt * 2, loss=1.0, ts=ts)
+            samples.append((ts, rtt))
+    return samples
+
+def _check(h: History, samples: list, lo: int, hi: int, tier: int):
+    assert any(t == tier for t, *_ in h._cover(lo, hi, len(history.TIERS) - 1))
+    raw = [rtt for ts, rtt in samples if lo <= ts < hi]
+    acc = h.query(["de-fra-01"], PROBE, lo, hi - 1)["de-fra-01"]
+    assert acc.exact is None            # считано по агрегатам, не по сырым
+    assert acc.count == len(raw)
+    for q in (0.5, 0.95):
+        got, want = acc.quantile(q), _exact(raw, q)
+        assert want / HIST_RATIO <= got <= want * HIST_RATIO, (q, got, want)
+    assert math.isclose(acc.mean(0), sum(raw) / len(raw), rel_tol=1e-4)
+
+def test_quantiles_after_rollup(tmp_path):
+    path    = str(tmp_path / "history.bin")
+    samples = _fill(path)
+    with History(path, writable=False) as h:
+        _check(h, samples, T0, T0 + 3 * 3600, 2)                 # целые часы
+        _check(h, samples, T0 + 300, T0 + 2100, 1)               # целые минуты внутри часа
+        summary = h.summary(["de-fra-01", "nl-ams-01"], PROBE, T0, T0 + 3 * 3600 - 1)
+    assert summary["de-fra-01"]["loss"] == 0.0
+    assert summary["nl-ams-01"]["loss"] == 1.0
+    assert summary["nl-ams-01"]["rtt_p95"] > summary["de-fra-01"]["rtt_p95"]
+
+def test_raw_window_is_exact(tmp_path):
+    path    = str(tmp_path / "history.bin")
+    samples = _fill(path, hours=1)
+    lo, hi  = T0 + 10, T0 + 50                                   # меньше минуты — только сырые
+    with History(path, writable=False) as h:
+        acc = h.query(["de-fra-01"], PROBE, lo, hi - 1)["de-fra-01"]
+    raw = [rtt for ts, rtt in samples if lo <= ts < hi]
+    assert math.isclose(acc.quantile(0.95), _exact(raw, 0.95), rel_tol=1e-6)
@@ -0,0 +1,63 @@
+import ipaddress
+import random
+
+from minivpn.split import FULL, derive, to_cidrs, to_intervals
+
+# Сверка с ipaddress на случайных наборах: интервальная арифметика и жадное
+# разложение в CIDR должны давать ровно collapse_addresses.
+
+BASES = {4: ipaddress.ip_network("10.20.0.0/18"), 6: ipaddress.ip_network("2001:db8::/114")}
+
+def _nets(rng, v: int, n: int, shortest: int = None) -> list:
+    base = BASES[v]
+    bits = base.max_prefixlen
+    out  = []
+    for _ in range(n):
+        plen = rng.randint(shortest or base.prefixlen, bits)
+        addr = int(base.network_address) + rng.randrange(base.num_addresses)
+        out.append(type(base)((addr >> (bits - plen) << (bits - plen), plen)))
+    return out
+
+def _addrs(nets) -> set:
+    return {a for net in nets for a in range(int(net.network_address), int(net.broadcast_address) + 1)}
+
+def _collapse(v: int, addrs: set) -> list:
+    cls, bits = type(BASES[v]), BASES[v].max_prefixlen
+    return [str(n) for n in ipaddress.collapse_addresses(cls((a, bits)) for a in sorted(addrs))]
+
+def test_to_cidrs_matches_collapse():
+    rng = random.Random(1)
+    for _ in range(300):
+        v4 = [ipaddress.IPv4Network((rng.getrandbits(32) >> (32 - p) << (32 - p), p))
+              for p in (rng.randint(0, 32) for _ in range(rng.randint(1, 12)))]
+        v6 = [ipaddress.IPv6Network((rng.getrandbits(128) >> (128 - p) << (128 - p), p))
+              for p in (rng.randint(0, 128) for _ in range(rng.randint(0, 12)))]
+        want = [str(n) for n in ipaddress.collapse_addresses(v4)]
+        want += [str(n) for n in ipaddress.collapse_addresses(v6)]
+        assert to_cidrs(to_intervals(v4 + v6)) == want
+
+def test_derive_matches_address_sets():
+    rng = random.Random(2)
+    for _ in range(100):
+        for v in (4, 6):
+            allowed, include, exclude = (_nets(rng, v, rng.randint(0, 6), 22 if v == 4 else 118)
+                                         for _ in range(3))
+            use_inc = rng.random() < 0.7
+            iv  = derive(to_intervals(allowed),
+                         to_intervals(include) if use_inc else None,
+                         to_intervals(exclude))
+            got = to_cidrs({4: [], 6: [], v: iv[v]})
+            want = _addrs(allowed)
+            if use_inc:
+                want &= _addrs(include)
+            want -= _addrs(exclude)
+            assert got == _collapse(v, want)
+
+# Классический случай: весь IPv4 без приватных сетей, IPv6 целиком.
+def test_derive_full_minus_exclude():
+    exclude = [ipaddress.ip_network("10.0.0.0/8"), ipaddress.ip_network("192.168.0.0/16")]
+    rest    = list(ipaddress.ip_network("0.0.0.0/0").address_exclude(exclude[0]))
+    rest    = [n for net in rest for n in (net.address_exclude(exclude[1])
+                                           if exclude[1].subnet_of(net) else [net])]
+    got = to_cidrs(derive(FULL, exclude=to_intervals(exclude)))
+    assert got == [str(n) for n in ipaddress.collapse_addresses(rest)] + ["::/0"]
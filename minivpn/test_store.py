@@ -0,0 +1,73 @@
+import json
+import os
+
+from minivpn.store import JsonStore
+
+def _rename(old: str, new: str, default):
+    def migrate(data: dict) -> dict:
+        data[new] = data.pop(old, default)
+        return data
+    return migrate
+
+MIGRATIONS = {1: _rename("colors", "theme", "tokyo"), 2: _rename("width", "win_w", 800)}
+SCHEMA     = {"theme": str, "win_w": int, "lang": {"ru", "en"}}
+
+def _write(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+def _read(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def test_migrates_in_order_and_rewrites(tmp_path):
+    path = str(tmp_path / "settings.json")
+    _write(path, {"colors": "nord", "width": 1024, "lang": "en"})
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA)
+    assert store.data == {"theme": "nord", "win_w": 1024, "lang": "en", "version": 2}
+    store.flush()
+    assert _read(path) == store.data
+
+def test_resumes_from_stored_version(tmp_path):
+    path = str(tmp_path / "settings.json")
+    _write(path, {"version": 1, "theme": "nord", "colors": "kept", "width": 640})
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA)
+    assert store.data["theme"] == "nord"       # миграция 1 не повторяется
+    assert store.data["colors"] == "kept"
+    assert store.data["win_w"] == 640
+
+def test_newer_file_is_not_downgraded(tmp_path):
+    path = str(tmp_path / "settings.json")
+    data = {"version": 5, "future": [1, 2], "theme": "nord"}
+    _write(path, data)
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA)
+    assert store.data == data
+    store.flush()
+    assert _read(path) == data
+
+def test_schema_drops_invalid_values(tmp_path):
+    path = str(tmp_path / "settings.json")
+    _write(path, {"version": 2, "theme": 3, "win_w": True, "lang": "de", "x": None})
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA, {"lang": "ru"})
+    assert store.data == {"version": 2, "x": None}   # bool — не int
+    assert store.data.get("lang", "ru") == "ru"
+
+def test_corrupt_file_is_kept_aside(tmp_path):
+    path = str(tmp_path / "settings.json")
+    with open(path, "w") as f:
+        f.write("{not json")
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA, {"lang": "ru"})
+    assert store.data == {"lang": "ru", "theme": "tokyo", "win_w": 800, "version": 2}
+    assert os.path.exists(path + ".bad")
+    assert not os.path.exists(path)
+
+def test_debounced_save_writes_last_snapshot(tmp_path):
+    path  = str(tmp_path / "settings.json")
+    store = JsonStore(path, 2, MIGRATIONS, SCHEMA, delay=60)
+    for w in (100, 200, 300):
+        store.data["win_w"] = w
+        store.save()
+    assert not os.path.exists(path)
+    store.flush()
+    assert _read(path)["win_w"] == 300
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
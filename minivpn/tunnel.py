@@ -0,0 +1,163 @@
+import os
+import subprocess
+import sys
+import time
+
+from minivpn import killswitch, native
+from minivpn.wgconf import load_config
+
+ROOT_DIR   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUDO       = [] if os.geteuid() == 0 else ["sudo"]
+WG_QUICK   = SUDO + ["wg-quick"]
+HELPER     = SUDO + [sys.executable, "-m", "minivpn.helper"]
+KILLSWITCH = SUDO + [sys.executable, "-m", "minivpn.killswitch"]
+
+def use_native(path: str, backend: str):
+    if backend != "native":
+        return None
+    try:
+        cfg = load_config(path)
+    except (OSError, ValueError):
+        return None
+    return cfg if native.native_supported(cfg) else None
+
+# Хуки и SaveConfig выполняет только wg-quick, и привилегированная сессия
+# такие профили не принимает — они идут через sudo на каждое действие.
+def has_hooks(path: str) -> bool:
+    try:
+        return not native.native_supported(load_config(path))
+    except OSError:
+        return False
+
+def tunnel_command(action: str, path: str, backend: str = "wg-quick") -> list:
+    if use_native(path, backend):
+        return HELPER + [action, path]
+    return WG_QUICK + [action, path]
+
+def phase_name(cmd: str, iface: str) -> str:
+    words = [w for w in cmd.split() if w.isalpha() and w != iface]
+    return " ".join(words[:3]) or cmd.split()[0]
+
+class PhaseTimer:
+    def __init__(self, first: str, on_phase=None):
+        self.start    = self.last = time.perf_counter()
+        self.phase    = first
+        self.phases   = []
+        self.on_phase = on_phase
+
+    def _record(self, label: str, ms: float):
+        self.phases.append((label, ms))
+        if self.on_phase:
+            self.on_phase(label, ms)
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self._record(self.phase, (now - self.last) * 1000)
+        self.phase, self.last = phase, now
+
+    def finish(self) -> list:
+        now = time.perf_counter()
+        self._record(self.phase, (now - self.last) * 1000)
+        self._record("total", (now - self.start) * 1000)
+        return self.phases
+
+def run_command(cmd: list, name: str, on_line=None, on_phase=None) -> tuple:
+    timer, err = PhaseTimer("sudo" if SUDO else "start", on_phase), []
+    try:
+        proc = subprocess.Popen(cmd, cwd=ROOT_DIR,
+                                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        return 127, str(e), timer.phases
+    for line in proc.stderr:
+        line = line.rstrip()
+        err.append(line)
+        if on_line:
+            on_line(line)
+        if line.startswith("[#] "):
+            timer.mark(phase_name(line[4:], name))
+    rc = proc.wait()
+    return rc, "\n".join(err), timer.finish()
+
+def run_tunnel(action: str, name: str, path: str, backend: str = "wg-quick",
+               on_line=None, on_phase=None) -> tuple:
+    return run_command(tunnel_command(action, path, backend), name, on_line, on_phase)
+
+def run_native(action: str, name: str, cfg: dict, on_line=None, on_phase=None,
+               old: tuple = None) -> tuple:
+    timer = PhaseTimer("start", on_phase)
+
+    def log(msg: str):
+        if on_line:
+            on_line(f"[#] {msg}")
+        timer.mark(phase_name(msg, name))
+
+    try:
+        if action == "switch":
+            native.switch(*old, name, cfg, log)
+        else:
+            (native.up if action == "up" else native.down)(name, cfg, log)
+    except (OSError, ValueError, KeyError, subprocess.SubprocessError) as e:
+        return 1, f"{action} {name}: {e}", timer.finish()
+    return 0, "", timer.finish()
+
+def run_switch(old: tuple, name: str, path: str, backend: str = "wg-quick",
+               on_line=None, on_phase=None) -> tuple:
+    old_name, old_path = old
+    cfg, old_cfg = use_native(path, backend), use_native(old_path, backend)
+    if cfg and old_cfg:
+        if not SUDO:
+            return run_native("switch", name, cfg, on_line, on_phase, (old_name, old_cfg))
+        return run_command(HELPER + ["switch", old_path, path], name, on_line, on_phase)
+    # wg-quick не умеет держать два полных туннеля: break-before-make,
+    # и разрывом считается весь down + up.
+    rc, err, phases = run_tunnel("down", old_name, old_path, backend, on_line, on_phase)
+    if rc == 0:
+        rc, err, more = run_tunnel("up", name, path, backend, on_line, on_phase)
+        phases += more
+    gap = sum(ms for phase, ms in phases if phase == "total")
+    if on_phase:
+        on_phase("cutover", gap)
+    return rc, err, phases + [("cutover", gap)]
+
+# Набор kill switch строится по папке профиля и ставится одним nft -f.
+def run_killswitch(enable: bool, config_dir: str, on_phase=None) -> tuple:
+    start = time.perf_counter()
+    if SUDO:
+        proc = subprocess.run(KILLSWITCH + ["on" if enable else "off", "--config-dir", config_dir],
+                              cwd=ROOT_DIR, stdin=subprocess.DEVNULL,
+                              capture_output=True, text=True)
+        rc, err = proc.returncode, proc.stderr.strip()
+    else:
+        try:
+            killswitch.apply(config_dir) if enable else killswitch.remove()
+            rc, err = 0, ""
+        except OSError as e:
+            rc, err = 1, f"killswitch: {e}"
+    ms = (time.perf_counter() - start) * 1000
+    if on_phase:
+        on_phase("killswitch", ms)
+    return rc, err, [("killswitch", ms)]
+
+# lock: True — после удачной операции поставить kill switch, False — снять
+# (после down последнего туннеля), None — не трогать. Набор не снимается,
+# когда туннель падает сам, — в этом и смысл.
+def execute(action: str, name: str, path: str, backend: str = "wg-quick",
+            on_line=None, on_phase=None, old: tuple = None, lock: bool = None) -> tuple:
+    cfg = use_native(path, backend) if not SUDO and action != "switch" else None
+    if action == "switch":
+        rc, err, phases = run_switch(old, name, path, backend, on_line, on_phase)
+    elif cfg:
+        rc, err, phases = run_native(action, name, cfg, on_line, on_phase)
+    else:
+        rc, err, phases = run_tunnel(action, name, path, backend, on_line, on_phase)
+    if rc == 0 and lock is not None:
+        rc, err, more = run_killswitch(lock, os.path.dirname(path), on_phase)
+        phases += more
+    return rc, err, phases
+
+def summarize_phases(phases: list) -> dict:
+    totals = {}
+    for phase, ms in phases:
+        totals[phase] = totals.get(phase, 0.0) + ms
+    return totals
@@ -0,0 +1,138 @@
+import ipaddress
+import json
+import os
+
+from minivpn.store import write_atomic
+
+LIST_KEYS     = {"address", "dns", "allowedips"}
+HOOK_KEYS     = ("preup", "postup", "predown", "postdown")
+SECRET_KEYS   = {"privatekey", "presharedkey"}
+CACHE_VERSION = 1
+
+def parse_config(text: str) -> dict:
+    cfg, section = {"interface": {}, "peers": []}, None
+    for raw in text.splitlines():
+        line = raw.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            name = line[1:-1].strip().lower()
+            if name == "interface":
+                section = cfg["interface"]
+            elif name == "peer":
+                section = {}
+                cfg["peers"].append(section)
+            else:
+                section = None
+            continue
+        key, sep, value = line.partition("=")
+        if not sep or section is None:
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if key in LIST_KEYS:
+            section.setdefault(key, []).extend(v.strip() for v in value.split(",") if v.strip())
+        elif key in HOOK_KEYS:
+            section.setdefault(key, []).append(value)
+        else:
+            section[key] = value
+    return cfg
+
+def load_config(path: str) -> dict:
+    with open(path) as f:
+        return parse_config(f.read())
+
+def split_endpoint(endpoint: str) -> tuple:
+    host, _, port = endpoint.rpartition(":")
+    return host.strip("[]"), int(port)
+
+def split_dns(values: list) -> tuple:
+    servers, search = [], []
+    for v in values:
+        try:
+            servers.append(str(ipaddress.ip_address(v)))
+        except ValueError:
+            search.append(v)
+    return servers, search
+
+def public_config(cfg: dict) -> dict:
+    strip = lambda section: {k: v for k, v in section.items() if k not in SECRET_KEYS}
+    return {"interface": strip(cfg["interface"]), "peers": [strip(p) for p in cfg["peers"]]}
+
+class ConfigIndex:
+    def __init__(self, config_dir: str, cache_file: str):
+        self.config_dir = config_dir
+        self.cache_file = cache_file
+        self.entries    = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.config_dir, f"{name}.conf")
+
+    def names(self) -> list:
+        return sorted(self.entries)
+
+    def get(self, name: str):
+        entry = self.entries.get(name)
+        return entry["config"] if entry else None
+
+    def endpoints(self) -> dict:
+        return {name: peers[0]["endpoint"]
+                for name, e in self.entries.items()
+                if (peers := e["config"]["peers"]) and "endpoint" in peers[0]}
+
+    def load(self):
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+        self.rescan()
+
+    def save(self):
+        # Кэш пересобирается из конфигов — атомарно, но без fsync.
+        data = json.dumps({"version": CACHE_VERSION, "entries": self.entries}).encode()
+        write_atomic(self.cache_file, data, sync=False)
+
+    def rescan(self) -> bool:
+        seen, changed = set(), False
+        try:
+            with os.scandir(self.config_dir) as it:
+                for e in it:
+                    if e.name.endswith(".conf") and e.is_file():
+                        seen.add(e.name[:-5])
+                        changed |= self._update(e.name[:-5], e.stat())
+        except OSError:
+            pass
+        for name in set(self.entries) - seen:
+            del self.entries[name]
+            changed = True
+        if changed:
+            self.save()
+        return changed
+
+    def refresh(self, names) -> bool:
+        changed = False
+        for name in names:
+            try:
+                changed |= self._update(name, os.stat(self.path(name)))
+            except OSError:
+                changed |= self.entries.pop(name, None) is not None
+        if changed:
+            self.save()
+        return changed
+
+    def _update(self, name: str, st) -> bool:
+        key = [st.st_mtime_ns, st.st_size]
+        old = self.entries.get(name)
+        if old and old["stat"] == key:
+            return False
+        try:
+            cfg = public_config(load_config(self.path(name)))
+        except (OSError, UnicodeDecodeError):
+            cfg = {"interface": {}, "peers": []}
+        self.entries[name] = {"stat": key, "config": cfg}
+        return True
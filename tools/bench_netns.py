@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# Бенчмарк туннеля без настоящего VPN-сервера: два сетевых пространства имён,
+# veth между ними, WireGuard-пара, поднятая нативным бэкендом mini-vpn, и
+# слушатель minivpn.bench на «серверной» стороне. netem на veth имитирует
+# задержку и потери канала. Нужны root, iproute2 и wg (только для ключей).
+#   sudo tools/bench_netns.py [-t SECONDS] [--delay MS] [--loss PCT] [--min-mbps N] [--json FILE]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NS_SRV  = "mvb-srv"
+NS_CLI  = "mvb-cli"
+VETH    = ("10.203.0.1", "10.203.0.2")   # сервер, клиент
+TUNNEL  = ("10.204.0.1", "10.204.0.2")
+WG_PORT = 51820
+
+def sh(*cmd, ns: str = None, **kw) -> str:
+    if ns:
+        cmd = ("ip", "netns", "exec", ns) + cmd
+    return subprocess.run(cmd, check=True, capture_output=True, text=True, **kw).stdout.strip()
+
+def keypair() -> tuple:
+    private = sh("wg", "genkey")
+    return private, sh("wg", "pubkey", input=private)
+
+def write_conf(path: str, private: str, address: str, peer: str, **extra):
+    iface = [f"PrivateKey = {private}", f"Address = {address}/24"]
+    peer_lines = [f"PublicKey = {peer}"]
+    if "listen" in extra:
+        iface.append(f"ListenPort = {extra['listen']}")
+    peer_lines.append(f"AllowedIPs = {extra['allowed']}")
+    if "endpoint" in extra:
+        peer_lines += [f"Endpoint = {extra['endpoint']}", "PersistentKeepalive = 25"]
+    with open(path, "w") as f:
+        f.write("[Interface]\n" + "\n".join(iface) + "\n\n[Peer]\n" + "\n".join(peer_lines) + "\n")
+    os.chmod(path, 0o600)
+
+def setup(base: str, args) -> tuple:
+    for ns in (NS_SRV, NS_CLI):
+        sh("ip", "netns", "add", ns)
+        sh("ip", "link", "set", "lo", "up", ns=ns)
+    sh("ip", "link", "add", "mvb-b", "netns", NS_SRV, "type", "veth",
+       "peer", "name", "mvb-a", "netns", NS_CLI)
+    for ns, dev, addr in ((NS_SRV, "mvb-b", VETH[0]), (NS_CLI, "mvb-a", VETH[1])):
+        sh("ip", "addr", "add", f"{addr}/24", "dev", dev, ns=ns)
+        sh("ip", "link", "set", dev, "up", ns=ns)
+        if args.delay or args.loss:
+            sh("tc", "qdisc", "add", "dev", dev, "root", "netem",
+               "delay", f"{args.delay / 2}ms", "loss", f"{args.loss / 2}%", ns=ns)
+    srv_key, srv_pub = keypair()
+    cli_key, cli_pub = keypair()
+    configs = os.path.join(base, "home", "vpn-configs")
+    os.makedirs(configs)
+    srv_conf, cli_conf = os.path.join(base, "mvbsrv.conf"), os.path.join(configs, "mvb.conf")
+    write_conf(srv_conf, srv_key, TUNNEL[0], cli_pub, listen=WG_PORT, allowed=f"{TUNNEL[1]}/32")
+    write_conf(cli_conf, cli_key, TUNNEL[1], srv_pub, allowed=f"{TUNNEL[0]}/32",
+               endpoint=f"{VETH[0]}:{WG_PORT}")
+    for ns, conf in ((NS_SRV, srv_conf), (NS_CLI, cli_conf)):
+        sh(sys.executable, "-m", "minivpn.helper", "up", conf, ns=ns, cwd=ROOT)
+    return srv_conf, cli_conf
+
+def teardown():
+    for ns in (NS_SRV, NS_CLI):
+        subprocess.run(["ip", "netns", "del", ns], capture_output=True)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="mini-vpn tunnel benchmark in network namespaces")
+    ap.add_argument("-t", "--duration", type=float, default=3.0)
+    ap.add_argument("-n", "--pings", type=int, default=50)
+    ap.add_argument("--delay", type=float, default=0.0, help="RTT, добавляемый netem, мс")
+    ap.add_argument("--loss", type=float, default=0.0, help="потери netem, %%")
+    ap.add_argument("--min-mbps", type=float, help="порог TCP ↓, ниже — код 1")
+    ap.add_argument("--json", help="сохранить результат прогона в файл")
+    args = ap.parse_args()
+    if os.geteuid() != 0:
+        print("ERROR: needs root (network namespaces)", file=sys.stderr)
+        return 2
+
+    teardown()   # остатки прерванного прогона
+    with tempfile.TemporaryDirectory(prefix="mini-vpn-netns-") as base:
+        env = dict(os.environ, HOME=os.path.join(base, "home"), PYTHONPATH=ROOT)
+        listener = None
+        try:
+            setup(base, args)
+            listener = subprocess.Popen(["ip", "netns", "exec", NS_SRV, sys.executable,
+                                         "-m", "minivpn.bench", "--listen", TUNNEL[0]],
+                                        env=env, stdout=subprocess.PIPE, text=True)
+            listener.stdout.readline()   # "[BENCH] listening on …"
+            rc = subprocess.run(["ip", "netns", "exec", NS_CLI, sys.executable,
+                                 "-m", "minivpn.cli", "bench", "-s", TUNNEL[0],
+                                 "-t", str(args.duration), "-n", str(args.pings),
+                                 "-p", "mvb", "--no-dns"], env=env).returncode
+            with open(os.path.join(base, "home", ".config", "mini-vpn", "bench.jsonl")) as f:
+                record = json.loads(f.readlines()[-1])
+        except (subprocess.CalledProcessError, OSError, ValueError, IndexError) as e:
+            print(f"ERROR: {e}", getattr(e, "stderr", "") or "", file=sys.stderr)
+            return 2
+        finally:
+            if listener:
+                listener.terminate()
+                listener.wait()
+            teardown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(record, delay=args.delay, netem_loss=args.loss), f, indent=2)
+    down = record["results"].get("tcp_down", 0.0)
+    if args.min_mbps is not None and down < args.min_mbps:
+        print(f"FAIL: TCP ↓ {down:.1f} Mbit/s < {args.min_mbps:.1f}", file=sys.stderr)
+        return 1
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
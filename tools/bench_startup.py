@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# Холодный старт GUI в offscreen: N запусков до первого Paint, медиана против порога.
+#   tools/bench_startup.py [-n RUNS] [--configs N] [--max-ms MS] [--json FILE]
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT    = os.path.join(ROOT, "mini-vpn.py")
+LOCATIONS = ("de-fra", "nl-ams", "us-nyc", "ch-zrh", "se-sto")
+
+def _key() -> str:
+    return base64.b64encode(os.urandom(32)).decode()
+
+def sandbox_home(base: str, configs: int) -> dict:
+    # Отдельный HOME без диалогов первого запуска; wg/wg-quick — пустышки в PATH,
+    # чтобы проверка зависимостей не открывала модальное окно. Профили — в
+    # ~/vpn-configs (CONFIG_DIR), откуда их читает приложение: старт с пустой
+    # папкой не меряет ни индекс конфигов, ни построение списка.
+    home    = os.path.join(base, "home")
+    app_dir = os.path.join(home, ".config", "mini-vpn")
+    cfg_dir = os.path.join(home, "vpn-configs")
+    bin_dir = os.path.join(base, "bin")
+    os.makedirs(app_dir)
+    os.makedirs(cfg_dir, mode=0o700)
+    os.makedirs(bin_dir)
+    open(os.path.join(app_dir, ".first_run_done"), "w").close()
+    for i in range(configs):
+        name = f"{LOCATIONS[i % len(LOCATIONS)]}-{i // len(LOCATIONS) + 1:02d}"
+        fd   = os.open(os.path.join(cfg_dir, name + ".conf"), os.O_WRONLY | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(f"[Interface]\nPrivateKey = {_key()}\nAddress = 10.64.{i // 250}.{i % 250 + 2}/32\n"
+                    f"DNS = 10.64.0.1\n\n[Peer]\nPublicKey = {_key()}\n"
+                    f"AllowedIPs = 0.0.0.0/0, ::/0\nEndpoint = 198.51.100.{i % 250 + 1}:51820\n")
+    for tool in ("wg", "wg-quick", "resolvconf"):
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\nexit 0\n")
+        os.chmod(path, 0o755)
+    env = dict(os.environ,
+               HOME=home,
+               XDG_RUNTIME_DIR=base,
+               PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+               QT_QPA_PLATFORM="offscreen",
+               MINIVPN_PROFILE_EXIT="1")
+    env.pop("XDG_CONFIG_HOME", None)
+    return env
+
+def run_once(env: dict, out: str, timeout: float) -> dict:
+    env = dict(env, MINIVPN_PROFILE=out)
+    t0  = time.perf_counter()
+    subprocess.run([sys.executable, SCRIPT], env=env, timeout=timeout, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = (time.perf_counter() - t0) * 1000
+    with open(out) as f:
+        data = json.load(f)
+    os.unlink(out)
+    data["wall"] = wall
+    return data
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="mini-vpn cold-start benchmark")
+    ap.add_argument("-n", "--runs", type=int, default=5)
+    ap.add_argument("--configs", type=int, default=20,
+                    help="сколько профилей положить в ~/vpn-configs")
+    ap.add_argument("--max-ms", type=float, default=1500.0,
+                    help="порог медианы времени до первого Paint")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--json", help="сохранить все прогоны в файл")
+    args = ap.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="mini-vpn-bench-") as base:
+        env = sandbox_home(base, args.configs)
+        out = os.path.join(base, "profile.json")
+        try:
+            run_once(env, out, args.timeout)  # прогрев: __pycache__, кэш шрифтов
+            for _ in range(args.runs):
+                runs.append(run_once(env, out, args.timeout))
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+
+    phases = {}
+    for run in runs:
+        for phase, ms in run["phases"].items():
+            phases.setdefault(phase, []).append(ms)
+    for phase, values in phases.items():
+        print(f"{phase:<12} {statistics.median(values):8.1f} ms")
+    total = statistics.median(r["total"] for r in runs)
+    wall  = statistics.median(r["wall"] for r in runs)
+    print(f"{'first_paint':<12} {total:8.1f} ms (median of {len(runs)}, limit {args.max_ms:.0f})")
+    print(f"{'process':<12} {wall:8.1f} ms (incl. interpreter start and exit)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "median": total, "limit": args.max_ms}, f, indent=2)
+    if total > args.max_ms:
+        print(f"FAIL: time-to-window {total:.1f} ms > {args.max_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
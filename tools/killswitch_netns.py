@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# Проверка kill switch в сетевых пространствах имён: veth между «клиентом» и
+# «сервером», эхо-слушатели UDP на порту эндпоинта и на постороннем порту.
+# С набором minivpn.killswitch до эндпоинта доходит, до остального — нет;
+# после снятия — снова всё. Нужны root, iproute2 и nft.
+#   sudo tools/killswitch_netns.py
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NS_SRV  = "mvk-srv"
+NS_CLI  = "mvk-cli"
+VETH    = ("10.205.0.1", "10.205.0.2")   # сервер, клиент
+WG_PORT = 51820
+OTHER   = 5300
+
+ECHO = """
+import select, socket
+socks = []
+for port in ({}, {}):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("0.0.0.0", port))
+    socks.append(s)
+print("ready", flush=True)
+while True:
+    for s in select.select(socks, [], [])[0]:
+        data, addr = s.recvfrom(64)
+        s.sendto(data, addr)
+""".format(WG_PORT, OTHER)
+
+PROBE = """
+import socket, sys
+s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+s.settimeout(0.5)
+try:
+    s.sendto(b"x", (sys.argv[1], int(sys.argv[2])))
+    s.recv(64)
+    print("open")
+except OSError:
+    print("blocked")
+"""
+
+def sh(*cmd, ns: str = None, **kw) -> str:
+    if ns:
+        cmd = ("ip", "netns", "exec", ns) + cmd
+    return subprocess.run(cmd, check=True, capture_output=True, text=True, **kw).stdout.strip()
+
+def probe(port: int) -> str:
+    return sh(sys.executable, "-c", PROBE, VETH[0], str(port), ns=NS_CLI)
+
+def killswitch(action: str, config_dir: str) -> float:
+    start = time.perf_counter()
+    sh(sys.executable, "-m", "minivpn.killswitch", action, "--config-dir", config_dir,
+       ns=NS_CLI, cwd=ROOT)
+    return (time.perf_counter() - start) * 1000
+
+def setup():
+    for ns in (NS_SRV, NS_CLI):
+        sh("ip", "netns", "add", ns)
+        sh("ip", "link", "set", "lo", "up", ns=ns)
+    sh("ip", "link", "add", "mvk-b", "netns", NS_SRV, "type", "veth",
+       "peer", "name", "mvk-a", "netns", NS_CLI)
+    for ns, dev, addr in ((NS_SRV, "mvk-b", VETH[0]), (NS_CLI, "mvk-a", VETH[1])):
+        sh("ip", "addr", "add", f"{addr}/24", "dev", dev, ns=ns)
+        sh("ip", "link", "set", dev, "up", ns=ns)
+
+def teardown():
+    for ns in (NS_SRV, NS_CLI):
+        subprocess.run(["ip", "netns", "del", ns], capture_output=True)
+
+def main() -> int:
+    if os.geteuid() != 0:
+        print("ERROR: needs root (network namespaces)", file=sys.stderr)
+        return 2
+    teardown()   # остатки прерванного прогона
+    expected = [("off", "open", "open"), ("on", "open", "blocked"), ("off", "open", "open")]
+    failed, echo = False, None
+    with tempfile.TemporaryDirectory(prefix="mini-vpn-killswitch-") as config_dir:
+        # Ключи не проверяются: набору нужны только имя профиля и Endpoint.
+        with open(os.path.join(config_dir, "mvk.conf"), "w") as f:
+            f.write("[Interface]\nPrivateKey = x\nAddress = 10.206.0.2/24\n\n"
+                    f"[Peer]\nPublicKey = y\nAllowedIPs = 0.0.0.0/0\n"
+                    f"Endpoint = {VETH[0]}:{WG_PORT}\n")
+        try:
+            setup()
+            echo = subprocess.Popen(["ip", "netns", "exec", NS_SRV, sys.executable, "-c", ECHO],
+                                    stdout=subprocess.PIPE, text=True)
+            echo.stdout.readline()   # "ready"
+            for i, (state, endpoint, other) in enumerate(expected):
+                ms = killswitch(state, config_dir) if i else 0.0
+                got = (probe(WG_PORT), probe(OTHER))
+                ok  = got == (endpoint, other)
+                failed |= not ok
+                print(f"killswitch {state:<3} ({ms:5.1f} ms)\tendpoint {got[0]:<7}\t"
+                      f"other {got[1]:<7}\t{'ok' if ok else 'FAIL'}")
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"ERROR: {e}", getattr(e, "stderr", "") or "", file=sys.stderr)
+            return 2
+        finally:
+            if echo:
+                echo.terminate()
+                echo.wait()
+            teardown()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())